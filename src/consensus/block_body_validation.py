@@ -19,8 +19,10 @@ from src.full_node.block_store import BlockStore
 from src.consensus.blockchain_check_conditions import blockchain_check_conditions_dict
 from src.full_node.coin_store import CoinStore
 from src.consensus.cost_calculator import calculate_cost_of_program, CostResult
+from src.consensus.fork_coin_view import ForkCoinView, ForkCoinViewCache
 from src.consensus.block_record import BlockRecord
 from src.types.blockchain_format.coin import Coin
+from src.types.blockchain_format.foliage import TransactionsInfo
 from src.types.coin_record import CoinRecord
 from src.types.announcement import Announcement
 from src.types.condition_opcodes import ConditionOpcode
@@ -49,12 +51,16 @@ async def validate_block_body(
     height: uint32,
     cached_cost_result: Optional[CostResult] = None,
     fork_point_with_peak: Optional[uint32] = None,
+    fork_coin_views: Optional[ForkCoinViewCache] = None,
+    validated_signature: bool = False,
 ) -> Tuple[Optional[Err], Optional[CostResult]]:
     """
     This assumes the header block has been completely validated.
     Validates the transactions and body of the block. Returns None for the first value if everything
     validates correctly, or an Err if something does not validate. For the second value, returns a CostResult
     if validation succeeded, and there are transactions
+    fork_coin_views caches the coins of the fork of the block between calls, for blocks that are not on the peak
+    chain. validated_signature is True if the aggregate signature was already verified in pre-validation.
     """
     if isinstance(block, FullBlock):
         assert height == block.height
@@ -258,28 +264,12 @@ async def validate_block_body(
             coin_store_reorg_height = last_sb_in_common.height
 
         # Get additions and removals since (after) fork_h but not including this block
-        additions_since_fork: Dict[bytes32, Tuple[Coin, uint32]] = {}
-        removals_since_fork: Set[bytes32] = set()
-        coinbases_since_fork: Dict[bytes32, uint32] = {}
-
         if height > 0:
-            curr: Optional[FullBlock] = await block_store.get_full_block(block.prev_header_hash)
-            assert curr is not None
-
-            while curr.height > fork_h:
-                removals_in_curr, additions_in_curr = curr.tx_removals_and_additions()
-                for c_name in removals_in_curr:
-                    removals_since_fork.add(c_name)
-                for c in additions_in_curr:
-                    additions_since_fork[c.name()] = (c, curr.height)
-
-                for coinbase_coin in curr.get_included_reward_coins():
-                    additions_since_fork[coinbase_coin.name()] = (coinbase_coin, curr.height)
-                    coinbases_since_fork[coinbase_coin.name()] = curr.height
-                if curr.height == 0:
-                    break
-                curr = await block_store.get_full_block(curr.prev_header_hash)
-                assert curr is not None
+            if fork_coin_views is None:
+                fork_coin_views = ForkCoinViewCache()
+            fork_view = await fork_coin_views.get_view(block_store, block.prev_header_hash, fork_h)
+        else:
+            fork_view = ForkCoinView(fork_h)
 
         removal_coin_records: Dict[bytes32, CoinRecord] = {}
         for rem in removals:
@@ -291,7 +281,7 @@ async def validate_block_body(
                     height,
                     uint32(0),
                     False,
-                    (rem in coinbases_since_fork),
+                    fork_view.is_coinbase(rem),
                     block.foliage_transaction_block.timestamp,
                 )
                 removal_coin_records[new_unspent.name] = new_unspent
@@ -306,24 +296,25 @@ async def validate_block_body(
                     removal_coin_records[unspent.name] = unspent
                 else:
                     # This coin is not in the current heaviest chain, so it must be in the fork
-                    if rem not in additions_since_fork:
+                    addition_since_fork: Optional[Tuple[Coin, uint32]] = fork_view.get_addition(rem)
+                    if addition_since_fork is None:
                         # Check for spending a coin that does not exist in this fork
                         # TODO: fix this, there is a consensus bug here
                         return Err.UNKNOWN_UNSPENT, None
-                    new_coin, confirmed_height = additions_since_fork[rem]
+                    new_coin, confirmed_height = addition_since_fork
                     new_coin_record: CoinRecord = CoinRecord(
                         new_coin,
                         confirmed_height,
                         uint32(0),
                         False,
-                        (rem in coinbases_since_fork),
+                        fork_view.is_coinbase(rem),
                         block.foliage_transaction_block.timestamp,
                     )
                     removal_coin_records[new_coin_record.name] = new_coin_record
 
                 # This check applies to both coins created before fork (pulled from coin_store),
-                # and coins created after fork (additions_since_fork)>
-                if rem in removals_since_fork:
+                # and coins created after fork (fork_view)
+                if fork_view.is_removed(rem):
                     # This coin was spent in the fork
                     return Err.DOUBLE_SPEND, None
 
@@ -367,9 +358,6 @@ async def validate_block_body(
                 return Err.WRONG_PUZZLE_HASH, None
 
         # 21. Verify conditions
-        # create hash_key list for aggsig check
-        pairs_pks = []
-        pairs_msgs = []
         for npc in npc_list:
             assert height is not None
             unspent = removal_coin_records[npc.coin_name]
@@ -382,17 +370,26 @@ async def validate_block_body(
             )
             if error:
                 return error, None
-            for pk, m in pkm_pairs_for_conditions_dict(npc.condition_dict, npc.coin_name):
-                pairs_pks.append(pk)
-                pairs_msgs.append(m)
 
         # 22. Verify aggregated signature
-        # TODO: move this to pre_validate_blocks_multiprocessing so we can sync faster
-        if not block.transactions_info.aggregated_signature:
-            return Err.BAD_AGGREGATE_SIGNATURE, None
-
-            # noinspection PyTypeChecker
-        if not AugSchemeMPL.aggregate_verify(pairs_pks, pairs_msgs, block.transactions_info.aggregated_signature):
+        if not validated_signature and not aggregate_signature_is_valid(block.transactions_info, npc_list):
             return Err.BAD_AGGREGATE_SIGNATURE, None
 
         return None, result
+
+
+def aggregate_signature_is_valid(transactions_info: TransactionsInfo, npc_list: List[NPC]) -> bool:
+    """
+    Step 22 of validate_block_body. It only depends on the conditions of the generator, and not on the coin set, so
+    it is also checked in pre-validation, where the NPC list is computed.
+    """
+    if not transactions_info.aggregated_signature:
+        return False
+    pairs_pks = []
+    pairs_msgs = []
+    for npc in npc_list:
+        for pk, m in pkm_pairs_for_conditions_dict(npc.condition_dict, npc.coin_name):
+            pairs_pks.append(pk)
+            pairs_msgs.append(m)
+    # noinspection PyTypeChecker
+    return AugSchemeMPL.aggregate_verify(pairs_pks, pairs_msgs, transactions_info.aggregated_signature)
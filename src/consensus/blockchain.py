@@ -3,7 +3,13 @@ import dataclasses
 import logging
 from concurrent.futures.process import ProcessPoolExecutor
 
-from src.consensus.multiprocess_validation import pre_validate_blocks_multiprocessing, PreValidationResult
+from src.consensus.multiprocess_validation import (
+    PreValidationBatches,
+    PreValidationResult,
+    init_validation_worker,
+    pre_validate_blocks_in_batches,
+    pre_validate_blocks_multiprocessing,
+)
 from src.types.header_block import HeaderBlock
 from src.types.weight_proof import SubEpochChallengeSegment
 from src.util.streamable import recurse_jsonify
@@ -14,6 +20,7 @@ from typing import Dict, List, Optional, Tuple, Set
 from src.consensus.blockchain_interface import BlockchainInterface
 from src.consensus.constants import ConsensusConstants
 from src.consensus.block_body_validation import validate_block_body
+from src.consensus.fork_coin_view import ForkCoinViewCache
 from src.full_node.block_store import BlockStore
 from src.full_node.coin_store import CoinStore
 from src.consensus.difficulty_adjustment import (
@@ -22,8 +29,9 @@ from src.consensus.difficulty_adjustment import (
     get_sub_slot_iters_and_difficulty,
 )
 from src.consensus.full_block_to_block_record import block_to_block_record
+from src.types.blockchain_format.coin import Coin
 from src.types.end_of_slot_bundle import EndOfSubSlotBundle
-from src.types.full_block import FullBlock
+from src.types.full_block import FullBlock, tx_removals_and_additions_for_npc
 from src.types.blockchain_format.sized_bytes import bytes32
 from src.consensus.block_record import BlockRecord
 from src.types.blockchain_format.sub_epoch_summary import SubEpochSummary
@@ -73,8 +81,11 @@ class Blockchain(BlockchainInterface):
     coin_store: CoinStore
     # Store
     block_store: BlockStore
+    # Coins added and removed in the forks that blocks are being validated on
+    fork_coin_views: ForkCoinViewCache
     # Used to verify blocks in parallel
     pool: ProcessPoolExecutor
+    num_workers: int
 
     # Whether blockchain is shut down or not
     _shut_down: bool
@@ -98,14 +109,17 @@ class Blockchain(BlockchainInterface):
         cpu_count = multiprocessing.cpu_count()
         if cpu_count > 61:
             cpu_count = 61  # Windows Server 2016 has an issue https://bugs.python.org/issue26903
-        num_workers = max(cpu_count - 2, 1)
-        self.pool = ProcessPoolExecutor(max_workers=num_workers)
-        log.info(f"Started {num_workers} processes for block validation")
-
+        self.num_workers = max(cpu_count - 2, 1)
         self.constants = consensus_constants
+        self.constants_json = recurse_jsonify(dataclasses.asdict(self.constants))
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.num_workers, initializer=init_validation_worker, initargs=(self.constants_json,)
+        )
+        log.info(f"Started {self.num_workers} processes for block validation")
+
         self.coin_store = coin_store
         self.block_store = block_store
-        self.constants_json = recurse_jsonify(dataclasses.asdict(self.constants))
+        self.fork_coin_views = ForkCoinViewCache()
         self._shut_down = False
         await self._load_chain_from_store()
         return self
@@ -211,7 +225,7 @@ class Blockchain(BlockchainInterface):
             required_iters = pre_validation_result.required_iters
             assert pre_validation_result.error is None
         assert required_iters is not None
-        error_code, _ = await validate_block_body(
+        error_code, cost_result = await validate_block_body(
             self.constants,
             self,
             self.block_store,
@@ -221,6 +235,8 @@ class Blockchain(BlockchainInterface):
             block.height,
             pre_validation_result.cost_result if pre_validation_result is not None else None,
             fork_point_with_peak,
+            self.fork_coin_views,
+            pre_validation_result.validated_signature if pre_validation_result is not None else False,
         )
         if error_code is not None:
             return ReceiveBlockResult.INVALID_BLOCK, error_code, None
@@ -232,8 +248,17 @@ class Blockchain(BlockchainInterface):
             block,
             None,
         )
+        # The removals and additions are recorded, so the generator is not run again when the block is applied to
+        # the coin store, on reorgs, or when serving header blocks
+        tx_removals_and_additions: Optional[Tuple[List[bytes32], List[Coin]]] = None
+        if block.is_transaction_block():
+            if cost_result is not None:
+                tx_removals_and_additions = tx_removals_and_additions_for_npc(cost_result.npc_list)
+            else:
+                tx_removals_and_additions = block.tx_removals_and_additions()
+
         # Always add the block to the database
-        await self.block_store.add_full_block(block, block_record)
+        await self.block_store.add_full_block(block, block_record, tx_removals_and_additions)
 
         self.add_block_record(block_record)
 
@@ -263,7 +288,7 @@ class Blockchain(BlockchainInterface):
                 # in sync.
                 await self.block_store.begin_transaction()
                 try:
-                    await self.coin_store.new_block(block)
+                    await self.coin_store.new_block(block, await self.block_store.get_tx_removals_and_additions(block))
                     self.__height_to_hash[uint32(0)] = block.header_hash
                     self._peak_height = uint32(0)
                     await self.block_store.set_peak(block.header_hash)
@@ -271,6 +296,7 @@ class Blockchain(BlockchainInterface):
                 except Exception:
                     await self.block_store.rollback_transaction()
                     raise
+                self.block_store.update_height_index(-1, [block_record])
                 return uint32(0)
             return None
 
@@ -321,7 +347,10 @@ class Blockchain(BlockchainInterface):
                 for fetched_full_block, fetched_block_record in reversed(blocks_to_add):
                     self.__height_to_hash[fetched_block_record.height] = fetched_block_record.header_hash
                     if fetched_block_record.is_transaction_block:
-                        await self.coin_store.new_block(fetched_full_block)
+                        await self.coin_store.new_block(
+                            fetched_full_block,
+                            await self.block_store.get_tx_removals_and_additions(fetched_full_block),
+                        )
                     if fetched_block_record.sub_epoch_summary_included is not None:
                         self.__sub_epoch_summaries[
                             fetched_block_record.height
@@ -335,6 +364,9 @@ class Blockchain(BlockchainInterface):
                 await self.block_store.rollback_transaction()
                 raise
 
+            self.block_store.update_height_index(
+                fork_height, [fetched_block_record for _, fetched_block_record in reversed(blocks_to_add)]
+            )
             return uint32(max(fork_height, 0))
 
         # This is not a heavier block than the heaviest we have seen, so we don't change the coin set
@@ -450,7 +482,7 @@ class Blockchain(BlockchainInterface):
             not self.contains_block(block.prev_header_hash)
             and not block.prev_header_hash == self.constants.GENESIS_CHALLENGE
         ):
-            return PreValidationResult(uint16(Err.INVALID_PREV_BLOCK_HASH.value), None, None)
+            return PreValidationResult(uint16(Err.INVALID_PREV_BLOCK_HASH.value), None, None, False)
 
         unfinished_header_block = UnfinishedHeaderBlock(
             block.finished_sub_slots,
@@ -476,7 +508,7 @@ class Blockchain(BlockchainInterface):
         )
 
         if error is not None:
-            return PreValidationResult(uint16(error.code.value), None, None)
+            return PreValidationResult(uint16(error.code.value), None, None, False)
 
         prev_height = (
             -1
@@ -493,18 +525,28 @@ class Blockchain(BlockchainInterface):
             block,
             uint32(prev_height + 1),
             None,
+            None,
+            self.fork_coin_views,
         )
 
         if error_code is not None:
-            return PreValidationResult(uint16(error_code.value), None, None)
+            return PreValidationResult(uint16(error_code.value), None, None, False)
 
-        return PreValidationResult(None, required_iters, cost_result)
+        # The signature is verified again when the finished block is added, which may have different foliage
+        return PreValidationResult(None, required_iters, cost_result, False)
 
     async def pre_validate_blocks_multiprocessing(
         self, blocks: List[FullBlock], validate_transactions: bool = True
     ) -> Optional[List[PreValidationResult]]:
         return await pre_validate_blocks_multiprocessing(
-            self.constants, self.constants_json, self, blocks, self.pool, validate_transactions, True
+            self.constants, self.constants_json, self, blocks, self.pool, validate_transactions, True, self.num_workers
+        )
+
+    async def pre_validate_blocks_in_batches(
+        self, blocks: List[FullBlock], validate_transactions: bool = True
+    ) -> Optional[PreValidationBatches]:
+        return await pre_validate_blocks_in_batches(
+            self.constants, self.constants_json, self, blocks, self.pool, validate_transactions, True, self.num_workers
         )
 
     def contains_block(self, header_hash: bytes32) -> bool:
@@ -616,7 +658,8 @@ class Blockchain(BlockchainInterface):
         block = await self.block_store.get_full_block(header_hash)
         if block is None:
             return None
-        return block.get_block_header()
+        removals, additions = await self.block_store.get_tx_removals_and_additions(block)
+        return block.get_block_header(additions, removals)
 
     async def persist_sub_epoch_challenge_segments(
         self, sub_epoch_summary_height: uint32, segments: List[SubEpochChallengeSegment]
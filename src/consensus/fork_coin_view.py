@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.full_node.block_store import BlockStore
+from src.types.blockchain_format.coin import Coin
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.types.full_block import FullBlock
+from src.util.ints import uint32
+
+# Coins held by the cached fork views, counting the parts shared between views once. Views of forks that are not
+# extended anymore are evicted first.
+DEFAULT_MAX_FORK_VIEW_COINS = 250000
+
+
+class ForkCoinView:
+    """
+    The coins added and removed by the blocks of a fork, from the block after the fork point with the peak chain
+    (fork_height) up to and including the tip of the fork.
+
+    A view only holds the coins of its last blocks, and links to the view of the blocks before them. Extending a
+    view creates a new view on top of it, and when the new view holds at least half as many coins as its parent,
+    the parent is merged into it. This keeps both the chain of views and the coins copied by the merges logarithmic
+    in the number of coins of the fork. A view is not changed after it was cached.
+    """
+
+    def __init__(self, fork_height: int, parent: Optional["ForkCoinView"] = None):
+        self.fork_height = fork_height
+        self.parent = parent
+        self.additions: Dict[bytes32, Tuple[Coin, uint32]] = {}
+        self.removals: Set[bytes32] = set()
+        self.coinbases: Dict[bytes32, uint32] = {}
+
+    def coin_count(self) -> int:
+        """
+        Coins held by this view, without its parents.
+        """
+        return len(self.additions) + len(self.removals)
+
+    def chain(self) -> List["ForkCoinView"]:
+        views = []
+        view: Optional[ForkCoinView] = self
+        while view is not None:
+            views.append(view)
+            view = view.parent
+        return views
+
+    def get_addition(self, coin_name: bytes32) -> Optional[Tuple[Coin, uint32]]:
+        """
+        Returns the coin and the height it was created at, if it was created since the fork point.
+        """
+        for view in self.chain():
+            addition = view.additions.get(coin_name)
+            if addition is not None:
+                return addition
+        return None
+
+    def is_removed(self, coin_name: bytes32) -> bool:
+        return any(coin_name in view.removals for view in self.chain())
+
+    def is_coinbase(self, coin_name: bytes32) -> bool:
+        return any(coin_name in view.coinbases for view in self.chain())
+
+    async def extend(self, block_store: BlockStore, block: FullBlock) -> "ForkCoinView":
+        """
+        Returns the view of this view's blocks followed by block. This view is not changed.
+        """
+        view = ForkCoinView(self.fork_height, self)
+        removals, additions = await block_store.get_tx_removals_and_additions(block)
+        view.removals.update(removals)
+        for coin in additions:
+            view.additions[coin.name()] = (coin, block.height)
+        for coinbase_coin in block.get_included_reward_coins():
+            view.additions[coinbase_coin.name()] = (coinbase_coin, block.height)
+            view.coinbases[coinbase_coin.name()] = block.height
+        if view.coin_count() == 0:
+            return self
+
+        # The new view is not shared yet, so the parents are merged into it instead of copying it
+        parent = view.parent
+        while parent is not None and 2 * view.coin_count() >= parent.coin_count():
+            for name, addition in parent.additions.items():
+                view.additions.setdefault(name, addition)
+            view.removals.update(parent.removals)
+            for name, height in parent.coinbases.items():
+                view.coinbases.setdefault(name, height)
+            parent = parent.parent
+        view.parent = parent
+        return view
+
+
+class ForkCoinViewCache:
+    """
+    Coin views of the forks that blocks were recently validated on, by tip. Validating the next block of a fork
+    extends the view of its parent with the parent's block, instead of loading all the blocks since the fork point.
+    """
+
+    def __init__(self, max_coins: int = DEFAULT_MAX_FORK_VIEW_COINS):
+        self.max_coins = max_coins
+        self.views: "OrderedDict[bytes32, ForkCoinView]" = OrderedDict()
+        # Number of cached views that each view is part of the chain of
+        self.view_refs: Dict[ForkCoinView, int] = {}
+        self.coin_count = 0
+
+    def _put(self, tip_hash: bytes32, view: ForkCoinView) -> None:
+        self._remove(tip_hash)
+        self.views[tip_hash] = view
+        for part in view.chain():
+            refs = self.view_refs.get(part, 0)
+            if refs == 0:
+                self.coin_count += part.coin_count()
+            self.view_refs[part] = refs + 1
+        # The newest view is kept even when it is larger than the limit
+        while self.coin_count > self.max_coins and len(self.views) > 1:
+            self._remove(next(iter(self.views)))
+
+    def _remove(self, tip_hash: bytes32) -> None:
+        view = self.views.pop(tip_hash, None)
+        if view is None:
+            return
+        for part in view.chain():
+            refs = self.view_refs[part] - 1
+            if refs == 0:
+                self.coin_count -= part.coin_count()
+                del self.view_refs[part]
+            else:
+                self.view_refs[part] = refs
+
+    async def get_view(self, block_store: BlockStore, tip_hash: bytes32, fork_height: int) -> ForkCoinView:
+        """
+        Returns the view of the blocks after fork_height, up to and including tip_hash. The view must not be
+        changed.
+        """
+        view: Optional[ForkCoinView] = None
+        blocks_to_add: List[FullBlock] = []
+        header_hash = tip_hash
+        while True:
+            cached: Optional[ForkCoinView] = self.views.get(header_hash)
+            if cached is not None and cached.fork_height == fork_height:
+                self.views.move_to_end(header_hash)
+                view = cached
+                break
+            block: Optional[FullBlock] = await block_store.get_full_block(header_hash)
+            assert block is not None
+            if block.height <= fork_height:
+                break
+            blocks_to_add.append(block)
+            if block.height == 0:
+                break
+            header_hash = block.prev_header_hash
+
+        if len(blocks_to_add) == 0:
+            # Either the view was cached, or the tip is the fork point, which is not worth caching
+            return view if view is not None else ForkCoinView(fork_height)
+        if view is None:
+            view = ForkCoinView(fork_height)
+        for block in reversed(blocks_to_add):
+            view = await view.extend(block_store, block)
+        self._put(tip_hash, view)
+        return view
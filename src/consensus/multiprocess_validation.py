@@ -1,10 +1,12 @@
 import asyncio
+import bisect
 import logging
 import traceback
 from concurrent.futures.process import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional, Tuple, Dict, Union, Sequence
+from typing import Awaitable, List, Optional, Tuple, Dict, Union, Sequence
 
+from src.consensus.block_body_validation import aggregate_signature_is_valid
 from src.consensus.block_header_validation import validate_finished_header_block
 from src.consensus.blockchain_interface import BlockchainInterface
 from src.consensus.constants import ConsensusConstants
@@ -26,6 +28,26 @@ from src.util.streamable import dataclass_from_dict, streamable, Streamable
 
 log = logging.getLogger(__name__)
 
+# Estimated cost of validating a block header, in bytes of transactions generator, used to size batches
+HEADER_VALIDATION_WEIGHT = 10000
+# Batches are split so that each worker gets about this many, which keeps all of them busy, and returns the first
+# results while later batches are still being validated
+BATCHES_PER_WORKER = 2
+MIN_BATCH_WEIGHT = 2 * HEADER_VALIDATION_WEIGHT
+MAX_BATCH_SIZE = 32
+WORKER_BLOCK_RECORD_CACHE_SIZE = 10000
+
+# Set in each worker process by init_validation_worker, so the constants are not rebuilt for every batch
+_worker_constants: Optional[ConsensusConstants] = None
+# Block records parsed by this worker, by their serialization. Consecutive batches share most of their recent
+# block records, so each one is only parsed once per worker
+_worker_block_records: Dict[bytes, BlockRecord] = {}
+
+
+def init_validation_worker(constants_dict: Dict) -> None:
+    global _worker_constants
+    _worker_constants = dataclass_from_dict(ConsensusConstants, constants_dict)
+
 
 @dataclass(frozen=True)
 @streamable
@@ -33,6 +55,9 @@ class PreValidationResult(Streamable):
     error: Optional[uint16]
     required_iters: Optional[uint64]  # Iff error is None
     cost_result: Optional[CostResult]  # Iff error is None and block is a transaction block
+    # Whether the aggregate signature of the transactions was verified, and is valid. If it is False, it is verified
+    # by validate_block_body
+    validated_signature: bool
 
 
 def batch_pre_validate_blocks(
@@ -46,11 +71,20 @@ def batch_pre_validate_blocks(
     validate_transactions: bool,
 ) -> List[bytes]:
     assert len(header_blocks_pickled) == len(transaction_generators)
+    if len(_worker_block_records) > WORKER_BLOCK_RECORD_CACHE_SIZE:
+        _worker_block_records.clear()
     blocks = {}
     for k, v in blocks_pickled.items():
-        blocks[k] = BlockRecord.from_bytes(v)
+        block_record = _worker_block_records.get(v)
+        if block_record is None:
+            block_record = BlockRecord.from_bytes(v)
+            _worker_block_records[v] = block_record
+        blocks[k] = block_record
     results: List[PreValidationResult] = []
-    constants: ConsensusConstants = dataclass_from_dict(ConsensusConstants, constants_dict)
+    if _worker_constants is not None:
+        constants: ConsensusConstants = _worker_constants
+    else:
+        constants = dataclass_from_dict(ConsensusConstants, constants_dict)
     for i in range(len(header_blocks_pickled)):
         try:
             header_block: HeaderBlock = HeaderBlock.from_bytes(header_blocks_pickled[i])
@@ -64,6 +98,7 @@ def batch_pre_validate_blocks(
                 expected_sub_slot_iters[i],
             )
             cost_result: Optional[CostResult] = None
+            validated_signature = False
             error_int: Optional[uint16] = None
             if error is not None:
                 error_int = uint16(error.code.value)
@@ -74,14 +109,84 @@ def batch_pre_validate_blocks(
                     cost_result = calculate_cost_of_program(
                         SerializedProgram.from_bytes(generator), constants.CLVM_COST_RATIO_CONSTANT
                     )
-            results.append(PreValidationResult(error_int, required_iters, cost_result))
+                    # An invalid signature is not an error here, validate_block_body checks it again, so that the
+                    # block fails with the same error as without pre-validation
+                    if cost_result.error is None and header_block.transactions_info is not None:
+                        validated_signature = aggregate_signature_is_valid(
+                            header_block.transactions_info, cost_result.npc_list
+                        )
+            results.append(PreValidationResult(error_int, required_iters, cost_result, validated_signature))
         except Exception:
             error_stack = traceback.format_exc()
             log.error(f"Exception: {error_stack}")
-            results.append(PreValidationResult(uint16(Err.UNKNOWN.value), None, None))
+            results.append(PreValidationResult(uint16(Err.UNKNOWN.value), None, None, False))
     return [bytes(r) for r in results]
 
 
+def batch_sizes_for_weights(weights: List[int], num_workers: int) -> List[int]:
+    """
+    Splits consecutive blocks into batches of about the same total weight, so that heavy transaction blocks are
+    spread over the workers, and each worker gets around BATCHES_PER_WORKER batches.
+    """
+    target_weight = max(sum(weights) // (num_workers * BATCHES_PER_WORKER), MIN_BATCH_WEIGHT)
+    batch_sizes: List[int] = []
+    batch_weight = 0
+    batch_size = 0
+    for weight in weights:
+        batch_weight += weight
+        batch_size += 1
+        if batch_weight >= target_weight or batch_size >= MAX_BATCH_SIZE:
+            batch_sizes.append(batch_size)
+            batch_weight = 0
+            batch_size = 0
+    if batch_size > 0:
+        batch_sizes.append(batch_size)
+    return batch_sizes
+
+
+class PreValidationBatches:
+    """
+    Results of pre-validating a list of blocks, which arrive batch by batch as the workers finish, so that the first
+    blocks can be added to the chain while the later ones are still being validated.
+    """
+
+    def __init__(self, futures: List[Awaitable[List[bytes]]], batch_sizes: List[int]):
+        assert len(futures) == len(batch_sizes)
+        self.futures = futures
+        self.batch_starts: List[int] = []
+        start = 0
+        for batch_size in batch_sizes:
+            self.batch_starts.append(start)
+            start += batch_size
+        self.results: List[Optional[List[PreValidationResult]]] = [None] * len(futures)
+
+    async def _get_batch(self, batch_index: int) -> List[PreValidationResult]:
+        results = self.results[batch_index]
+        if results is None:
+            results = [PreValidationResult.from_bytes(result) for result in await self.futures[batch_index]]
+            self.results[batch_index] = results
+        return results
+
+    async def get(self, block_index: int) -> PreValidationResult:
+        """
+        Returns the result for the block at block_index, waiting only for the batch that contains it.
+        """
+        batch_index = bisect.bisect_right(self.batch_starts, block_index) - 1
+        results = await self._get_batch(batch_index)
+        return results[block_index - self.batch_starts[batch_index]]
+
+    async def get_all(self) -> List[PreValidationResult]:
+        return [result for batch_index in range(len(self.futures)) for result in await self._get_batch(batch_index)]
+
+    def cancel(self) -> None:
+        """
+        Cancels the batches that have not started validating yet, when their results are not needed anymore.
+        """
+        for future in self.futures:
+            if isinstance(future, asyncio.Future):
+                future.cancel()
+
+
 async def pre_validate_blocks_multiprocessing(
     constants: ConsensusConstants,
     constants_json: Dict,
@@ -90,6 +195,7 @@ async def pre_validate_blocks_multiprocessing(
     pool: ProcessPoolExecutor,
     validate_transactions: bool,
     check_filter: bool,
+    num_workers: int = 1,
 ) -> Optional[List[PreValidationResult]]:
     """
     This method must be called under the blockchain lock
@@ -104,8 +210,38 @@ async def pre_validate_blocks_multiprocessing(
         constants:
         block_records:
         blocks: list of full blocks to validate (must be connected to current chain)
+        num_workers: number of processes in the pool, used to size the batches
+    """
+    batches = await pre_validate_blocks_in_batches(
+        constants,
+        constants_json,
+        block_records,
+        blocks,
+        pool,
+        validate_transactions,
+        check_filter,
+        num_workers,
+    )
+    if batches is None:
+        return None
+    return await batches.get_all()
+
+
+async def pre_validate_blocks_in_batches(
+    constants: ConsensusConstants,
+    constants_json: Dict,
+    block_records: BlockchainInterface,
+    blocks: Sequence[Union[FullBlock, HeaderBlock]],
+    pool: ProcessPoolExecutor,
+    validate_transactions: bool,
+    check_filter: bool,
+    num_workers: int = 1,
+) -> Optional[PreValidationBatches]:
+    """
+    Same as pre_validate_blocks_multiprocessing, but returns as soon as the batches are submitted to the pool. The
+    caller can then wait for the result of each block separately.
+    This method must be called under the blockchain lock
     """
-    batch_size = 4
     prev_b: Optional[BlockRecord] = None
     # Collects all the recent blocks (up to the previous sub-epoch)
     recent_blocks: Dict[bytes32, BlockRecord] = {}
@@ -114,7 +250,11 @@ async def pre_validate_blocks_multiprocessing(
     num_blocks_seen = 0
     if blocks[0].height > 0:
         if not block_records.contains_block(blocks[0].prev_header_hash):
-            return [PreValidationResult(uint16(Err.INVALID_PREV_BLOCK_HASH.value), None, None)]
+            invalid_prev = asyncio.get_running_loop().create_future()
+            invalid_prev.set_result(
+                [bytes(PreValidationResult(uint16(Err.INVALID_PREV_BLOCK_HASH.value), None, None, False))]
+            )
+            return PreValidationBatches([invalid_prev], [1])
         curr = block_records.block_record(blocks[0].prev_header_hash)
         num_sub_slots_to_look_for = 3 if curr.overflow else 2
         while (
@@ -187,27 +327,39 @@ async def pre_validate_blocks_multiprocessing(
             block_records.remove_block_record(block.header_hash)
 
     recent_sb_compressed_pickled = {bytes(k): bytes(v) for k, v in recent_blocks_compressed.items()}
+    # Only serialized if a batch has finished sub slots, and then only once for all of them
+    recent_sb_pickled: Optional[Dict[bytes, bytes]] = None
+
+    hb_pickled: List[bytes] = []
+    generators: List[Optional[bytes]] = []
+    weights: List[int] = []
+    for block in blocks:
+        if isinstance(block, FullBlock):
+            hb_pickled.append(bytes(block.get_block_header()))
+            generators.append(
+                bytes(block.transactions_generator) if block.transactions_generator is not None else None
+            )
+        else:
+            hb_pickled.append(bytes(block))
+            generators.append(None)
+        generator = generators[-1]
+        if validate_transactions and generator is not None:
+            weights.append(HEADER_VALIDATION_WEIGHT + len(generator))
+        else:
+            weights.append(HEADER_VALIDATION_WEIGHT)
 
     futures = []
+    batch_sizes = batch_sizes_for_weights(weights, num_workers)
     # Pool of workers to validate blocks concurrently
-    for i in range(0, len(blocks), batch_size):
-        end_i = min(i + batch_size, len(blocks))
-        blocks_to_validate = blocks[i:end_i]
-        if any([len(block.finished_sub_slots) > 0 for block in blocks_to_validate]):
-            final_pickled = {bytes(k): bytes(v) for k, v in recent_blocks.items()}
+    i = 0
+    for batch_size in batch_sizes:
+        end_i = i + batch_size
+        if any([len(block.finished_sub_slots) > 0 for block in blocks[i:end_i]]):
+            if recent_sb_pickled is None:
+                recent_sb_pickled = {bytes(k): bytes(v) for k, v in recent_blocks.items()}
+            final_pickled = recent_sb_pickled
         else:
             final_pickled = recent_sb_compressed_pickled
-        hb_pickled: List[bytes] = []
-        generators: List[Optional[bytes]] = []
-        for block in blocks_to_validate:
-            if isinstance(block, FullBlock):
-                hb_pickled.append(bytes(block.get_block_header()))
-                generators.append(
-                    bytes(block.transactions_generator) if block.transactions_generator is not None else None
-                )
-            else:
-                hb_pickled.append(bytes(block))
-                generators.append(None)
 
         futures.append(
             asyncio.get_running_loop().run_in_executor(
@@ -215,17 +367,13 @@ async def pre_validate_blocks_multiprocessing(
                 batch_pre_validate_blocks,
                 constants_json,
                 final_pickled,
-                hb_pickled,
-                generators,
+                hb_pickled[i:end_i],
+                generators[i:end_i],
                 check_filter,
                 [diff_ssis[j][0] for j in range(i, end_i)],
                 [diff_ssis[j][1] for j in range(i, end_i)],
                 validate_transactions,
             )
         )
-    # Collect all results into one flat list
-    return [
-        PreValidationResult.from_bytes(result)
-        for batch_result in (await asyncio.gather(*futures))
-        for result in batch_result
-    ]
+        i = end_i
+    return PreValidationBatches(futures, batch_sizes)
@@ -0,0 +1,204 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.protocols.full_node_protocol import RejectBlocks, RequestBlocks, RespondBlocks
+from src.server.ws_connection import WSChiaConnection
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.types.full_block import FullBlock
+from src.util.ints import uint32
+
+log = logging.getLogger(__name__)
+
+# Weight of the latest measurement in the throughput of a peer
+THROUGHPUT_SMOOTHING = 0.3
+# Throughput assumed for a peer before any of its requests finished, in blocks per second
+INITIAL_THROUGHPUT = 10.0
+
+
+class BlockDownloader:
+    """
+    Downloads consecutive ranges of blocks from several peers at once, and hands them out in order of height.
+
+    Up to max_in_flight ranges are requested at the same time, and only ranges within window ranges of the next
+    one to be validated, so memory use is bounded. Each peer gets at most max_in_flight_per_peer ranges. A new
+    range goes to the peer expected to deliver it first, based on the throughput it delivered so far, so slow
+    peers get fewer ranges. If the range that validation waits for takes longer than hedge_after seconds, it is
+    requested from another peer as well, and the first response is used.
+    Peers that time out or reject a request are not used again, and their ranges go to the other peers.
+    """
+
+    def __init__(
+        self,
+        ranges: List[Tuple[int, int]],
+        peers: List[WSChiaConnection],
+        max_in_flight: int,
+        max_in_flight_per_peer: int,
+        window: int,
+        hedge_after: float,
+    ):
+        self.ranges = ranges
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_peer = max_in_flight_per_peer
+        self.window = window
+        self.hedge_after = hedge_after
+
+        self.peers: Dict[bytes32, WSChiaConnection] = {}
+        self.failed_peers: Set[bytes32] = set()
+        self.throughput: Dict[bytes32, float] = {}
+        self.peer_in_flight: Dict[bytes32, int] = {}
+        self.set_peers(peers)
+
+        # Index of the next range to be returned by next_batch
+        self.next_index = 0
+        # Ranges that need to be requested, smallest index first
+        self.pending: List[int] = list(range(len(ranges)))
+        self.in_flight: Dict[int, List[Tuple[asyncio.Task, bytes32]]] = {}
+        self.responses: Dict[int, Tuple[List[FullBlock], WSChiaConnection]] = {}
+        self.progress = asyncio.Event()
+
+    def set_peers(self, peers: List[WSChiaConnection]) -> None:
+        """
+        Replaces the peers to download from, for example when peers with the sync target connect or disconnect.
+        """
+        self.peers = {peer.peer_node_id: peer for peer in peers if peer.peer_node_id not in self.failed_peers}
+        for peer_id in self.peers.keys():
+            self.peer_in_flight.setdefault(peer_id, 0)
+
+    def _remove_peer(self, peer_id: bytes32) -> None:
+        self.failed_peers.add(peer_id)
+        self.peers.pop(peer_id, None)
+
+    def _expected_finish(self, peer_id: bytes32) -> float:
+        if peer_id in self.throughput:
+            throughput = self.throughput[peer_id]
+        elif len(self.throughput) > 0:
+            # Unknown peers are assumed to be as fast as the fastest one, so they get tried
+            throughput = max(self.throughput.values())
+        else:
+            throughput = INITIAL_THROUGHPUT
+        return (self.peer_in_flight[peer_id] + 1) / throughput
+
+    def _pick_peer(self, exclude: Set[bytes32]) -> Optional[WSChiaConnection]:
+        best: Optional[WSChiaConnection] = None
+        best_finish = 0.0
+        for peer_id, peer in list(self.peers.items()):
+            if peer.closed:
+                self._remove_peer(peer_id)
+                continue
+            if peer_id in exclude or self.peer_in_flight[peer_id] >= self.max_in_flight_per_peer:
+                continue
+            finish = self._expected_finish(peer_id)
+            if best is None or finish < best_finish:
+                best, best_finish = peer, finish
+        return best
+
+    def _request(self, index: int, peer: WSChiaConnection) -> None:
+        peer_id = peer.peer_node_id
+        self.peer_in_flight[peer_id] += 1
+        task = asyncio.create_task(self._fetch(index, peer))
+        self.in_flight.setdefault(index, []).append((task, peer_id))
+
+    def _schedule(self) -> None:
+        while len(self.pending) > 0 and sum(len(tasks) for tasks in self.in_flight.values()) < self.max_in_flight:
+            index = self.pending[0]
+            if index >= self.next_index + self.window:
+                break
+            peer = self._pick_peer(set())
+            if peer is None:
+                break
+            heapq.heappop(self.pending)
+            self._request(index, peer)
+
+    async def _fetch(self, index: int, peer: WSChiaConnection) -> None:
+        peer_id = peer.peer_node_id
+        start_height, end_height = self.ranges[index]
+        start_time = time.time()
+        response = None
+        try:
+            response = await peer.request_blocks(RequestBlocks(uint32(start_height), uint32(end_height), True))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning(f"Error requesting blocks {start_height} to {end_height} from {peer.peer_host}: {e}")
+        finally:
+            self.peer_in_flight[peer_id] -= 1
+            self.in_flight[index] = [(t, p) for t, p in self.in_flight.get(index, []) if p != peer_id]
+            if len(self.in_flight[index]) == 0:
+                del self.in_flight[index]
+
+        if isinstance(response, RespondBlocks):
+            blocks_per_second = (end_height - start_height + 1) / max(time.time() - start_time, 0.001)
+            previous = self.throughput.get(peer_id)
+            if previous is None:
+                self.throughput[peer_id] = blocks_per_second
+            else:
+                self.throughput[peer_id] = (
+                    1 - THROUGHPUT_SMOOTHING
+                ) * previous + THROUGHPUT_SMOOTHING * blocks_per_second
+            if index >= self.next_index and index not in self.responses:
+                self.responses[index] = (response.blocks, peer)
+                # The other request for the same range is not needed anymore
+                for task, _ in self.in_flight.get(index, []):
+                    task.cancel()
+        else:
+            if response is None:
+                log.info(f"No response for blocks {start_height} to {end_height} from {peer.peer_host}")
+                await peer.close()
+            elif not isinstance(response, RejectBlocks):
+                log.warning(f"Unexpected response to request_blocks from {peer.peer_host}: {type(response)}")
+            self._remove_peer(peer_id)
+            if index >= self.next_index and index not in self.responses and index not in self.in_flight:
+                heapq.heappush(self.pending, index)
+        self.progress.set()
+
+    def _hedge(self, index: int) -> None:
+        requested_from = {peer_id for _, peer_id in self.in_flight.get(index, [])}
+        peer = self._pick_peer(requested_from)
+        if peer is not None:
+            log.info(f"Requesting blocks {self.ranges[index]} from {peer.peer_host} as well, the first peer is slow")
+            self._request(index, peer)
+
+    async def next_batch(self) -> Optional[Tuple[int, List[FullBlock], WSChiaConnection]]:
+        """
+        Returns the next range in order of height, as its index, the blocks and the peer that sent them. Returns None
+        when all ranges were returned, or when no peers are left to download the next one from.
+        """
+        while True:
+            if self.next_index >= len(self.ranges):
+                return None
+            if self.next_index in self.responses:
+                index = self.next_index
+                blocks, peer = self.responses.pop(index)
+                self.next_index += 1
+                self._schedule()
+                return index, blocks, peer
+            self._schedule()
+            if self.next_index not in self.in_flight:
+                if len(self.peers) == 0 or len(self.in_flight) == 0:
+                    return None
+            self.progress.clear()
+            try:
+                await asyncio.wait_for(self.progress.wait(), self.hedge_after)
+            except asyncio.TimeoutError:
+                if self.next_index in self.in_flight:
+                    self._hedge(self.next_index)
+
+    def retry(self, index: int, peer: WSChiaConnection) -> None:
+        """
+        Called when the blocks of a range returned by next_batch could not be added, so that the range is downloaded
+        again from another peer, and returned again by next_batch.
+        """
+        assert index == self.next_index - 1
+        self._remove_peer(peer.peer_node_id)
+        self.next_index = index
+        heapq.heappush(self.pending, index)
+
+    def close(self) -> None:
+        for tasks in self.in_flight.values():
+            for task, _ in tasks:
+                task.cancel()
+        self.in_flight = {}
+        self.responses = {}
@@ -1,27 +1,64 @@
 import logging
 import aiosqlite
-from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
 
+from src.types.blockchain_format.coin import Coin
 from src.types.full_block import FullBlock
+from src.types.full_block_view import FullBlockView
 from src.types.header_block import HeaderBlock
 from src.types.blockchain_format.sized_bytes import bytes32
 from src.types.blockchain_format.sub_epoch_summary import SubEpochSummary
 from src.types.weight_proof import SubEpochSegments, SubEpochChallengeSegment
-from src.util.ints import uint32
+from src.util.ints import uint32, uint64
 from src.consensus.block_record import BlockRecord
+from src.full_node.height_index import HeightIndex
 from src.util.lru_cache import LRUCache
 
 log = logging.getLogger(__name__)
 
+# Size of a coin in the tx_removals_and_additions table: parent coin info, puzzle hash, and 8 byte amount
+COIN_RECORD_SIZE = 72
+
+
+def encode_tx_removals_and_additions(removals: List[bytes32], additions: List[Coin]) -> Tuple[bytes, bytes]:
+    return (
+        b"".join(removals),
+        b"".join(
+            coin.parent_coin_info + coin.puzzle_hash + int(coin.amount).to_bytes(8, "big") for coin in additions
+        ),
+    )
+
+
+def decode_tx_removals_and_additions(removals_blob: bytes, additions_blob: bytes) -> Tuple[List[bytes32], List[Coin]]:
+    removals = [bytes32(removals_blob[i : i + 32]) for i in range(0, len(removals_blob), 32)]
+    additions = [
+        Coin(
+            bytes32(additions_blob[i : i + 32]),
+            bytes32(additions_blob[i + 32 : i + 64]),
+            uint64(int.from_bytes(additions_blob[i + 64 : i + COIN_RECORD_SIZE], "big")),
+        )
+        for i in range(0, len(additions_blob), COIN_RECORD_SIZE)
+    ]
+    return removals, additions
+
 
 class BlockStore:
     db: aiosqlite.Connection
     block_cache: LRUCache
+    tx_removals_and_additions_cache: LRUCache
+    height_index: Optional[HeightIndex]
+    # Whether a batch of blocks is being added in a single transaction, see begin_batch
+    in_batch: bool
+    pending_height_index_updates: List[Tuple[int, List[BlockRecord]]]
 
     @classmethod
-    async def create(cls, connection: aiosqlite.Connection):
+    async def create(cls, connection: aiosqlite.Connection, height_index_path: Optional[Path] = None):
         self = cls()
 
+        # Optional on disk index of the peak chain by height, to load the chain without scanning block_records
+        self.height_index = None if height_index_path is None else HeightIndex(height_index_path)
+
         # All full blocks which have been added to the blockchain. Header_hash -> block
         self.db = connection
         await self.db.execute(
@@ -36,6 +73,13 @@ class BlockStore:
             "block blob, sub_epoch_summary blob, is_peak tinyint, is_block tinyint)"
         )
 
+        # Removal names and addition coins of the transactions in each transaction block, recorded when the block is
+        # validated, so the generator does not have to be run again
+        await self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tx_removals_and_additions(header_hash text PRIMARY KEY, removals blob,"
+            " additions blob)"
+        )
+
         # Sub epoch segments for weight proofs
         await self.db.execute(
             "CREATE TABLE IF NOT EXISTS sub_epoch_segments(ses_height bigint PRIMARY KEY, challenge_segments blob)"
@@ -53,23 +97,72 @@ class BlockStore:
 
         await self.db.commit()
         self.block_cache = LRUCache(1000)
+        self.tx_removals_and_additions_cache = LRUCache(1000)
+        self.in_batch = False
+        self.pending_height_index_updates = []
         return self
 
     async def begin_transaction(self):
         # Also locks the coin store, since both stores must be updated at once
-        cursor = await self.db.execute("BEGIN TRANSACTION")
+        if self.in_batch:
+            # Nested in the batch, so that a failed peak update only undoes its own changes
+            cursor = await self.db.execute("SAVEPOINT peak_update")
+        else:
+            cursor = await self.db.execute("BEGIN TRANSACTION")
         await cursor.close()
 
     async def commit_transaction(self):
-        await self.db.commit()
+        if self.in_batch:
+            cursor = await self.db.execute("RELEASE SAVEPOINT peak_update")
+            await cursor.close()
+        else:
+            await self.db.commit()
 
     async def rollback_transaction(self):
         # Also rolls back the coin store, since both stores must be updated at once
-        cursor = await self.db.execute("ROLLBACK")
+        if self.in_batch:
+            cursor = await self.db.execute("ROLLBACK TO SAVEPOINT peak_update")
+            await cursor.close()
+            cursor = await self.db.execute("RELEASE SAVEPOINT peak_update")
+        else:
+            cursor = await self.db.execute("ROLLBACK")
         await cursor.close()
 
-    async def add_full_block(self, block: FullBlock, block_record: BlockRecord) -> None:
+    async def begin_batch(self):
+        """
+        Starts a transaction for a batch of blocks. Until commit_batch, the full blocks, block records, coin store
+        changes and peak updates are not committed one by one, so the whole batch costs a single commit.
+        """
+        cursor = await self.db.execute("BEGIN TRANSACTION")
+        await cursor.close()
+        self.in_batch = True
+
+    async def commit_batch(self):
+        self.in_batch = False
+        await self.db.commit()
+        pending_height_index_updates = self.pending_height_index_updates
+        self.pending_height_index_updates = []
+        for fork_height, block_records in pending_height_index_updates:
+            self.update_height_index(fork_height, block_records)
+
+    async def add_full_block(
+        self,
+        block: FullBlock,
+        block_record: BlockRecord,
+        tx_removals_and_additions: Optional[Tuple[List[bytes32], List[Coin]]] = None,
+    ) -> None:
+        """
+        tx_removals_and_additions are the result of block.tx_removals_and_additions(), for transaction blocks, if
+        they are known from validating the block.
+        """
         self.block_cache.put(block.header_hash, block)
+        if tx_removals_and_additions is not None:
+            self.tx_removals_and_additions_cache.put(block.header_hash, tx_removals_and_additions)
+            cursor_3 = await self.db.execute(
+                "INSERT OR REPLACE INTO tx_removals_and_additions VALUES(?, ?, ?)",
+                (block.header_hash.hex(), *encode_tx_removals_and_additions(*tx_removals_and_additions)),
+            )
+            await cursor_3.close()
         cursor_1 = await self.db.execute(
             "INSERT OR REPLACE INTO full_blocks VALUES(?, ?, ?, ?)",
             (
@@ -97,7 +190,8 @@ class BlockStore:
             ),
         )
         await cursor_2.close()
-        await self.db.commit()
+        if not self.in_batch:
+            await self.db.commit()
 
     async def persist_sub_epoch_challenge_segments(
         self, sub_epoch_summary_height: uint32, segments: List[SubEpochChallengeSegment]
@@ -136,20 +230,26 @@ class BlockStore:
             return FullBlock.from_bytes(row[0])
         return None
 
-    async def get_full_blocks_at(self, heights: List[uint32]) -> List[FullBlock]:
+    async def get_full_blocks_at(self, heights: List[uint32]) -> List[FullBlockView]:
+        """
+        Returns lazy views of the blocks at the given heights, which only parse the fields that are used.
+        """
         if len(heights) == 0:
             return []
 
         heights_db = tuple(heights)
-        formatted_str = f'SELECT block from full_blocks WHERE height in ({"?," * (len(heights_db) - 1)}?)'
+        formatted_str = (
+            f'SELECT header_hash,block from full_blocks WHERE height in ({"?," * (len(heights_db) - 1)}?)'
+        )
         cursor = await self.db.execute(formatted_str, heights_db)
         rows = await cursor.fetchall()
         await cursor.close()
-        return [FullBlock.from_bytes(row[0]) for row in rows]
+        return [FullBlockView(row[1], bytes32(bytes.fromhex(row[0]))) for row in rows]
 
-    async def get_blocks_by_hash(self, header_hashes: List[bytes32]) -> List[FullBlock]:
+    async def get_blocks_by_hash(self, header_hashes: List[bytes32]) -> List[FullBlockView]:
         """
         Returns a list of Full Blocks blocks, ordered by the same order in which header_hashes are passed in.
+        The blocks are lazy views, which only parse the fields that are used.
         Throws an exception if the blocks are not present
         """
 
@@ -157,37 +257,73 @@ class BlockStore:
             return []
 
         header_hashes_db = tuple([hh.hex() for hh in header_hashes])
-        formatted_str = f'SELECT block from full_blocks WHERE header_hash in ({"?," * (len(header_hashes_db) - 1)}?)'
+        formatted_str = (
+            f'SELECT header_hash,block from full_blocks WHERE header_hash in ({"?," * (len(header_hashes_db) - 1)}?)'
+        )
         cursor = await self.db.execute(formatted_str, header_hashes_db)
         rows = await cursor.fetchall()
         await cursor.close()
-        all_blocks: Dict[bytes32, FullBlock] = {}
+        all_blocks: Dict[bytes32, FullBlockView] = {}
         for row in rows:
-            full_block: FullBlock = FullBlock.from_bytes(row[0])
-            all_blocks[full_block.header_hash] = full_block
-        ret: List[FullBlock] = []
+            header_hash = bytes32(bytes.fromhex(row[0]))
+            all_blocks[header_hash] = FullBlockView(row[1], header_hash)
+        ret: List[FullBlockView] = []
         for hh in header_hashes:
             if hh not in all_blocks:
                 raise ValueError(f"Header hash {hh} not in the blockchain")
             ret.append(all_blocks[hh])
         return ret
 
+    async def get_tx_removals_and_additions(
+        self, block: Union[FullBlock, FullBlockView]
+    ) -> Tuple[List[bytes32], List[Coin]]:
+        """
+        Returns block.tx_removals_and_additions(), without running the generator if they were recorded when the block
+        was added.
+        """
+        if not block.is_transaction_block():
+            return [], []
+        cached = self.tx_removals_and_additions_cache.get(block.header_hash)
+        if cached is not None:
+            return cached
+        cursor = await self.db.execute(
+            "SELECT removals,additions from tx_removals_and_additions WHERE header_hash=?", (block.header_hash.hex(),)
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+        if row is not None:
+            removals_and_additions = decode_tx_removals_and_additions(row[0], row[1])
+        else:
+            # Added before the table existed
+            removals_and_additions = block.tx_removals_and_additions()
+        self.tx_removals_and_additions_cache.put(block.header_hash, removals_and_additions)
+        return removals_and_additions
+
     async def get_header_blocks_in_range(
         self,
         start: int,
         stop: int,
     ) -> Dict[bytes32, HeaderBlock]:
 
-        formatted_str = f"SELECT header_hash,block from full_blocks WHERE height >= {start} and height <= {stop}"
+        formatted_str = (
+            f"SELECT full_blocks.header_hash,full_blocks.block,tx.removals,tx.additions from full_blocks "
+            f"LEFT JOIN tx_removals_and_additions tx ON tx.header_hash = full_blocks.header_hash "
+            f"WHERE full_blocks.height >= {start} and full_blocks.height <= {stop}"
+        )
 
         cursor = await self.db.execute(formatted_str)
         rows = await cursor.fetchall()
         await cursor.close()
         ret: Dict[bytes32, HeaderBlock] = {}
         for row in rows:
-            header_hash = bytes.fromhex(row[0])
-            full_block: FullBlock = FullBlock.from_bytes(row[1])
-            ret[header_hash] = full_block.get_block_header()
+            header_hash = bytes32(bytes.fromhex(row[0]))
+            # The generator is only parsed for transaction blocks whose removals and additions were not recorded
+            full_block = FullBlockView(row[1], header_hash)
+            if row[2] is not None:
+                removals, additions = decode_tx_removals_and_additions(row[2], row[3])
+                ret[header_hash] = full_block.get_block_header(additions, removals)
+            else:
+                ret[header_hash] = full_block.get_block_header()
 
         return ret
 
@@ -274,13 +410,18 @@ class BlockStore:
         if present.
         """
 
-        res = await self.db.execute("SELECT * from block_records WHERE is_peak = 1")
+        res = await self.db.execute("SELECT header_hash,height from block_records WHERE is_peak = 1")
         row = await res.fetchone()
         await res.close()
         if row is None:
             return {}, {}
 
-        peak: bytes32 = bytes.fromhex(row[0])
+        peak: bytes32 = bytes32(bytes.fromhex(row[0]))
+        if self.height_index is not None:
+            loaded = self.height_index.load(peak, uint32(row[1]))
+            if loaded is not None:
+                return loaded
+
         cursor = await self.db.execute("SELECT header_hash,prev_hash,height,sub_epoch_summary from block_records")
         rows = await cursor.fetchall()
         await cursor.close()
@@ -307,8 +448,44 @@ class BlockStore:
                 break
             curr_header_hash = hash_to_prev_hash[curr_header_hash]
             curr_height = hash_to_height[curr_header_hash]
+
+        if self.height_index is not None:
+            try:
+                await self._repair_height_index(height_to_hash)
+            except OSError as e:
+                log.error(f"Failed to write height index: {e}")
         return height_to_hash, sub_epoch_summaries
 
+    async def _repair_height_index(self, height_to_hash: Dict[uint32, bytes32]) -> None:
+        assert self.height_index is not None
+        fork_height = self.height_index.fork_height(height_to_hash)
+        peak_height = len(height_to_hash) - 1
+        log.info(f"Rebuilding height index from height {fork_height + 1} to {peak_height}")
+        block_records = await self.get_block_records_in_range(fork_height + 1, peak_height)
+        self.height_index.set_chain(
+            fork_height,
+            [block_records[height_to_hash[uint32(height)]] for height in range(fork_height + 1, peak_height + 1)],
+        )
+
+    def update_height_index(self, fork_height: int, block_records: List[BlockRecord]) -> None:
+        """
+        Replaces the blocks above fork_height in the height index with block_records, sorted by height. Must be
+        called after the new peak is committed.
+        """
+        if self.height_index is None:
+            return
+        if self.in_batch:
+            # Written once the batch is committed
+            self.pending_height_index_updates.append((fork_height, block_records))
+            return
+        if fork_height + 1 > self.height_index.height_count:
+            # The index is missing blocks below the fork, it is repaired from the database on the next startup
+            return
+        try:
+            self.height_index.set_chain(fork_height, block_records)
+        except OSError as e:
+            log.error(f"Failed to write height index: {e}")
+
     async def set_peak(self, header_hash: bytes32) -> None:
         # We need to be in a sqlite transaction here.
         # Note: we do not commit this to the database yet, as we need to also change the coin store
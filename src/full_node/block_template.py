@@ -0,0 +1,101 @@
+from typing import Dict, List, Optional, Tuple
+
+from blspy import AugSchemeMPL, G2Element
+from sortedcontainers import SortedDict
+
+from src.types.blockchain_format.coin import Coin
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.types.coin_solution import CoinSolution
+from src.types.mempool_item import MempoolItem
+from src.types.spend_bundle import SpendBundle
+
+
+class BlockTemplate:
+    """
+    The set of mempool items that goes into the next block, selected greedily by highest fee per cost first,
+    skipping items that don't fit in the remaining cost or fee budget.
+    The aggregate signature, coin solutions, additions and removals are kept up to date as items enter the mempool,
+    so each signage point only pays for the changes since the previous one. When an item that was selected leaves
+    the mempool, or a better item does not fit, the template is rebuilt lazily on the next request.
+    """
+
+    def __init__(self, max_block_cost: int, max_fees: int):
+        self.max_block_cost = max_block_cost
+        self.max_fees = max_fees
+        self._clear()
+        self.dirty = False
+
+    def _clear(self) -> None:
+        self.items: Dict[bytes32, MempoolItem] = {}
+        self.cost_sum = 0
+        self.fee_sum = 0
+        self.min_fee_per_cost: Optional[float] = None
+        self.coin_solutions: List[CoinSolution] = []
+        self.aggregated_signature: Optional[G2Element] = None
+        self.additions: List[Coin] = []
+        self.removals: List[Coin] = []
+        self.bundle: Optional[SpendBundle] = None
+
+    def _fits(self, item: MempoolItem) -> bool:
+        return (
+            item.cost_result.cost + self.cost_sum <= self.max_block_cost and item.fee + self.fee_sum <= self.max_fees
+        )
+
+    def _select(self, item: MempoolItem) -> None:
+        self.items[item.name] = item
+        self.cost_sum += item.cost_result.cost
+        self.fee_sum += item.fee
+        if self.min_fee_per_cost is None or item.fee_per_cost < self.min_fee_per_cost:
+            self.min_fee_per_cost = item.fee_per_cost
+        self.coin_solutions.extend(item.spend_bundle.coin_solutions)
+        if self.aggregated_signature is None:
+            self.aggregated_signature = item.spend_bundle.aggregated_signature
+        else:
+            self.aggregated_signature = AugSchemeMPL.aggregate(
+                [self.aggregated_signature, item.spend_bundle.aggregated_signature]
+            )
+        self.additions.extend(item.additions)
+        self.removals.extend(item.removals)
+        self.bundle = None
+
+    def add_item(self, item: MempoolItem) -> None:
+        """
+        Called when an item enters the mempool. If it fits in what is left of the block, the greedy selection is
+        the current one plus this item, wherever it falls in the fee order.
+        """
+        if self.dirty:
+            return
+        if self._fits(item):
+            self._select(item)
+        elif self.min_fee_per_cost is not None and item.fee_per_cost > self.min_fee_per_cost:
+            # It would displace some lower paying items
+            self.dirty = True
+
+    def remove_item(self, item: MempoolItem) -> None:
+        """
+        Called when an item leaves the mempool. Items that were not selected do not change the selection.
+        """
+        if item.name in self.items:
+            self.dirty = True
+
+    def rebuild(self, sorted_spends: SortedDict) -> None:
+        self._clear()
+        for dic in reversed(sorted_spends.values()):
+            for item in dic.values():
+                if self._fits(item):
+                    self._select(item)
+        self.dirty = False
+
+    def get_bundle(self, sorted_spends: SortedDict) -> Optional[Tuple[SpendBundle, List[Coin], List[Coin]]]:
+        """
+        Returns the aggregated spend bundle of the template and its additions and removals, or None if it is empty.
+        sorted_spends is only walked if the template has to be rebuilt.
+        """
+        if self.dirty:
+            self.rebuild(sorted_spends)
+        if len(self.items) == 0:
+            return None
+        if self.bundle is None:
+            assert self.aggregated_signature is not None
+            self.bundle = SpendBundle(list(self.coin_solutions), self.aggregated_signature)
+        return self.bundle, list(self.additions), list(self.removals)
@@ -1,43 +1,63 @@
-from typing import Dict, Optional, List
+from typing import Any, Dict, Optional, List, Set, Tuple
 import aiosqlite
+from sortedcontainers import SortedDict
+
 from src.types.full_block import FullBlock
 from src.types.blockchain_format.coin import Coin
 from src.types.coin_record import CoinRecord
 from src.types.blockchain_format.sized_bytes import bytes32
 from src.util.ints import uint32, uint64
+from src.util.lru_cache import LRUCache
 
 
 class CoinStore:
     """
     This object handles CoinRecords in DB.
-    A cache is maintained for quicker access to recent coins.
+    An LRU cache is maintained for quicker access to recent coins. Cached coin names are also indexed by
+    confirmed and spent height, so a rollback only visits the entries above the fork point.
+    If binary_keys is set, coin names, puzzle hashes and parent ids are stored as 32 byte blobs instead of hex text.
     """
 
     coin_record_db: aiosqlite.Connection
-    coin_record_cache: Dict[str, CoinRecord]
+    coin_record_cache: LRUCache
+    # height -> names of cached coins that were confirmed or spent at that height
+    cache_heights: SortedDict
     cache_size: uint32
+    binary_keys: bool
 
     @classmethod
-    async def create(cls, connection: aiosqlite.Connection, cache_size: uint32 = uint32(600000)):
+    async def create(
+        cls, connection: aiosqlite.Connection, cache_size: uint32 = uint32(600000), binary_keys: bool = False
+    ):
         self = cls()
 
         self.cache_size = cache_size
+        self.binary_keys = binary_keys
         self.coin_record_db = connection
+        key_type = "blob" if binary_keys else "text"
         await self.coin_record_db.execute(
             (
                 "CREATE TABLE IF NOT EXISTS coin_record("
-                "coin_name text PRIMARY KEY,"
+                f"coin_name {key_type} PRIMARY KEY,"
                 " confirmed_index bigint,"
                 " spent_index bigint,"
                 " spent int,"
                 " coinbase int,"
-                " puzzle_hash text,"
-                " coin_parent text,"
+                f" puzzle_hash {key_type},"
+                f" coin_parent {key_type},"
                 " amount blob,"
                 " timestamp bigint)"
             )
         )
 
+        # The key format cannot change for an existing table, since the rows are not converted
+        cursor = await self.coin_record_db.execute("PRAGMA table_info(coin_record)")
+        columns = await cursor.fetchall()
+        await cursor.close()
+        for column in columns:
+            if column[1] == "coin_name" and column[2].lower() != key_type:
+                raise ValueError(f"coin_record table uses {column[2]} keys, but binary_keys is {binary_keys}")
+
         # Useful for reorg lookups
         await self.coin_record_db.execute(
             "CREATE INDEX IF NOT EXISTS coin_confirmed_index on coin_record(confirmed_index)"
@@ -47,34 +67,28 @@ class CoinStore:
 
         await self.coin_record_db.execute("CREATE INDEX IF NOT EXISTS coin_spent on coin_record(spent)")
 
-        await self.coin_record_db.execute("CREATE INDEX IF NOT EXISTS coin_spent on coin_record(puzzle_hash)")
+        await self.coin_record_db.execute("CREATE INDEX IF NOT EXISTS coin_puzzle_hash on coin_record(puzzle_hash)")
 
         await self.coin_record_db.commit()
-        self.coin_record_cache = dict()
+        self.coin_record_cache = LRUCache(cache_size)
+        self.cache_heights = SortedDict()
         return self
 
-    async def new_block(self, block: FullBlock):
+    async def new_block(
+        self, block: FullBlock, tx_removals_and_additions: Optional[Tuple[List[bytes32], List[Coin]]] = None
+    ):
         """
         Only called for blocks which are blocks (and thus have rewards and transactions)
+        All the coin changes of the block are written in batches, without committing, so they become part of
+        the block_store transaction that the caller has open.
+        tx_removals_and_additions is block.tx_removals_and_additions(), if the caller already has it.
         """
         if block.is_transaction_block() is False:
             return
         assert block.foliage_transaction_block is not None
-        removals, additions = block.tx_removals_and_additions()
-
-        for coin in additions:
-            record: CoinRecord = CoinRecord(
-                coin,
-                block.height,
-                uint32(0),
-                False,
-                False,
-                block.foliage_transaction_block.timestamp,
-            )
-            await self._add_coin_record(record)
-
-        for coin_name in removals:
-            await self._set_spent(coin_name, block.height)
+        if tx_removals_and_additions is None:
+            tx_removals_and_additions = block.tx_removals_and_additions()
+        removals, additions = tx_removals_and_additions
 
         included_reward_coins = block.get_included_reward_coins()
         if block.height == 0:
@@ -82,40 +96,69 @@ class CoinStore:
         else:
             assert len(included_reward_coins) >= 2
 
+        records: List[CoinRecord] = []
+        for coin in additions:
+            records.append(
+                CoinRecord(
+                    coin,
+                    block.height,
+                    uint32(0),
+                    False,
+                    False,
+                    block.foliage_transaction_block.timestamp,
+                )
+            )
         for coin in included_reward_coins:
-            reward_coin_r: CoinRecord = CoinRecord(
-                coin,
-                block.height,
-                uint32(0),
-                False,
-                True,
-                block.foliage_transaction_block.timestamp,
+            records.append(
+                CoinRecord(
+                    coin,
+                    block.height,
+                    uint32(0),
+                    False,
+                    True,
+                    block.foliage_transaction_block.timestamp,
+                )
             )
-            await self._add_coin_record(reward_coin_r)
+
+        # Additions go in first, so coins created and spent in this same block are marked as spent
+        await self._add_coin_records(records)
+        await self._set_spent_batch(removals, block.height)
 
     # Checks DB and DiffStores for CoinRecord with coin_name and returns it
     async def get_coin_record(self, coin_name: bytes32) -> Optional[CoinRecord]:
-        if coin_name.hex() in self.coin_record_cache:
-            return self.coin_record_cache[coin_name.hex()]
-        cursor = await self.coin_record_db.execute("SELECT * from coin_record WHERE coin_name=?", (coin_name.hex(),))
+        cached: Optional[CoinRecord] = self.coin_record_cache.get(coin_name)
+        if cached is not None:
+            return cached
+        cursor = await self.coin_record_db.execute(
+            "SELECT * from coin_record WHERE coin_name=?", (self._to_db_key(coin_name),)
+        )
         row = await cursor.fetchone()
         await cursor.close()
         if row is not None:
-            coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-            return CoinRecord(coin, row[1], row[2], row[3], row[4], row[8])
+            return self._row_to_coin_record(row)
         return None
 
+    def get_cache_metrics(self) -> Dict[str, Any]:
+        """
+        Lookups of get_coin_record served by the coin record cache, since the store was created.
+        """
+        hits = self.coin_record_cache.hits
+        misses = self.coin_record_cache.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": len(self.coin_record_cache),
+            "capacity": self.cache_size,
+            "hit_rate": hits / (hits + misses) if hits + misses > 0 else 0.0,
+        }
+
     async def get_tx_coins_added_at_height(self, height: uint32) -> List[CoinRecord]:
         cursor = await self.coin_record_db.execute(
             "SELECT * from coin_record WHERE confirmed_index=? and coinbase=0", (height,)
         )
         rows = await cursor.fetchall()
         await cursor.close()
-        coins = []
-        for row in rows:
-            coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-            coins.append(CoinRecord(coin, row[1], row[2], row[3], row[4], row[8]))
-        return coins
+        return [self._row_to_coin_record(row) for row in rows]
 
     async def get_coins_removed_at_height(self, height: uint32) -> List[CoinRecord]:
         cursor = await self.coin_record_db.execute(
@@ -123,11 +166,7 @@ class CoinStore:
         )
         rows = await cursor.fetchall()
         await cursor.close()
-        coins = []
-        for row in rows:
-            coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-            coins.append(CoinRecord(coin, row[1], row[2], row[3], row[4], row[8]))
-        return coins
+        return [self._row_to_coin_record(row) for row in rows]
 
     # Checks DB and DiffStores for CoinRecords with puzzle_hash and returns them
     async def get_coin_records_by_puzzle_hash(
@@ -142,14 +181,13 @@ class CoinStore:
         cursor = await self.coin_record_db.execute(
             f"SELECT * from coin_record WHERE puzzle_hash=? AND confirmed_index>=? AND confirmed_index<? "
             f"{'' if include_spent_coins else 'AND spent=0'}",
-            (puzzle_hash.hex(), start_height, end_height),
+            (self._to_db_key(puzzle_hash), start_height, end_height),
         )
         rows = await cursor.fetchall()
 
         await cursor.close()
         for row in rows:
-            coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-            coins.add(CoinRecord(coin, row[1], row[2], row[3], row[4], row[8]))
+            coins.add(self._row_to_coin_record(row))
         return list(coins)
 
     async def rollback_to_block(self, block_index: int):
@@ -157,23 +195,25 @@ class CoinStore:
         Note that block_index can be negative, in which case everything is rolled back
         """
         # Update memory cache
-        delete_queue: bytes32 = []
-        for coin_name, coin_record in self.coin_record_cache.items():
-            if int(coin_record.spent_block_index) > block_index:
-                new_record = CoinRecord(
-                    coin_record.coin,
-                    coin_record.confirmed_block_index,
-                    coin_record.spent_block_index,
-                    False,
-                    coin_record.coinbase,
-                    coin_record.timestamp,
-                )
-                self.coin_record_cache[coin_record.coin.name().hex()] = new_record
+        affected: Set[bytes32] = set()
+        for height in list(self.cache_heights.irange(minimum=block_index, inclusive=(False, True))):
+            affected.update(self.cache_heights[height])
+        for coin_name in affected:
+            coin_record = self.coin_record_cache.peek(coin_name)
+            assert coin_record is not None
             if int(coin_record.confirmed_block_index) > block_index:
-                delete_queue.append(coin_name)
-
-        for coin_name in delete_queue:
-            del self.coin_record_cache[coin_name]
+                self._cache_remove(coin_record)
+            elif int(coin_record.spent_block_index) > block_index:
+                self._cache_put(
+                    CoinRecord(
+                        coin_record.coin,
+                        coin_record.confirmed_block_index,
+                        uint32(0),
+                        False,
+                        coin_record.coinbase,
+                        coin_record.timestamp,
+                    )
+                )
 
         # Delete from storage
         c1 = await self.coin_record_db.execute("DELETE FROM coin_record WHERE confirmed_index>?", (block_index,))
@@ -184,40 +224,107 @@ class CoinStore:
         )
         await c2.close()
 
+    def _to_db_key(self, key: bytes32) -> Any:
+        if self.binary_keys:
+            return bytes(key)
+        return key.hex()
+
+    def _from_db_key(self, key: Any) -> bytes32:
+        if self.binary_keys:
+            return bytes32(key)
+        return bytes32(bytes.fromhex(key))
+
+    def _row_to_coin_record(self, row: Tuple) -> CoinRecord:
+        coin = Coin(self._from_db_key(row[6]), self._from_db_key(row[5]), uint64.from_bytes(row[7]))
+        return CoinRecord(coin, row[1], row[2], row[3], row[4], row[8])
+
     # Store CoinRecord in DB and ram cache
     async def _add_coin_record(self, record: CoinRecord) -> None:
-        cursor = await self.coin_record_db.execute(
-            "INSERT OR REPLACE INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                record.coin.name().hex(),
-                record.confirmed_block_index,
-                record.spent_block_index,
-                int(record.spent),
-                int(record.coinbase),
-                str(record.coin.puzzle_hash.hex()),
-                str(record.coin.parent_coin_info.hex()),
-                bytes(record.coin.amount),
-                record.timestamp,
-            ),
+        await self._add_coin_records([record])
+
+    # Store CoinRecords in DB and ram cache, with a single statement for the whole batch
+    async def _add_coin_records(self, records: List[CoinRecord]) -> None:
+        if len(records) == 0:
+            return
+        values = []
+        for record in records:
+            values.append(
+                (
+                    self._to_db_key(record.coin.name()),
+                    record.confirmed_block_index,
+                    record.spent_block_index,
+                    int(record.spent),
+                    int(record.coinbase),
+                    self._to_db_key(record.coin.puzzle_hash),
+                    self._to_db_key(record.coin.parent_coin_info),
+                    bytes(record.coin.amount),
+                    record.timestamp,
+                )
+            )
+        cursor = await self.coin_record_db.executemany(
+            "INSERT OR REPLACE INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)", values
         )
         await cursor.close()
-        self.coin_record_cache[record.coin.name().hex()] = record
-        if len(self.coin_record_cache) > self.cache_size:
-            while len(self.coin_record_cache) > self.cache_size:
-                first_in = list(self.coin_record_cache.keys())[0]
-                del self.coin_record_cache[first_in]
+        for record in records:
+            self._cache_put(record)
 
     # Update coin_record to be spent in DB
     async def _set_spent(self, coin_name: bytes32, index: uint32):
-        current: Optional[CoinRecord] = await self.get_coin_record(coin_name)
-        if current is None:
+        await self._set_spent_batch([coin_name], index)
+
+    # Update coin_records to be spent in DB, without reading them first. Unknown coins are ignored.
+    async def _set_spent_batch(self, coin_names: List[bytes32], index: uint32):
+        if len(coin_names) == 0:
             return
-        spent: CoinRecord = CoinRecord(
-            current.coin,
-            current.confirmed_block_index,
-            index,
-            True,
-            current.coinbase,
-            current.timestamp,
-        )  # type: ignore # noqa
-        await self._add_coin_record(spent)
+        cursor = await self.coin_record_db.executemany(
+            "UPDATE coin_record SET spent_index=?, spent=1 WHERE coin_name=?",
+            [(index, self._to_db_key(coin_name)) for coin_name in coin_names],
+        )
+        await cursor.close()
+        for coin_name in coin_names:
+            current: Optional[CoinRecord] = self.coin_record_cache.peek(coin_name)
+            if current is None:
+                continue
+            self._cache_put(
+                CoinRecord(
+                    current.coin,
+                    current.confirmed_block_index,
+                    index,
+                    True,
+                    current.coinbase,
+                    current.timestamp,
+                )
+            )
+
+    def _cache_put(self, record: CoinRecord) -> None:
+        name = record.name
+        previous: Optional[CoinRecord] = self.coin_record_cache.peek(name)
+        if previous is not None:
+            self._unindex_height(previous)
+        evicted = self.coin_record_cache.put(name, record)
+        if evicted is not None:
+            self._unindex_height(evicted[1])
+        self._index_height(record.confirmed_block_index, name)
+        if record.spent:
+            self._index_height(record.spent_block_index, name)
+
+    def _cache_remove(self, record: CoinRecord) -> None:
+        self._unindex_height(record)
+        self.coin_record_cache.remove(record.name)
+
+    def _index_height(self, height: uint32, name: bytes32) -> None:
+        if height not in self.cache_heights:
+            self.cache_heights[height] = set()
+        self.cache_heights[height].add(name)
+
+    def _unindex_height(self, record: CoinRecord) -> None:
+        heights = [record.confirmed_block_index]
+        if record.spent:
+            heights.append(record.spent_block_index)
+        for height in heights:
+            names: Optional[Set[bytes32]] = self.cache_heights.get(height)
+            if names is None:
+                continue
+            names.discard(record.name)
+            if len(names) == 0:
+                del self.cache_heights[height]
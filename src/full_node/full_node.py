@@ -19,9 +19,10 @@ from src.consensus.difficulty_adjustment import (
     can_finish_sub_and_full_epoch,
 )
 from src.consensus.make_sub_epoch_summary import next_sub_epoch_summary
-from src.consensus.multiprocess_validation import PreValidationResult
+from src.consensus.multiprocess_validation import PreValidationBatches, PreValidationResult
 from src.consensus.pot_iterations import is_overflow_block, calculate_sp_iters
 from src.consensus.block_record import BlockRecord
+from src.full_node.block_download import BlockDownloader
 from src.full_node.block_store import BlockStore
 from src.full_node.coin_store import CoinStore
 from src.full_node.full_node_store import FullNodeStore
@@ -106,15 +107,21 @@ class FullNode:
     async def _start(self):
         # create the store (db) and full node instance
         self.connection = await aiosqlite.connect(self.db_path)
-        self.block_store = await BlockStore.create(self.connection)
+        self.block_store = await BlockStore.create(
+            self.connection, self.db_path.parent / (self.db_path.name + "-height-index")
+        )
         self.full_node_store = await FullNodeStore.create(self.constants)
         self.sync_store = await SyncStore.create()
-        self.coin_store = await CoinStore.create(self.connection)
+        self.coin_store = await CoinStore.create(
+            self.connection, binary_keys=self.config.get("coin_store_binary_keys", False)
+        )
         self.timelord_lock = asyncio.Lock()
         self.log.info("Initializing blockchain from disk")
         start_time = time.time()
         self.blockchain = await Blockchain.create(self.coin_store, self.block_store, self.constants)
-        self.mempool_manager = MempoolManager(self.coin_store, self.constants)
+        self.mempool_manager = MempoolManager(
+            self.coin_store, self.constants, self.config.get("mempool_validation_workers", 1)
+        )
         self.weight_proof_handler = WeightProofHandler(self.constants, self.blockchain)
         self._sync_task = None
         time_taken = time.time() - start_time
@@ -593,62 +600,58 @@ class FullNode:
             raise RuntimeError(f"Not syncing, no peers with header_hash {peak_hash} ")
         advanced_peak = False
         batch_size = self.constants.MAX_BLOCK_COUNT_PER_REQUESTS
-        for i in range(fork_point_height, target_peak_sb_height, batch_size):
-            start_height = i
-            end_height = min(target_peak_sb_height, start_height + batch_size)
-            request = RequestBlocks(uint32(start_height), uint32(end_height), True)
-            self.log.info(f"Requesting blocks: {start_height} to {end_height}")
-            batch_added = False
-            to_remove = []
-            for peer in peers_with_peak:
-                if peer.closed:
-                    to_remove.append(peer)
-                    continue
-                response = await peer.request_blocks(request)
-                if response is None:
+        ranges = [
+            (start_height, min(target_peak_sb_height, start_height + batch_size))
+            for start_height in range(fork_point_height, target_peak_sb_height, batch_size)
+        ]
+        downloader = BlockDownloader(
+            ranges,
+            peers_with_peak,
+            self.config.get("sync_blocks_in_flight", 16),
+            self.config.get("sync_blocks_in_flight_per_peer", 2),
+            self.config.get("sync_blocks_window", 32),
+            self.config.get("sync_blocks_hedge_after", 10),
+        )
+        try:
+            while True:
+                batch = await downloader.next_batch()
+                if batch is None:
+                    if downloader.next_index < len(ranges):
+                        start_height, end_height = ranges[downloader.next_index]
+                        self.log.info(
+                            f"Failed to fetch blocks {start_height} to {end_height} from peers: {peers_with_peak}"
+                        )
+                    break
+                index, blocks, peer = batch
+                start_height, end_height = ranges[index]
+                success, advanced_peak, _ = await self.receive_block_batch(
+                    blocks, peer, None if advanced_peak else uint32(fork_point_height)
+                )
+                if success is False:
                     await peer.close()
-                    to_remove.append(peer)
-                    continue
-                if isinstance(response, RejectBlocks):
-                    to_remove.append(peer)
+                    downloader.retry(index, peer)
                     continue
-                elif isinstance(response, RespondBlocks):
-                    success, advanced_peak, _ = await self.receive_block_batch(
-                        response.blocks, peer, None if advanced_peak else uint32(fork_point_height)
-                    )
-                    if success is False:
-                        await peer.close()
-                        continue
-                    else:
-                        batch_added = True
-                        break
 
-            peak = self.blockchain.get_peak()
-            assert peak is not None
-            msg = make_msg(
-                ProtocolMessageTypes.new_peak_wallet,
-                wallet_protocol.NewPeakWallet(
-                    peak.header_hash,
-                    peak.height,
-                    peak.weight,
-                    uint32(max(peak.height - 1, uint32(0))),
-                ),
-            )
-            await self.server.send_to_all([msg], NodeType.WALLET)
-
-            for peer in to_remove:
-                peers_with_peak.remove(peer)
+                peak = self.blockchain.get_peak()
+                assert peak is not None
+                msg = make_msg(
+                    ProtocolMessageTypes.new_peak_wallet,
+                    wallet_protocol.NewPeakWallet(
+                        peak.header_hash,
+                        peak.height,
+                        peak.weight,
+                        uint32(max(peak.height - 1, uint32(0))),
+                    ),
+                )
+                await self.server.send_to_all([msg], NodeType.WALLET)
 
-            if self.sync_store.peers_changed.is_set():
-                peer_ids = self.sync_store.get_peers_that_have_peak([peak_hash])
-                peers_with_peak = [c for c in self.server.all_connections.values() if c.peer_node_id in peer_ids]
-                self.log.info(f"Number of peers we are syncing from: {len(peers_with_peak)}")
-                self.sync_store.peers_changed.clear()
+                if self.sync_store.peers_changed.is_set():
+                    peer_ids = self.sync_store.get_peers_that_have_peak([peak_hash])
+                    peers_with_peak = [c for c in self.server.all_connections.values() if c.peer_node_id in peer_ids]
+                    downloader.set_peers(peers_with_peak)
+                    self.log.info(f"Number of peers we are syncing from: {len(peers_with_peak)}")
+                    self.sync_store.peers_changed.clear()
 
-            if batch_added is False:
-                self.log.info(f"Failed to fetch blocks {start_height} to {end_height} from peers: {peers_with_peak}")
-                break
-            else:
                 self.log.info(f"Added blocks {start_height} to {end_height}")
                 self.blockchain.clean_block_record(
                     min(
@@ -656,6 +659,8 @@ class FullNode:
                         peak.height - self.constants.BLOCKS_CACHE_SIZE,
                     )
                 )
+        finally:
+            downloader.close()
 
     async def receive_block_batch(
         self, all_blocks: List[FullBlock], peer: ws.WSChiaConnection, fork_point: Optional[uint32]
@@ -672,32 +677,42 @@ class FullNode:
             return True, False, fork_height
 
         pre_validate_start = time.time()
-        pre_validation_results: Optional[
-            List[PreValidationResult]
-        ] = await self.blockchain.pre_validate_blocks_multiprocessing(blocks_to_validate)
-        self.log.debug(f"Block pre-validation time: {time.time() - pre_validate_start}")
-        if pre_validation_results is None:
+        # Blocks are added as soon as their batch is validated, while the workers validate the following batches
+        pre_validation_batches: Optional[
+            PreValidationBatches
+        ] = await self.blockchain.pre_validate_blocks_in_batches(blocks_to_validate)
+        self.log.debug(f"Block pre-validation submit time: {time.time() - pre_validate_start}")
+        if pre_validation_batches is None:
             return False, False, None
-        for i, block in enumerate(blocks_to_validate):
-            if pre_validation_results[i].error is not None:
-                self.log.error(
-                    f"Invalid block from peer: {peer.get_peer_info()} {Err(pre_validation_results[i].error)}"
-                )
-                return False, advanced_peak, fork_height
+        # The blocks of the batch, and the peaks they create, are committed together. Blocks added before an
+        # invalid block or an error are still committed
+        await self.block_store.begin_batch()
+        try:
+            for i, block in enumerate(blocks_to_validate):
+                pre_validation_result: PreValidationResult = await pre_validation_batches.get(i)
+                if pre_validation_result.error is not None:
+                    self.log.error(
+                        f"Invalid block from peer: {peer.get_peer_info()} {Err(pre_validation_result.error)}"
+                    )
+                    pre_validation_batches.cancel()
+                    return False, advanced_peak, fork_height
 
-            assert pre_validation_results[i].required_iters is not None
-            (result, error, fork_height,) = await self.blockchain.receive_block(
-                block, pre_validation_results[i], None if advanced_peak else fork_point
-            )
-            if result == ReceiveBlockResult.NEW_PEAK:
-                advanced_peak = True
-            elif result == ReceiveBlockResult.INVALID_BLOCK or result == ReceiveBlockResult.DISCONNECTED_BLOCK:
-                if error is not None:
-                    self.log.error(f"Error: {error}, Invalid block from peer: {peer.get_peer_info()} ")
-                return False, advanced_peak, fork_height
-            block_record = self.blockchain.block_record(block.header_hash)
-            if block_record.sub_epoch_summary_included is not None:
-                await self.weight_proof_handler.create_prev_sub_epoch_segments()
+                assert pre_validation_result.required_iters is not None
+                (result, error, fork_height,) = await self.blockchain.receive_block(
+                    block, pre_validation_result, None if advanced_peak else fork_point
+                )
+                if result == ReceiveBlockResult.NEW_PEAK:
+                    advanced_peak = True
+                elif result == ReceiveBlockResult.INVALID_BLOCK or result == ReceiveBlockResult.DISCONNECTED_BLOCK:
+                    if error is not None:
+                        self.log.error(f"Error: {error}, Invalid block from peer: {peer.get_peer_info()} ")
+                    pre_validation_batches.cancel()
+                    return False, advanced_peak, fork_height
+                block_record = self.blockchain.block_record(block.header_hash)
+                if block_record.sub_epoch_summary_included is not None:
+                    await self.weight_proof_handler.create_prev_sub_epoch_segments()
+        finally:
+            await self.block_store.commit_batch()
         if advanced_peak:
             self._state_changed("new_peak")
             self.log.debug(
@@ -794,8 +809,15 @@ class FullNode:
             skip_vdf_validation=True,
         )
 
-        # Update the mempool
-        await self.mempool_manager.new_peak(self.blockchain.get_peak())
+        # Update the mempool. If the previous mempool peak is still in the chain, only the new blocks are applied
+        mempool_peak: Optional[BlockRecord] = self.mempool_manager.peak
+        extends_previous_peak = (
+            mempool_peak is not None
+            and mempool_peak.height <= record.height
+            and self.blockchain.contains_height(mempool_peak.height)
+            and self.blockchain.height_to_hash(mempool_peak.height) == mempool_peak.header_hash
+        )
+        await self.mempool_manager.new_peak(self.blockchain.get_peak(), extends_previous_peak)
 
         # If there were pending end of slots that happen after this peak, broadcast them if they are added
         if added_eos is not None:
@@ -1329,7 +1351,7 @@ class FullNode:
             error: Optional[Err] = Err.NO_TRANSACTIONS_WHILE_SYNCING
         else:
             try:
-                cost_result = await self.mempool_manager.pre_validate_spendbundle(transaction)
+                cost_result, signature_verified = await self.mempool_manager.pre_validate_spendbundle(transaction)
             except Exception as e:
                 self.mempool_manager.remove_seen(spend_name)
                 raise e
@@ -1337,7 +1359,9 @@ class FullNode:
                 if self.mempool_manager.get_spendbundle(spend_name) is not None:
                     self.mempool_manager.remove_seen(spend_name)
                     return MempoolInclusionStatus.FAILED, Err.ALREADY_INCLUDING_TRANSACTION
-                cost, status, error = await self.mempool_manager.add_spendbundle(transaction, cost_result, spend_name)
+                cost, status, error = await self.mempool_manager.add_spendbundle(
+                    transaction, cost_result, spend_name, validate_signature=not signature_verified
+                )
                 if status == MempoolInclusionStatus.SUCCESS:
                     self.log.debug(f"Added transaction to mempool: {spend_name}")
                     # Only broadcast successful transactions, not pending ones. Otherwise it's a DOS
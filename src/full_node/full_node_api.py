@@ -34,6 +34,7 @@ from src.types.blockchain_format.coin import Coin, hash_coin_list
 
 from src.types.end_of_slot_bundle import EndOfSubSlotBundle
 from src.types.full_block import FullBlock
+from src.types.full_block_view import FullBlockView
 from src.types.header_block import HeaderBlock
 
 from src.types.mempool_inclusion_status import MempoolInclusionStatus
@@ -215,30 +216,30 @@ class FullNodeAPI:
             reject = RejectBlocks(request.start_height, request.end_height)
             msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
             return msg
+        header_hashes: List[bytes32] = []
         for i in range(request.start_height, request.end_height + 1):
             if not self.full_node.blockchain.contains_height(uint32(i)):
                 reject = RejectBlocks(request.start_height, request.end_height)
                 msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
                 return msg
+            header_hashes.append(self.full_node.blockchain.height_to_hash(uint32(i)))
 
-        blocks = []
-
-        for i in range(request.start_height, request.end_height + 1):
-            block: Optional[FullBlock] = await self.full_node.block_store.get_full_block(
-                self.full_node.blockchain.height_to_hash(uint32(i))
-            )
-            if block is None:
-                reject = RejectBlocks(request.start_height, request.end_height)
-                msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
-                return msg
-            if not request.include_transaction_block:
-                block = dataclasses.replace(block, transactions_generator=None)
-            blocks.append(block)
+        try:
+            blocks: List[FullBlockView] = await self.full_node.block_store.get_blocks_by_hash(header_hashes)
+        except ValueError:
+            reject = RejectBlocks(request.start_height, request.end_height)
+            msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
+            return msg
 
-        msg = make_msg(
-            ProtocolMessageTypes.respond_blocks,
-            full_node_protocol.RespondBlocks(request.start_height, request.end_height, blocks),
+        # The response is built from the serialized blocks, RespondBlocks(start_height, end_height, blocks)
+        if request.include_transaction_block:
+            blocks_bytes = [bytes(block) for block in blocks]
+        else:
+            blocks_bytes = [block.bytes_without_transactions_generator() for block in blocks]
+        respond_blocks_bytes = b"".join(
+            [bytes(request.start_height), bytes(request.end_height), bytes(uint32(len(blocks_bytes)))] + blocks_bytes
         )
+        msg = make_msg(ProtocolMessageTypes.respond_blocks, respond_blocks_bytes)
         return msg
 
     @api_request
@@ -893,7 +894,8 @@ class FullNodeAPI:
             return msg
         block: Optional[FullBlock] = await self.full_node.block_store.get_full_block(header_hash)
         if block is not None:
-            header_block: HeaderBlock = block.get_block_header()
+            removals, additions = await self.full_node.block_store.get_tx_removals_and_additions(block)
+            header_block: HeaderBlock = block.get_block_header(additions, removals)
             msg = make_msg(
                 ProtocolMessageTypes.respond_block_header,
                 wallet_protocol.RespondBlockHeader(header_block),
@@ -915,7 +917,7 @@ class FullNodeAPI:
             return msg
 
         assert block is not None and block.foliage_transaction_block is not None
-        _, additions = block.tx_removals_and_additions()
+        _, additions = await self.full_node.block_store.get_tx_removals_and_additions(block)
         puzzlehash_coins_map: Dict[bytes32, List[Coin]] = {}
         for coin in additions + list(block.get_included_reward_coins()):
             if coin.puzzle_hash in puzzlehash_coins_map:
@@ -971,7 +973,7 @@ class FullNodeAPI:
             return msg
 
         assert block is not None and block.foliage_transaction_block is not None
-        all_removals, _ = block.tx_removals_and_additions()
+        all_removals, _ = await self.full_node.block_store.get_tx_removals_and_additions(block)
 
         coins_map: List[Tuple[bytes32, Optional[Coin]]] = []
         proofs_map: List[Tuple[bytes32, bytes]] = []
@@ -1070,13 +1072,10 @@ class FullNodeAPI:
                 return msg
             header_hashes.append(self.full_node.blockchain.height_to_hash(uint32(i)))
 
-        blocks: List[FullBlock] = await self.full_node.block_store.get_blocks_by_hash(header_hashes)
+        blocks: List[FullBlockView] = await self.full_node.block_store.get_blocks_by_hash(header_hashes)
         header_blocks = []
         for block in blocks:
-            added_coins_records = await self.full_node.coin_store.get_tx_coins_added_at_height(block.height)
-            removed_coins_records = await self.full_node.coin_store.get_coins_removed_at_height(block.height)
-            added_coins = [record.coin for record in added_coins_records]
-            removal_names = [record.coin.name() for record in removed_coins_records]
+            removal_names, added_coins = await self.full_node.block_store.get_tx_removals_and_additions(block)
             header_block = block.get_block_header(added_coins, removal_names)
             header_blocks.append(header_block)
 
@@ -0,0 +1,151 @@
+import logging
+import mmap
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.consensus.block_record import BlockRecord
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.types.blockchain_format.sub_epoch_summary import SubEpochSummary
+from src.util.ints import uint32
+
+# header hash, prev hash, weight, offset + 1 of the sub epoch summary in the summaries file (0 if there is none)
+RECORD_FORMAT = struct.Struct(">32s32s16sQ")
+SUMMARY_LENGTH_FORMAT = struct.Struct(">I")
+
+log = logging.getLogger(__name__)
+
+
+class HeightIndex:
+    """
+    On disk index of the blocks in the path from genesis to the peak, with one fixed width record per height.
+    Record n is at offset n * RECORD_FORMAT.size, so loading the chain is a single pass over a memory mapped file,
+    instead of a scan of block_records and a walk back from the peak. Sub epoch summaries are appended to a second
+    file, and records point into it.
+
+    The index is written after the database commits the new peak, so it can be behind the database after a crash.
+    load returns None in that case, or if the files are corrupt, and the caller rebuilds it from the database.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.summaries_path = path.with_name(path.name + "-summaries")
+        self.height_count = 0
+        self.summaries_size = 0
+        # Set when load finds records that don't match the summaries file, so the repair rewrites the whole index
+        self.corrupt = False
+
+    @contextmanager
+    def _map(self, path: Path) -> Iterator[Any]:
+        if not path.exists() or path.stat().st_size == 0:
+            yield b""
+            return
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+
+    def load(
+        self, peak_hash: bytes32, peak_height: uint32
+    ) -> Optional[Tuple[Dict[uint32, bytes32], Dict[uint32, SubEpochSummary]]]:
+        """
+        Returns the height to hash and sub epoch summary dicts, or None if the index does not end at the given peak.
+        """
+        height_to_hash: Dict[uint32, bytes32] = {}
+        sub_epoch_summaries: Dict[uint32, SubEpochSummary] = {}
+        record_size = RECORD_FORMAT.size
+        with self._map(self.path) as records, self._map(self.summaries_path) as summaries:
+            if len(records) != (peak_height + 1) * record_size:
+                return None
+            if records[peak_height * record_size : peak_height * record_size + 32] != peak_hash:
+                return None
+
+            try:
+                for height, (header_hash, _, _, summary_offset) in enumerate(RECORD_FORMAT.iter_unpack(records)):
+                    height_to_hash[uint32(height)] = bytes32(header_hash)
+                    if summary_offset != 0:
+                        sub_epoch_summaries[uint32(height)] = self._read_summary(summaries, summary_offset - 1)
+            except (struct.error, ValueError, AssertionError) as e:
+                # The summaries file is truncated or does not match the records, the whole index is rewritten
+                log.warning(f"Height index {self.path} is corrupt, it will be rebuilt: {e}")
+                self.corrupt = True
+                return None
+            self.summaries_size = len(summaries)
+        self.height_count = peak_height + 1
+        return height_to_hash, sub_epoch_summaries
+
+    @staticmethod
+    def _read_summary(summaries: Any, offset: int) -> SubEpochSummary:
+        start = offset + SUMMARY_LENGTH_FORMAT.size
+        if start > len(summaries):
+            raise ValueError(f"Sub epoch summary at {offset} is past the end of the summaries file")
+        (length,) = SUMMARY_LENGTH_FORMAT.unpack_from(summaries, offset)
+        if start + length > len(summaries):
+            raise ValueError(f"Sub epoch summary at {offset} is longer than the summaries file")
+        return SubEpochSummary.from_bytes(summaries[start : start + length])
+
+    def fork_height(self, height_to_hash: Dict[uint32, bytes32]) -> int:
+        """
+        Returns the last height at which the index agrees with height_to_hash, or -1 if it does not agree at all.
+        Used to repair the index after it fell behind the database.
+        """
+        fork_height = -1
+        if self.corrupt:
+            self.height_count = 0
+            self.summaries_size = 0
+            return fork_height
+        with self._map(self.path) as records, memoryview(records) as view:
+            # A partially written last record is ignored
+            with view[: len(view) - len(view) % RECORD_FORMAT.size] as complete:
+                for height, (header_hash, _, _, _) in enumerate(RECORD_FORMAT.iter_unpack(complete)):
+                    if height_to_hash.get(uint32(height)) != header_hash:
+                        break
+                    fork_height = height
+        self.height_count = fork_height + 1
+        self.summaries_size = self.summaries_path.stat().st_size if self.summaries_path.exists() else 0
+        return fork_height
+
+    def set_chain(self, fork_height: int, block_records: List[BlockRecord]) -> None:
+        """
+        Replaces everything above fork_height with block_records, which must be sorted by height, starting at
+        fork_height + 1. A fork_height of -1 rewrites the whole index.
+        """
+        if fork_height < 0:
+            self.height_count = 0
+            self.summaries_size = 0
+            self.corrupt = False
+        assert fork_height + 1 <= self.height_count
+        summary_chunks: List[bytes] = []
+        record_chunks: List[bytes] = []
+        summaries_end = self.summaries_size
+        for expected_height, block_record in enumerate(block_records, fork_height + 1):
+            assert block_record.height == expected_height
+            summary_offset = 0
+            if block_record.sub_epoch_summary_included is not None:
+                summary_bytes = bytes(block_record.sub_epoch_summary_included)
+                summary_offset = summaries_end + 1
+                summary_chunks.append(SUMMARY_LENGTH_FORMAT.pack(len(summary_bytes)) + summary_bytes)
+                summaries_end += SUMMARY_LENGTH_FORMAT.size + len(summary_bytes)
+            record_chunks.append(
+                RECORD_FORMAT.pack(
+                    block_record.header_hash,
+                    block_record.prev_hash,
+                    int(block_record.weight).to_bytes(16, "big"),
+                    summary_offset,
+                )
+            )
+
+        # If writing fails part way, nothing more is written until the index is rewritten from scratch
+        height_count = fork_height + 1 + len(block_records)
+        self.height_count = 0
+        # Summaries of orphaned blocks stay in the summaries file, they are a few hundred bytes per sub epoch
+        with open(self.summaries_path, "r+b" if self.summaries_path.exists() else "w+b") as f:
+            f.truncate(self.summaries_size)
+            f.seek(self.summaries_size)
+            f.write(b"".join(summary_chunks))
+        with open(self.path, "r+b" if self.path.exists() else "w+b") as f:
+            f.truncate((fork_height + 1) * RECORD_FORMAT.size)
+            f.seek((fork_height + 1) * RECORD_FORMAT.size)
+            f.write(b"".join(record_chunks))
+        self.summaries_size = summaries_end
+        self.height_count = height_count
@@ -1,10 +1,12 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 from sortedcontainers import SortedDict
 
+from src.full_node.block_template import BlockTemplate
 from src.types.blockchain_format.coin import Coin
 from src.types.mempool_item import MempoolItem
 from src.types.blockchain_format.sized_bytes import bytes32
+from src.types.spend_bundle import SpendBundle
 
 
 class Mempool:
@@ -13,16 +15,18 @@ class Mempool:
     additions: Dict[bytes32, MempoolItem]
     removals: Dict[bytes32, MempoolItem]
     size: int
+    template: BlockTemplate
 
     # if new min fee is added
     @staticmethod
-    def create(size: int):
+    def create(size: int, max_block_cost: int, max_fees: int):
         self = Mempool()
         self.spends = {}
         self.additions = {}
         self.removals = {}
         self.sorted_spends = SortedDict()
         self.size = size
+        self.template = BlockTemplate(max_block_cost, max_fees)
         return self
 
     def get_min_fee_rate(self) -> float:
@@ -44,6 +48,7 @@ class Mempool:
         dic = self.sorted_spends[item.fee_per_cost]
         if len(dic.values()) == 0:
             del self.sorted_spends[item.fee_per_cost]
+        self.template.remove_item(item)
 
     def add_to_pool(
         self,
@@ -70,6 +75,13 @@ class Mempool:
             self.additions[add.name()] = item
         for key in removals_dic.keys():
             self.removals[key] = item
+        self.template.add_item(item)
+
+    def get_block_template(self) -> Optional[Tuple[SpendBundle, List[Coin], List[Coin]]]:
+        """
+        Returns the highest paying aggregated spend bundle that fits in a block, with its additions and removals
+        """
+        return self.template.get_bundle(self.sorted_spends)
 
     def at_full_capacity(self) -> bool:
         return len(self.spends.keys()) >= self.size
@@ -146,6 +146,26 @@ def get_puzzle_and_solution_for_coin(block_program: SerializedProgram, coin_name
         return e, None, None
 
 
+def mempool_required_height(
+    unspent: CoinRecord, conditions_dict: Dict[ConditionOpcode, List[ConditionVarPair]]
+) -> uint32:
+    """
+    Returns the lowest prev_transaction_block_height at which the height conditions of this spend pass.
+    """
+    required_height = 0
+    for cvp in conditions_dict.get(ConditionOpcode.ASSERT_HEIGHT_NOW_EXCEEDS, []):
+        try:
+            required_height = max(required_height, int_from_bytes(cvp.vars[0]))
+        except ValueError:
+            continue
+    for cvp in conditions_dict.get(ConditionOpcode.ASSERT_HEIGHT_AGE_EXCEEDS, []):
+        try:
+            required_height = max(required_height, int_from_bytes(cvp.vars[0]) + unspent.confirmed_block_index)
+        except ValueError:
+            continue
+    return uint32(min(max(required_height, 0), 2 ** 32 - 1))
+
+
 def mempool_check_conditions_dict(
     unspent: CoinRecord,
     spend_bundle: SpendBundle,
@@ -2,6 +2,7 @@ import asyncio
 import collections
 import dataclasses
 import time
+import traceback
 from concurrent.futures.process import ProcessPoolExecutor
 from typing import Dict, Optional, Tuple, List, Set
 import logging
@@ -25,7 +26,7 @@ from src.full_node.coin_store import CoinStore
 from src.util.errors import Err
 from src.util.clvm import int_from_bytes
 from src.consensus.cost_calculator import calculate_cost_of_program, CostResult
-from src.full_node.mempool_check_conditions import mempool_check_conditions_dict
+from src.full_node.mempool_check_conditions import mempool_check_conditions_dict, mempool_required_height
 from src.util.condition_tools import pkm_pairs_for_conditions_dict
 from src.util.ints import uint64, uint32
 from src.types.mempool_inclusion_status import MempoolInclusionStatus
@@ -35,24 +36,76 @@ from src.util.streamable import recurse_jsonify, dataclass_from_dict
 log = logging.getLogger(__name__)
 
 
+# Set in each validation worker process by _init_validation_worker, so constants are only parsed once per worker
+_worker_constants: Optional[ConsensusConstants] = None
+
+
+def _init_validation_worker(constants_dict: Dict) -> None:
+    global _worker_constants
+    _worker_constants = dataclass_from_dict(ConsensusConstants, constants_dict)
+
+
 def validate_transaction_multiprocess(
-    constants_dict: Dict,
+    constants: ConsensusConstants,
     spend_bundle_bytes: bytes,
-) -> bytes:
-    constants: ConsensusConstants = dataclass_from_dict(ConsensusConstants, constants_dict)
+) -> Tuple[bytes, bool]:
+    """
+    Returns the serialized CostResult, and whether the aggregate signature is valid for the conditions.
+    If the signature can't be verified here, False is returned and it is verified again when adding to the mempool.
+    """
+    spend_bundle = SpendBundle.from_bytes(spend_bundle_bytes)
     # Calculate the cost and fees
-    program = best_solution_program(SpendBundle.from_bytes(spend_bundle_bytes))
+    program = best_solution_program(spend_bundle)
     # npc contains names of the coins removed, puzzle_hashes and their spend conditions
-    return bytes(calculate_cost_of_program(program, constants.CLVM_COST_RATIO_CONSTANT, True))
+    cost_result: CostResult = calculate_cost_of_program(program, constants.CLVM_COST_RATIO_CONSTANT, True)
+    signature_valid = False
+    try:
+        pks: List[G1Element] = []
+        msgs: List[bytes32] = []
+        for npc in cost_result.npc_list:
+            for pk, message in pkm_pairs_for_conditions_dict(npc.condition_dict, npc.coin_name):
+                pks.append(pk)
+                msgs.append(message)
+        signature_valid = AugSchemeMPL.aggregate_verify(pks, msgs, spend_bundle.aggregated_signature)
+    except Exception:
+        log.debug(f"Could not verify signature in worker: {traceback.format_exc()}")
+    return bytes(cost_result), signature_valid
+
+
+def batch_validate_transactions_multiprocess(
+    spend_bundles_bytes: List[bytes],
+) -> List[Tuple[Optional[bytes], bool, Optional[str]]]:
+    """
+    Validates a batch of spend bundles in a worker. Each bundle fails on its own, with the error as a string.
+    """
+    assert _worker_constants is not None
+    results: List[Tuple[Optional[bytes], bool, Optional[str]]] = []
+    for spend_bundle_bytes in spend_bundles_bytes:
+        try:
+            cost_result_bytes, signature_valid = validate_transaction_multiprocess(
+                _worker_constants, spend_bundle_bytes
+            )
+            results.append((cost_result_bytes, signature_valid, None))
+        except Exception as e:
+            results.append((None, False, str(e)))
+    return results
 
 
 class MempoolManager:
-    def __init__(self, coin_store: CoinStore, consensus_constants: ConsensusConstants):
+    def __init__(
+        self,
+        coin_store: CoinStore,
+        consensus_constants: ConsensusConstants,
+        num_validation_workers: int = 1,
+        validation_batch_size: int = 20,
+    ):
         self.constants: ConsensusConstants = consensus_constants
         self.constants_json = recurse_jsonify(dataclasses.asdict(self.constants))
 
         # Transactions that were unable to enter mempool, used for retry. (they were invalid)
         self.potential_txs: Dict[bytes32, Tuple[SpendBundle, CostResult, bytes32]] = {}
+        # Lowest prev transaction block height at which potential txs that failed a height condition can pass
+        self.potential_tx_heights: Dict[bytes32, uint32] = {}
         # Keep track of seen spend_bundles
         self.seen_bundle_hashes: Dict[bytes32, bytes32] = {}
 
@@ -66,11 +119,24 @@ class MempoolManager:
         self.mempool_size = int(tx_per_sec * sec_per_block * block_buffer_count)
         self.potential_cache_size = 300
         self.seen_cache_size = 10000
-        self.pool = ProcessPoolExecutor(max_workers=1)
+        self.num_validation_workers = max(num_validation_workers, 1)
+        self.validation_batch_size = validation_batch_size
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.num_validation_workers,
+            initializer=_init_validation_worker,
+            initargs=(self.constants_json,),
+        )
+        # Spend bundles waiting for a free validation worker. Bundles that arrive while all workers are busy
+        # are sent together in the next batch.
+        self.validation_queue: List[Tuple[bytes, asyncio.Future]] = []
+        self.busy_validation_workers = 0
 
         # The mempool will correspond to a certain peak
         self.peak: Optional[BlockRecord] = None
-        self.mempool: Mempool = Mempool.create(self.mempool_size)
+        self.mempool: Mempool = self.create_mempool()
+
+    def create_mempool(self) -> Mempool:
+        return Mempool.create(self.mempool_size, self.constants.MAX_BLOCK_COST_CLVM, self.constants.MAX_COIN_AMOUNT)
 
     def shut_down(self):
         self.pool.shutdown(wait=True)
@@ -80,7 +146,8 @@ class MempoolManager:
     ) -> Optional[Tuple[SpendBundle, List[Coin], List[Coin]]]:
         """
         Returns aggregated spendbundle that can be used for creating new block,
-        additions and removals in that spend_bundle
+        additions and removals in that spend_bundle. Items are chosen by highest fee per cost first, and the
+        result is maintained incrementally by the mempool.
         """
         if (
             self.peak is None
@@ -89,28 +156,7 @@ class MempoolManager:
         ):
             return None
 
-        cost_sum = 0  # Checks that total cost does not exceed block maximum
-        fee_sum = 0  # Checks that total fees don't exceed 64 bits
-        spend_bundles: List[SpendBundle] = []
-        removals = []
-        additions = []
-        for dic in self.mempool.sorted_spends.values():
-            for item in dic.values():
-                if (
-                    item.cost_result.cost + cost_sum <= self.constants.MAX_BLOCK_COST_CLVM
-                    and item.fee + fee_sum <= self.constants.MAX_COIN_AMOUNT
-                ):
-                    spend_bundles.append(item.spend_bundle)
-                    cost_sum += item.cost_result.cost
-                    fee_sum += item.fee
-                    removals.extend(item.removals)
-                    additions.extend(item.additions)
-                else:
-                    break
-        if len(spend_bundles) > 0:
-            return SpendBundle.aggregate(spend_bundles), additions, removals
-        else:
-            return None
+        return self.mempool.get_block_template()
 
     def get_filter(self) -> bytes:
         all_transactions: Set[bytes32] = set()
@@ -149,18 +195,50 @@ class MempoolManager:
         if bundle_hash in self.seen_bundle_hashes:
             self.seen_bundle_hashes.pop(bundle_hash)
 
-    async def pre_validate_spendbundle(self, new_spend: SpendBundle) -> CostResult:
+    async def pre_validate_spendbundle(self, new_spend: SpendBundle) -> Tuple[CostResult, bool]:
         """
         Errors are included within the cached_result.
-        This runs in another process so we don't block the main thread
+        This runs in another process so we don't block the main thread. Also returns whether the aggregate
+        signature was already verified there, in which case add_spendbundle does not need to verify it again.
         """
         start_time = time.time()
-        cached_result_bytes = await asyncio.get_running_loop().run_in_executor(
-            self.pool, validate_transaction_multiprocess, self.constants_json, bytes(new_spend)
-        )
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.validation_queue.append((bytes(new_spend), future))
+        self._dispatch_validation()
+        cached_result_bytes, signature_valid = await future
         end_time = time.time()
         log.info(f"It took {end_time - start_time} to pre validate transaction")
-        return CostResult.from_bytes(cached_result_bytes)
+        return CostResult.from_bytes(cached_result_bytes), signature_valid
+
+    def _dispatch_validation(self) -> None:
+        while len(self.validation_queue) > 0 and self.busy_validation_workers < self.num_validation_workers:
+            # A worker that frees up takes its share of the queue, and leaves the rest to the workers that free up
+            # after it, so the queued bundles are spread over the workers
+            batch_size = min(self.validation_batch_size, -(-len(self.validation_queue) // self.num_validation_workers))
+            batch = self.validation_queue[:batch_size]
+            self.validation_queue = self.validation_queue[batch_size:]
+            self.busy_validation_workers += 1
+            asyncio.create_task(self._validate_batch(batch))
+
+    async def _validate_batch(self, batch: List[Tuple[bytes, asyncio.Future]]) -> None:
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.pool, batch_validate_transactions_multiprocess, [spend_bytes for spend_bytes, _ in batch]
+            )
+            for (_, future), (cost_result_bytes, signature_valid, error) in zip(batch, results):
+                if future.done():
+                    continue
+                if cost_result_bytes is None:
+                    future.set_exception(Exception(error))
+                else:
+                    future.set_result((cost_result_bytes, signature_valid))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.busy_validation_workers -= 1
+            self._dispatch_validation()
 
     async def add_spendbundle(
         self,
@@ -315,14 +393,16 @@ class MempoolManager:
                 log.warning(f"{npc.puzzle_hash} != {coin_record.coin.puzzle_hash}")
                 return None, MempoolInclusionStatus.FAILED, Err.WRONG_PUZZLE_HASH
 
-            chialisp_height = (
-                self.peak.prev_transaction_block_height if not self.peak.is_transaction_block else self.peak.height
-            )
-            error = mempool_check_conditions_dict(coin_record, new_spend, npc.condition_dict, uint32(chialisp_height))
+            chialisp_height = self.get_chialisp_height()
+            error = mempool_check_conditions_dict(coin_record, new_spend, npc.condition_dict, chialisp_height)
 
             if error:
                 if error is Err.ASSERT_HEIGHT_NOW_EXCEEDS_FAILED or error is Err.ASSERT_HEIGHT_AGE_EXCEEDS_FAILED:
-                    self.add_to_potential_tx_set(new_spend, spend_name, cost_result)
+                    required_height = max(
+                        mempool_required_height(removal_record_dict[other.coin_name], other.condition_dict)
+                        for other in npc_list
+                    )
+                    self.add_to_potential_tx_set(new_spend, spend_name, cost_result, required_height)
                     return uint64(cost), MempoolInclusionStatus.PENDING, error
                 break
 
@@ -374,16 +454,35 @@ class MempoolManager:
         # 5. If coins can be spent return list of unspents as we see them in local storage
         return None, []
 
-    def add_to_potential_tx_set(self, spend: SpendBundle, spend_name: bytes32, cost_result: CostResult):
+    def add_to_potential_tx_set(
+        self,
+        spend: SpendBundle,
+        spend_name: bytes32,
+        cost_result: CostResult,
+        required_height: Optional[uint32] = None,
+    ):
         """
         Adds SpendBundles that have failed to be added to the pool in potential tx set.
-        This is later used to retry to add them.
+        This is later used to retry to add them. If required_height is set, they are only retried once the
+        peak reaches that height.
         """
         self.potential_txs[spend_name] = spend, cost_result, spend_name
+        if required_height is not None:
+            self.potential_tx_heights[spend_name] = required_height
 
         while len(self.potential_txs) > self.potential_cache_size:
             first_in = list(self.potential_txs.keys())[0]
             self.potential_txs.pop(first_in)
+            self.potential_tx_heights.pop(first_in, None)
+
+    def get_chialisp_height(self) -> uint32:
+        """
+        Height that the height conditions of mempool items are checked against
+        """
+        assert self.peak is not None
+        if not self.peak.is_transaction_block:
+            return self.peak.prev_transaction_block_height
+        return self.peak.height
 
     def get_spendbundle(self, bundle_hash: bytes32) -> Optional[SpendBundle]:
         """ Returns a full SpendBundle if it's inside one the mempools"""
@@ -397,9 +496,12 @@ class MempoolManager:
             return self.mempool.spends[bundle_hash]
         return None
 
-    async def new_peak(self, new_peak: Optional[BlockRecord]):
+    async def new_peak(self, new_peak: Optional[BlockRecord], extends_previous_peak: bool = False):
         """
         Called when a new peak is available, we try to recreate a mempool for the new tip.
+        If extends_previous_peak is set, the previous mempool peak is an ancestor of the new peak. Then the only
+        items that become invalid are the ones spending coins that the new blocks spent, since every other condition
+        keeps passing at a higher height. Otherwise (reorg), all items are validated again.
         """
         if new_peak is None:
             return
@@ -408,17 +510,35 @@ class MempoolManager:
         if new_peak.height <= self.constants.INITIAL_FREEZE_PERIOD:
             return
 
+        old_peak = self.peak
         self.peak = new_peak
 
-        old_pool = self.mempool
-        self.mempool = Mempool.create(self.mempool_size)
+        incremental = extends_previous_peak and old_peak is not None and old_peak.height < new_peak.height
+        if incremental:
+            assert old_peak is not None
+            for height in range(old_peak.height + 1, new_peak.height + 1):
+                for spent_record in await self.coin_store.get_coins_removed_at_height(uint32(height)):
+                    item: Optional[MempoolItem] = self.mempool.removals.get(spent_record.name)
+                    if item is not None:
+                        self.mempool.remove_spend(item)
+        else:
+            old_pool = self.mempool
+            self.mempool = self.create_mempool()
 
-        for item in old_pool.spends.values():
-            await self.add_spendbundle(item.spend_bundle, item.cost_result, item.spend_bundle_name, False)
+            for item in old_pool.spends.values():
+                await self.add_spendbundle(item.spend_bundle, item.cost_result, item.spend_bundle_name, False)
 
+        chialisp_height = self.get_chialisp_height()
         potential_txs_copy = self.potential_txs.copy()
+        potential_tx_heights = self.potential_tx_heights
         self.potential_txs = {}
+        self.potential_tx_heights = {}
         for tx, cached_result, cached_name in potential_txs_copy.values():
+            required_height: Optional[uint32] = potential_tx_heights.get(cached_name)
+            if incremental and required_height is not None and required_height > chialisp_height:
+                # Still time locked, no need to validate it again yet
+                self.add_to_potential_tx_set(tx, cached_name, cached_result, required_height)
+                continue
             await self.add_spendbundle(tx, cached_result, cached_name)
         log.debug(
             f"Size of mempool: {len(self.mempool.spends)}, minimum fee to get in: {self.mempool.get_min_fee_rate()}"
@@ -0,0 +1,117 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+import time
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Dict, List, Tuple
+
+# Upper bounds of the lookup latency histogram buckets, in seconds. The last bucket has no upper bound.
+LATENCY_BUCKETS: List[float] = [0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0]
+
+# Full proofs are looked up before qualities that are still queued on the same disk
+FULL_PROOF_PRIORITY = 0
+QUALITIES_PRIORITY = 1
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total_time += seconds
+        self.max_time = max(self.max_time, seconds)
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        count = sum(self.counts)
+        return {
+            "buckets": LATENCY_BUCKETS,
+            "counts": self.counts,
+            "count": count,
+            "average": self.total_time / count if count > 0 else 0,
+            "max": self.max_time,
+        }
+
+
+class Disk:
+    def __init__(self):
+        # Entries are (priority, sequence number, kind, function, args, future)
+        self.queue: List[Tuple[Tuple[int, int], int, str, Callable, Tuple, asyncio.Future]] = []
+        self.running = 0
+        self.latencies: Dict[str, LatencyHistogram] = {
+            "qualities": LatencyHistogram(),
+            "full_proof": LatencyHistogram(),
+        }
+
+
+class DiskLookupScheduler:
+    """
+    Runs blocking plot lookups in the harvester's thread pool, with at most lookups_per_disk lookups at a time on
+    each device (st_dev), so a disk is not thrashed by many lookups while other disks are idle. On each disk, full
+    proofs run before queued quality lookups, best quality (lowest required iterations) first. The latency of
+    every lookup is recorded per disk.
+    Lookups whose future is cancelled while they are queued are not run.
+    """
+
+    def __init__(self, executor: Executor, lookups_per_disk: int):
+        self.executor = executor
+        self.lookups_per_disk = lookups_per_disk
+        self.disks: Dict[int, Disk] = {}
+        self._sequence = itertools.count()
+
+    def get_qualities(self, device: int, function: Callable, *args) -> asyncio.Future:
+        return self._submit(device, (QUALITIES_PRIORITY, 0), "qualities", function, args)
+
+    def get_full_proof(self, device: int, required_iters: int, function: Callable, *args) -> asyncio.Future:
+        return self._submit(device, (FULL_PROOF_PRIORITY, required_iters), "full_proof", function, args)
+
+    def _submit(
+        self, device: int, priority: Tuple[int, int], kind: str, function: Callable, args: Tuple
+    ) -> asyncio.Future:
+        disk = self.disks.get(device)
+        if disk is None:
+            disk = Disk()
+            self.disks[device] = disk
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(disk.queue, (priority, next(self._sequence), kind, function, args, future))
+        self._start_lookups(disk)
+        return future
+
+    def _start_lookups(self, disk: Disk) -> None:
+        loop = asyncio.get_event_loop()
+        while disk.running < self.lookups_per_disk and len(disk.queue) > 0:
+            _, _, kind, function, args, future = heapq.heappop(disk.queue)
+            if future.cancelled():
+                continue
+            try:
+                executor_future = loop.run_in_executor(self.executor, function, *args)
+            except RuntimeError as e:
+                # The thread pool was shut down
+                future.set_exception(e)
+                continue
+            disk.running += 1
+            executor_future.add_done_callback(partial(self._lookup_done, disk, kind, time.time(), future))
+
+    def _lookup_done(
+        self, disk: Disk, kind: str, start_time: float, future: asyncio.Future, executor_future: asyncio.Future
+    ) -> None:
+        disk.running -= 1
+        disk.latencies[kind].add(time.time() - start_time)
+        if not future.cancelled():
+            if executor_future.cancelled():
+                future.cancel()
+            elif executor_future.exception() is not None:
+                future.set_exception(executor_future.exception())
+            else:
+                future.set_result(executor_future.result())
+        self._start_lookups(disk)
+
+    def get_latencies(self) -> Dict[int, Dict[str, Dict[str, Any]]]:
+        return {
+            device: {kind: histogram.to_json_dict() for kind, histogram in disk.latencies.items()}
+            for device, disk in self.disks.items()
+        }
@@ -1,24 +1,36 @@
 import logging
 import asyncio
+import time
+from collections import deque
 import src.server.ws_connection as ws  # lgtm [py/import-and-import-from]
 from concurrent.futures.thread import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, Tuple, List, Callable, Set
+from typing import Any, Deque, Dict, Optional, Tuple, List, Callable, Set
 import concurrent
 
 from blspy import G1Element
 
 from src.consensus.constants import ConsensusConstants
+from src.harvester.disk_scheduler import DiskLookupScheduler
+from src.harvester.plot_index import PlotIndex
+from src.plotting.plot_metadata_cache import PlotMetadataCache
 from src.plotting.plot_tools import (
-    load_plots,
+    get_plot_filenames,
+    open_plot,
     PlotInfo,
     remove_plot_directory as remove_plot_directory_pt,
     add_plot_directory as add_plot_directory_pt,
     get_plot_directories as get_plot_directories_pt,
 )
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.util.config import load_config
+from src.util.path import path_from_root
 
 log = logging.getLogger(__name__)
 
+# Number of signage points whose lookup timings are kept
+SIGNAGE_POINT_TIMINGS_KEPT = 100
+
 
 class Harvester:
     provers: Dict[Path, PlotInfo]
@@ -33,6 +45,8 @@ class Harvester:
     cached_challenges: List
     constants: ConsensusConstants
     _refresh_lock: asyncio.Lock
+    _remove_lock: asyncio.Lock
+    plot_index: PlotIndex
 
     def __init__(self, root_path: Path, config: Dict, constants: ConsensusConstants):
         self.root_path = root_path
@@ -48,23 +62,63 @@ class Harvester:
         self.match_str = None
         self.show_memo: bool = False
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=config["num_threads"])
+        # Lookups run in the executor, with at most lookups_per_disk of them at a time on each disk
+        self.lookup_scheduler = DiskLookupScheduler(self.executor, config.get("lookups_per_disk", 2))
+        # Seconds after a signage point arrives after which its remaining lookups are cancelled
+        self.signage_point_time_budget: float = config.get("signage_point_time_budget", 20)
+        # Timings of the most recent signage points, for the harvester RPC
+        self.signage_point_timings: Deque[Dict[str, Any]] = deque(maxlen=SIGNAGE_POINT_TIMINGS_KEPT)
         self.state_changed_callback = None
         self.server = None
         self.constants = constants
         self.cached_challenges = []
         self.log = log
         self.state_changed_callback: Optional[Callable] = None
-        self.last_load_time: float = 0
+        self.plot_index = PlotIndex()
+        # Seconds between checks for plots that were removed from disk
+        self.plot_watch_interval: float = config.get("plot_watch_interval", 10)
+        self._plot_watch_task: Optional[asyncio.Task] = None
+
+        # Plots are opened in their own thread pool, so loading them does not delay lookups for signage points
+        self.plot_loading_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=config.get("plot_loading_threads", 8)
+        )
+        # Number of newly opened plots that are added to provers at a time
+        self.plot_loading_batch_size: int = config.get("plot_loading_batch_size", 100)
+        # Seconds between searches of the plot directories for new plots
+        self.plot_refresh_interval: float = config.get("plot_refresh_interval", 120)
+        # From plot directory to its mtime and plot files, when it was last listed
+        self.plot_directory_cache: Dict[Path, Tuple[float, List[Path]]] = {}
+        # Keys and ids of plots that were opened before, so they don't need to be opened again after a restart
+        self.plot_metadata_cache = PlotMetadataCache(
+            path_from_root(root_path, config.get("plot_metadata_cache_path", "cache/plot_metadata.dat"))
+        )
+        self._plot_refresh_task: Optional[asyncio.Task] = None
 
     async def _start(self):
         self._refresh_lock = asyncio.Lock()
+        # Removing missing plots has its own lock, so refreshes are not held up by a sweep
+        self._remove_lock = asyncio.Lock()
+        await asyncio.get_running_loop().run_in_executor(self.plot_loading_executor, self.plot_metadata_cache.load)
+        self._refresh_requested = asyncio.Event()
+        self._plot_watch_task = asyncio.create_task(self._watch_plots())
+        self._plot_refresh_task = asyncio.create_task(self._refresh_plots_periodically())
 
     def _close(self):
         self._is_shutdown = True
+        for task in [self._plot_watch_task, self._plot_refresh_task]:
+            if task is not None:
+                task.cancel()
         self.executor.shutdown(wait=True)
+        self.plot_loading_executor.shutdown(wait=True)
 
     async def _await_closed(self):
-        pass
+        for task in [self._plot_watch_task, self._plot_refresh_task]:
+            if task is not None:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
 
     def _set_state_changed_callback(self, callback: Callable):
         self.state_changed_callback = callback
@@ -102,28 +156,193 @@ class Harvester:
             [str(s) for s in self.no_key_filenames],
         )
 
+    def request_refresh(self) -> None:
+        """
+        Makes the background plot loader search the plot directories now, instead of at the next interval.
+        """
+        self._refresh_requested.set()
+
+    async def _refresh_plots_periodically(self) -> None:
+        while not self._is_shutdown:
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), self.plot_refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_requested.clear()
+            if len(self.farmer_public_keys) == 0 or len(self.pool_public_keys) == 0:
+                # Plots are only loaded after the handshake with the farmer, which sends the keys
+                continue
+            try:
+                async with self._refresh_lock:
+                    await self._load_plots()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log.error(f"Error loading plots: {e}")
+            if len(self.provers) == 0:
+                self.log.warning("Not farming any plots on this harvester. Check your configuration.")
+
+    def get_disk_latencies(self) -> List[Dict]:
+        """
+        Returns the lookup latency histograms of each disk, with the plot directories on it.
+        """
+        directories: Dict[int, Set[str]] = {}
+        plot_counts: Dict[int, int] = {}
+        for path, plot_info in self.provers.items():
+            directories.setdefault(plot_info.device, set()).add(str(path.parent))
+            plot_counts[plot_info.device] = plot_counts.get(plot_info.device, 0) + 1
+        latencies = self.lookup_scheduler.get_latencies()
+        return [
+            {
+                "device": device,
+                "directories": sorted(directories.get(device, set())),
+                "plots": plot_counts.get(device, 0),
+                "latencies": latencies.get(device, {}),
+            }
+            for device in sorted(set(directories.keys()) | set(latencies.keys()))
+        ]
+
+    def add_signage_point_timing(self, timing: Dict[str, Any]) -> None:
+        self.signage_point_timings.append(timing)
+
+    def get_signage_point_timings(self) -> List[Dict[str, Any]]:
+        return list(self.signage_point_timings)
+
     async def refresh_plots(self):
-        locked: bool = self._refresh_lock.locked()
-        changed: bool = False
-        if not locked:
-            async with self._refresh_lock:
-                # Avoid double refreshing of plots
-                (changed, self.provers, self.failed_to_open_filenames, self.no_key_filenames,) = load_plots(
-                    self.provers,
-                    self.failed_to_open_filenames,
-                    self.farmer_public_keys,
-                    self.pool_public_keys,
-                    self.match_str,
-                    self.show_memo,
-                    self.root_path,
-                )
-        if changed:
+        if self._refresh_lock.locked():
+            # The running refresh may have listed the plot directories already, so they are searched again after it
+            self.request_refresh()
+            return
+        async with self._refresh_lock:
+            await self._load_plots()
+
+    async def _load_plots(self) -> None:
+        """
+        Stops farming plots that are no longer in the plot directories, and opens new ones in the plot loading
+        thread pool. New plots are added to provers in batches as they are opened, so farming starts before all of
+        them are loaded. Only directories that changed since the last search are listed again.
+        """
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        config = load_config(self.root_path, "config.yaml", "harvester")
+        plot_filenames: Dict[Path, List[Path]] = await loop.run_in_executor(
+            self.plot_loading_executor, get_plot_filenames, config, self.plot_directory_cache
+        )
+        listed_filenames: Set[Path] = set()
+        for paths in plot_filenames.values():
+            listed_filenames.update(paths)
+        all_filenames = listed_filenames
+        if self.match_str is not None:
+            all_filenames = {filename for filename in listed_filenames if self.match_str in str(filename)}
+
+        removed = [path for path in self.provers.keys() if path not in all_filenames]
+        if len(removed) > 0:
+            for path in removed:
+                del self.provers[path]
+            self.plot_index.set_plots(self.provers)
             self._state_changed("plots")
 
+        # Try once every 20 minutes to open files that failed
+        to_open = [
+            filename
+            for filename in all_filenames
+            if filename not in self.provers
+            and time.time() - self.failed_to_open_filenames.get(filename, 0) >= 1200
+        ]
+        self.no_key_filenames = {f for f in self.no_key_filenames if f in all_filenames} - set(to_open)
+        plot_ids: Set[bytes32] = {plot_info.prover.get_id() for plot_info in self.provers.values()}
+
+        def blocking_open(filename: Path) -> Tuple[Optional[PlotInfo], bool]:
+            if self._is_shutdown:
+                return None, False
+            return open_plot(
+                filename, self.farmer_public_keys, self.pool_public_keys, metadata_cache=self.plot_metadata_cache
+            )
+
+        async def open_in_executor(filename: Path) -> Tuple[Path, Optional[PlotInfo], bool]:
+            try:
+                plot_info, no_key = await loop.run_in_executor(self.plot_loading_executor, blocking_open, filename)
+                return filename, plot_info, no_key
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log.error(f"Failed to open file {filename}. {e}")
+                self.failed_to_open_filenames[filename] = int(time.time())
+                return filename, None, False
+
+        batch: Dict[Path, PlotInfo] = {}
+        added = 0
+        for opened in asyncio.as_completed([open_in_executor(filename) for filename in to_open]):
+            filename, plot_info, no_key = await opened
+            if no_key:
+                self.no_key_filenames.add(filename)
+            if plot_info is None:
+                continue
+            if plot_info.prover.get_id() in plot_ids:
+                self.log.warning(f"Have multiple copies of the plot {filename}, not adding it.")
+                continue
+            plot_ids.add(plot_info.prover.get_id())
+            self.failed_to_open_filenames.pop(filename, None)
+            self.log.info(f"Found plot {filename} of size {plot_info.prover.get_size()}")
+            if self.show_memo:
+                self.log.info(f"Memo: {plot_info.prover.get_memo().hex()}")
+            batch[filename] = plot_info
+            if len(batch) >= self.plot_loading_batch_size:
+                added += len(batch)
+                self._add_plots(batch)
+                batch = {}
+        if len(batch) > 0:
+            added += len(batch)
+            self._add_plots(batch)
+
+        self.plot_metadata_cache.remove_missing(listed_filenames)
+        try:
+            await loop.run_in_executor(self.plot_loading_executor, self.plot_metadata_cache.save)
+        except Exception as e:
+            self.log.error(f"Failed to save plot metadata cache {self.plot_metadata_cache.path}: {e}")
+
+        total_size = sum(plot_info.file_size for plot_info in self.provers.values())
+        self.log.info(
+            f"Loaded {added} new plots, for a total of {len(self.provers)} plots of size "
+            f"{total_size / (1024 ** 4)} TiB, in {time.time() - start_time} seconds"
+        )
+
+    def _add_plots(self, plots: Dict[Path, PlotInfo]) -> None:
+        self.provers.update(plots)
+        self.plot_index.add_plots(plots)
+        self._state_changed("plots")
+
+    async def remove_missing_plots(self) -> None:
+        """
+        Stops farming plots whose files were removed. Signage points don't check whether plot files exist, so this
+        is done periodically by _watch_plots instead.
+        """
+        async with self._remove_lock:
+            loop = asyncio.get_running_loop()
+            missing: List[Path] = await loop.run_in_executor(self.executor, self.plot_index.missing_paths)
+            if len(missing) == 0:
+                return
+            for path in missing:
+                self.log.warning(f"Plot {path} was removed, not farming it anymore")
+                self.provers.pop(path, None)
+            self.plot_index.set_plots(self.provers)
+        self._state_changed("plots")
+
+    async def _watch_plots(self) -> None:
+        while not self._is_shutdown:
+            await asyncio.sleep(self.plot_watch_interval)
+            try:
+                await self.remove_missing_plots()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log.error(f"Error checking for removed plots: {e}")
+
     def delete_plot(self, str_path: str):
         path = Path(str_path).resolve()
         if path in self.provers:
             del self.provers[path]
+            self.plot_index.set_plots(self.provers)
 
         # Remove absolute and relative paths
         if path.exists():
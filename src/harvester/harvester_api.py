@@ -1,7 +1,7 @@
 import asyncio
 import time
 from pathlib import Path
-from typing import Callable, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 from blspy import AugSchemeMPL, G2Element
 
@@ -41,11 +41,8 @@ class HarvesterAPI:
         self.harvester.farmer_public_keys = harvester_handshake.farmer_public_keys
         self.harvester.pool_public_keys = harvester_handshake.pool_public_keys
 
-        await self.harvester.refresh_plots()
-
-        if len(self.harvester.provers) == 0:
-            self.harvester.log.warning("Not farming any plots on this harvester. Check your configuration.")
-            return
+        # Plots are loaded in the background, and farmed as soon as they are opened
+        self.harvester.request_refresh()
 
     @peer_required
     @api_request
@@ -71,81 +68,92 @@ class HarvesterAPI:
         start = time.time()
         assert len(new_challenge.challenge_hash) == 32
 
-        # Refresh plots to see if there are any new ones
-        if start - self.harvester.last_load_time > 120:
-            await self.harvester.refresh_plots()
-            self.harvester.last_load_time = time.time()
+        sp_interval_iters = calculate_sp_interval_iters(self.harvester.constants, new_challenge.sub_slot_iters)
 
-        loop = asyncio.get_running_loop()
-
-        def blocking_lookup(filename: Path, plot_info: PlotInfo) -> List[Tuple[bytes32, ProofOfSpace]]:
+        def blocking_get_qualities(plot_info: PlotInfo, sp_challenge_hash: bytes32) -> List[bytes32]:
             # Uses the DiskProver object to lookup qualities. This is a blocking call,
             # so it should be run in a thread pool.
             try:
-                sp_challenge_hash = ProofOfSpace.calculate_pos_challenge(
-                    plot_info.prover.get_id(),
-                    new_challenge.challenge_hash,
-                    new_challenge.sp_hash,
+                quality_strings = plot_info.prover.get_qualities_for_challenge(sp_challenge_hash)
+            except Exception as e:
+                self.harvester.log.error(f"Error using prover object {e}")
+                return []
+            return [] if quality_strings is None else quality_strings
+
+        def blocking_get_full_proof(
+            filename: Path, plot_info: PlotInfo, sp_challenge_hash: bytes32, index: int
+        ) -> Optional[bytes]:
+            try:
+                return plot_info.prover.get_full_proof(sp_challenge_hash, index)
+            except RuntimeError:
+                self.harvester.log.error(f"Exception fetching full proof for {filename}")
+                return None
+
+        async def lookup_challenge(
+            filename: Path, plot_info: PlotInfo, sp_challenge_hash: bytes32
+        ) -> List[harvester_protocol.NewProofOfSpace]:
+            # Looks up qualities and proofs in the thread pool, through the scheduler of the plot's disk
+            if self.harvester._is_shutdown:
+                return []
+            scheduler = self.harvester.lookup_scheduler
+            try:
+                quality_strings: List[bytes32] = await scheduler.get_qualities(
+                    plot_info.device, blocking_get_qualities, plot_info, sp_challenge_hash
                 )
-                try:
-                    quality_strings = plot_info.prover.get_qualities_for_challenge(sp_challenge_hash)
-                except Exception as e:
-                    self.harvester.log.error(f"Error using prover object {e}")
-                    return []
-
-                responses: List[Tuple[bytes32, ProofOfSpace]] = []
-                if quality_strings is not None:
-                    # Found proofs of space (on average 1 is expected per plot)
-                    for index, quality_str in enumerate(quality_strings):
-                        required_iters: uint64 = calculate_iterations_quality(
-                            self.harvester.constants.DIFFICULTY_CONSTANT_FACTOR,
-                            quality_str,
-                            plot_info.prover.get_size(),
-                            new_challenge.difficulty,
-                            new_challenge.sp_hash,
-                        )
-                        sp_interval_iters = calculate_sp_interval_iters(
-                            self.harvester.constants, new_challenge.sub_slot_iters
+                lookup_times["quality_time"] = time.time() - lookups_start
+
+                # Found proofs of space (on average 1 is expected per plot)
+                good_qualities: List[Tuple[uint64, int, bytes32]] = []
+                for index, quality_str in enumerate(quality_strings):
+                    required_iters: uint64 = calculate_iterations_quality(
+                        self.harvester.constants.DIFFICULTY_CONSTANT_FACTOR,
+                        quality_str,
+                        plot_info.prover.get_size(),
+                        new_challenge.difficulty,
+                        new_challenge.sp_hash,
+                    )
+                    if required_iters < sp_interval_iters:
+                        good_qualities.append((required_iters, index, quality_str))
+
+                # Found a very good proof of space! will fetch the whole proof from disk, then send to farmer.
+                # The scheduler fetches the best qualities on each disk first.
+                all_proof_xs: List[Optional[bytes]] = await asyncio.gather(
+                    *[
+                        scheduler.get_full_proof(
+                            plot_info.device,
+                            required_iters,
+                            blocking_get_full_proof,
+                            filename,
+                            plot_info,
+                            sp_challenge_hash,
+                            index,
                         )
-                        if required_iters < sp_interval_iters:
-                            # Found a very good proof of space! will fetch the whole proof from disk,
-                            # then send to farmer
-                            try:
-                                proof_xs = plot_info.prover.get_full_proof(sp_challenge_hash, index)
-                            except RuntimeError:
-                                self.harvester.log.error(f"Exception fetching full proof for {filename}")
-                                continue
-
-                            plot_public_key = ProofOfSpace.generate_plot_public_key(
-                                plot_info.local_sk.get_g1(), plot_info.farmer_public_key
-                            )
-                            responses.append(
-                                (
-                                    quality_str,
-                                    ProofOfSpace(
-                                        sp_challenge_hash,
-                                        plot_info.pool_public_key,
-                                        plot_info.pool_contract_puzzle_hash,
-                                        plot_public_key,
-                                        uint8(plot_info.prover.get_size()),
-                                        proof_xs,
-                                    ),
-                                )
-                            )
-                return responses
+                        for required_iters, index, _ in good_qualities
+                    ]
+                )
+                if len(good_qualities) > 0:
+                    lookup_times["proof_time"] = time.time() - lookups_start
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 self.harvester.log.error(f"Unknown error: {e}")
                 return []
 
-        async def lookup_challenge(filename: Path, plot_info: PlotInfo) -> List[harvester_protocol.NewProofOfSpace]:
-            # Executes a DiskProverLookup in a thread pool, and returns responses
             all_responses: List[harvester_protocol.NewProofOfSpace] = []
-            if self.harvester._is_shutdown:
-                return []
-            proofs_of_space_and_q: List[Tuple[bytes32, ProofOfSpace]] = await loop.run_in_executor(
-                self.harvester.executor, blocking_lookup, filename, plot_info
-            )
-            for quality_str, proof_of_space in proofs_of_space_and_q:
+            for (_, _, quality_str), proof_xs in zip(good_qualities, all_proof_xs):
+                if proof_xs is None:
+                    continue
+                plot_public_key = ProofOfSpace.generate_plot_public_key(
+                    plot_info.local_sk.get_g1(), plot_info.farmer_public_key
+                )
+                proof_of_space = ProofOfSpace(
+                    sp_challenge_hash,
+                    plot_info.pool_public_key,
+                    plot_info.pool_contract_puzzle_hash,
+                    plot_public_key,
+                    uint8(plot_info.prover.get_size()),
+                    proof_xs,
+                )
                 all_responses.append(
                     harvester_protocol.NewProofOfSpace(
                         new_challenge.challenge_hash,
@@ -157,30 +165,51 @@ class HarvesterAPI:
                 )
             return all_responses
 
-        awaitables = []
-        passed = 0
-        total = 0
-        for try_plot_filename, try_plot_info in self.harvester.provers.items():
-            if try_plot_filename.exists():
-                # Passes the plot filter (does not check sp filter yet though, since we have not reached sp)
-                # This is being executed at the beginning of the slot
-                total += 1
-                if ProofOfSpace.passes_plot_filter(
-                    self.harvester.constants,
-                    try_plot_info.prover.get_id(),
-                    new_challenge.challenge_hash,
-                    new_challenge.sp_hash,
-                ):
-                    passed += 1
-                    awaitables.append(lookup_challenge(try_plot_filename, try_plot_info))
-
-        # Concurrently executes all lookups on disk, to take advantage of multiple disk parallelism
+        # Applies the plot filter to all plots in one pass over the plot index. Removed plot files are dropped from
+        # the index by the harvester's plot watcher, so they are not checked here.
+        total = len(self.harvester.plot_index)
+        passing_plots = self.harvester.plot_index.passing_plots(
+            self.harvester.constants.NUMBER_ZERO_BITS_PLOT_FILTER,
+            new_challenge.challenge_hash,
+            new_challenge.sp_hash,
+        )
+        passed = len(passing_plots)
+        filter_time = time.time() - start
+
+        # Wall time from the start of the lookups until the last quality and the last proof were found. These are
+        # updated as lookups finish.
+        lookups_start = time.time()
+        lookup_times: Dict[str, float] = {"quality_time": 0.0, "proof_time": 0.0}
+        pending = {
+            asyncio.create_task(lookup_challenge(filename, plot_info, sp_challenge_hash))
+            for filename, plot_info, sp_challenge_hash in passing_plots
+        }
+
+        # Concurrently executes all lookups on disk, to take advantage of multiple disk parallelism. Lookups on the
+        # same disk are limited by the harvester's lookup scheduler. Proofs are sent as soon as they are found, and
+        # lookups that did not finish within the time budget of the signage point are cancelled, since their
+        # proofs would arrive too late to be used.
+        deadline = start + self.harvester.signage_point_time_budget
         total_proofs_found = 0
-        for sublist_awaitable in asyncio.as_completed(awaitables):
-            for response in await sublist_awaitable:
-                total_proofs_found += 1
-                msg = make_msg(ProtocolMessageTypes.new_proof_of_space, response)
-                await peer.send_message(msg)
+        while len(pending) > 0:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(deadline - time.time(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if len(done) == 0:
+                break
+            for task in done:
+                for response in task.result():
+                    total_proofs_found += 1
+                    msg = make_msg(ProtocolMessageTypes.new_proof_of_space, response)
+                    await peer.send_message(msg)
+        cancelled_lookups = len(pending)
+        for task in pending:
+            task.cancel()
+        if cancelled_lookups > 0:
+            self.harvester.log.warning(
+                f"Cancelled {cancelled_lookups} lookups for signage point {new_challenge.sp_hash.hex()[:10]}..., "
+                f"they did not finish within {self.harvester.signage_point_time_budget} seconds"
+            )
 
         now = uint64(int(time.time()))
         farming_info = FarmingInfo(
@@ -193,9 +222,26 @@ class HarvesterAPI:
         )
         pass_msg = make_msg(ProtocolMessageTypes.farming_info, farming_info)
         await peer.send_message(pass_msg)
+        total_time = time.time() - start
+        self.harvester.add_signage_point_timing(
+            {
+                "challenge_hash": new_challenge.challenge_hash,
+                "sp_hash": new_challenge.sp_hash,
+                "signage_point_index": new_challenge.signage_point_index,
+                "timestamp": now,
+                "plots": total,
+                "passed_filter": passed,
+                "proofs": total_proofs_found,
+                "cancelled_lookups": cancelled_lookups,
+                "filter_time": filter_time,
+                "quality_time": lookup_times["quality_time"],
+                "proof_time": lookup_times["proof_time"],
+                "total_time": total_time,
+            }
+        )
         self.harvester.log.info(
-            f"{len(awaitables)} plots were eligible for farming {new_challenge.challenge_hash.hex()[:10]}..."
-            f" Found {total_proofs_found} proofs. Time: {time.time() - start:.5f} s. "
+            f"{passed} plots were eligible for farming {new_challenge.challenge_hash.hex()[:10]}..."
+            f" Found {total_proofs_found} proofs. Time: {total_time:.5f} s. "
             f"Total {len(self.harvester.provers)} plots"
         )
 
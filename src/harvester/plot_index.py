@@ -0,0 +1,71 @@
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from src.plotting.plot_tools import PlotInfo
+from src.types.blockchain_format.sized_bytes import bytes32
+
+
+class PlotIndex:
+    """
+    Plot ids of all loaded plots, stored back to back in a single bytearray, so the plot filter for a signage point
+    is one pass over the array, without calling into the provers. The index is rebuilt with set_plots whenever the
+    harvester's plots change.
+    """
+
+    def __init__(self):
+        self.plot_ids = bytearray()
+        self.paths: List[Path] = []
+        self.plot_infos: List[PlotInfo] = []
+
+    def set_plots(self, provers: Dict[Path, PlotInfo]) -> None:
+        plot_ids = bytearray()
+        paths: List[Path] = []
+        plot_infos: List[PlotInfo] = []
+        for path, plot_info in provers.items():
+            plot_ids += plot_info.prover.get_id()
+            paths.append(path)
+            plot_infos.append(plot_info)
+        self.plot_ids, self.paths, self.plot_infos = plot_ids, paths, plot_infos
+
+    def add_plots(self, provers: Dict[Path, PlotInfo]) -> None:
+        """
+        Appends plots that are not in the index yet, without rebuilding it.
+        """
+        plot_ids = self.plot_ids + b"".join(plot_info.prover.get_id() for plot_info in provers.values())
+        self.plot_ids, self.paths, self.plot_infos = (
+            plot_ids,
+            self.paths + list(provers.keys()),
+            self.plot_infos + list(provers.values()),
+        )
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def passing_plots(
+        self, number_zero_bits: int, challenge_hash: bytes32, sp_hash: bytes32
+    ) -> List[Tuple[Path, PlotInfo, bytes32]]:
+        """
+        Returns the plots that pass the plot filter, with the proof of space challenge of each. This is the same
+        check as ProofOfSpace.passes_plot_filter, and the same challenge as ProofOfSpace.calculate_pos_challenge.
+        """
+        suffix = bytes(challenge_hash) + bytes(sp_hash)
+        shift = 256 - number_zero_bits
+        sha256 = hashlib.sha256
+        from_bytes = int.from_bytes
+        passed: List[Tuple[Path, PlotInfo, bytes32]] = []
+        with memoryview(self.plot_ids) as ids:
+            for i in range(len(self.paths)):
+                filter_input = sha256(ids[i * 32 : i * 32 + 32])
+                filter_input.update(suffix)
+                digest = filter_input.digest()
+                if from_bytes(digest, "big") >> shift == 0:
+                    passed.append((self.paths[i], self.plot_infos[i], bytes32(sha256(digest).digest())))
+        return passed
+
+    def missing_paths(self) -> List[Path]:
+        """
+        Returns the plots whose files do not exist anymore. This does a stat per plot, so it is not meant to run on
+        the event loop.
+        """
+        return [path for path in self.paths if not path.exists()]
@@ -0,0 +1,104 @@
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from blspy import G1Element, PrivateKey
+
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.util.ints import uint8, uint32, uint64
+from src.util.path import mkdir
+from src.util.streamable import Streamable, streamable
+
+log = logging.getLogger(__name__)
+
+# Incremented when PlotMetadata changes, older cache files are then ignored
+CACHE_VERSION = 1
+
+
+@dataclass(frozen=True)
+@streamable
+class PlotMetadata(Streamable):
+    filename: str
+    file_size: uint64
+    time_modified_ns: uint64
+    plot_id: bytes32
+    size: uint8
+    memo: bytes
+    pool_public_key: Optional[G1Element]
+    pool_contract_puzzle_hash: Optional[bytes32]
+    farmer_public_key: G1Element
+    plot_public_key: G1Element
+    local_sk: PrivateKey
+
+
+@dataclass(frozen=True)
+@streamable
+class PlotMetadataFile(Streamable):
+    version: uint32
+    plots: List[PlotMetadata]
+
+
+class PlotMetadataCache:
+    """
+    What the harvester learned from opening each plot, saved to disk so a restart does not need to open the plots
+    again. An entry is only used while the size and mtime of its file are unchanged.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[Path, PlotMetadata] = {}
+        self.changed = False
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            cache_file = PlotMetadataFile.from_bytes(self.path.read_bytes())
+        except Exception as e:
+            log.warning(f"Ignoring plot metadata cache {self.path}, it can't be read: {e}")
+            return
+        if cache_file.version != CACHE_VERSION:
+            log.info(f"Ignoring plot metadata cache {self.path} with version {cache_file.version}")
+            return
+        self.entries = {Path(metadata.filename): metadata for metadata in cache_file.plots}
+
+    def get(self, filename: Path, stat_info: os.stat_result) -> Optional[PlotMetadata]:
+        metadata = self.entries.get(filename)
+        if metadata is None:
+            return None
+        if metadata.file_size != stat_info.st_size or metadata.time_modified_ns != stat_info.st_mtime_ns:
+            return None
+        return metadata
+
+    def set(self, metadata: PlotMetadata) -> None:
+        self.entries[Path(metadata.filename)] = metadata
+        self.changed = True
+
+    def remove_missing(self, filenames: Set[Path]) -> None:
+        """
+        Removes the entries of plots that are not in filenames anymore.
+        """
+        missing = [filename for filename in self.entries.keys() if filename not in filenames]
+        for filename in missing:
+            del self.entries[filename]
+        if len(missing) > 0:
+            self.changed = True
+
+    def save(self) -> None:
+        if not self.changed:
+            return
+        cache_file = PlotMetadataFile(uint32(CACHE_VERSION), list(self.entries.values()))
+        mkdir(self.path.parent)
+        temp_path = self.path.with_suffix("." + str(os.getpid()))
+        # The cache holds the local private key of every plot, so only the owner can read it. A file left by an
+        # earlier run is removed, since os.open does not change the mode of an existing file.
+        if temp_path.exists():
+            temp_path.unlink()
+        fd = os.open(temp_path, os.O_CREAT | os.O_TRUNC | os.O_WRONLY, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(cache_file))
+        shutil.move(str(temp_path), self.path)
+        self.changed = False
@@ -3,23 +3,72 @@ from pathlib import Path
 from blspy import PrivateKey, G1Element
 from chiapos import DiskProver
 from dataclasses import dataclass
+import threading
 import time
 import logging
 import traceback
 
 from src.consensus.pos_quality import _expected_plot_size, UI_ACTUAL_SPACE_CONSTANT_FACTOR
+from src.plotting.plot_metadata_cache import PlotMetadata, PlotMetadataCache
 from src.types.blockchain_format.proof_of_space import ProofOfSpace
 from src.types.blockchain_format.sized_bytes import bytes32
 from src.util.config import load_config, save_config
+from src.util.ints import uint8, uint64
 from src.wallet.derive_keys import master_sk_to_local_sk
 
 
 log = logging.getLogger(__name__)
 
+# Seconds within which a directory mtime might not change when files are added, on file systems like FAT
+DIRECTORY_MTIME_RESOLUTION = 2
+
+
+class LazyDiskProver:
+    """
+    Stands in for a DiskProver of a plot whose id, size and memo are known from the plot metadata cache. The plot
+    file is only opened when qualities or proofs are looked up.
+    """
+
+    def __init__(self, filename: Path, plot_id: bytes32, size: uint8, memo: bytes):
+        self.filename = filename
+        self.plot_id = plot_id
+        self.size = size
+        self.memo = memo
+        self._prover: Optional[DiskProver] = None
+        self._lock = threading.Lock()
+
+    def get_filename(self) -> str:
+        return str(self.filename)
+
+    def get_id(self) -> bytes32:
+        return self.plot_id
+
+    def get_size(self) -> uint8:
+        return self.size
+
+    def get_memo(self) -> bytes:
+        return self.memo
+
+    def _get_prover(self) -> DiskProver:
+        # Lookups for different signage points can run in different threads at the same time
+        with self._lock:
+            if self._prover is None:
+                prover = DiskProver(str(self.filename))
+                if prover.get_id() != self.plot_id:
+                    raise ValueError(f"Plot {self.filename} has id {prover.get_id().hex()}, expected {self.plot_id}")
+                self._prover = prover
+            return self._prover
+
+    def get_qualities_for_challenge(self, challenge: bytes32) -> List[bytes]:
+        return self._get_prover().get_qualities_for_challenge(challenge)
+
+    def get_full_proof(self, challenge: bytes32, index: int) -> bytes:
+        return self._get_prover().get_full_proof(challenge, index)
+
 
 @dataclass
 class PlotInfo:
-    prover: DiskProver
+    prover: Union[DiskProver, LazyDiskProver]
     pool_public_key: Optional[G1Element]
     pool_contract_puzzle_hash: Optional[bytes32]
     farmer_public_key: G1Element
@@ -27,6 +76,8 @@ class PlotInfo:
     local_sk: PrivateKey
     file_size: int
     time_modified: float
+    # Device the plot file is on (st_dev), the harvester limits concurrent lookups per device
+    device: int
 
 
 def _get_filenames(directory: Path) -> List[Path]:
@@ -51,13 +102,30 @@ def _get_filenames(directory: Path) -> List[Path]:
     return all_files
 
 
-def get_plot_filenames(config: Dict) -> Dict[Path, List[Path]]:
-    # Returns a map from directory to a list of all plots in the directory
+def get_plot_filenames(
+    config: Dict, directory_cache: Optional[Dict[Path, Tuple[float, List[Path]]]] = None
+) -> Dict[Path, List[Path]]:
+    # Returns a map from directory to a list of all plots in the directory. If a directory cache is given, only
+    # directories whose mtime changed since they were cached are listed again.
     directory_names: List[str] = config["plot_directories"]
     all_files: Dict[Path, List[Path]] = {}
     for directory_name in directory_names:
         directory = Path(directory_name).resolve()
+        mtime: Optional[float] = None
+        if directory_cache is not None:
+            try:
+                mtime = directory.stat().st_mtime
+            except OSError:
+                mtime = None
+            cached = directory_cache.get(directory)
+            if mtime is not None and cached is not None and cached[0] == mtime:
+                all_files[directory] = cached[1]
+                continue
         all_files[directory] = _get_filenames(directory)
+        # On file systems with coarse timestamps, a file added right after listing might not change the mtime,
+        # so recently changed directories are listed again next time
+        if directory_cache is not None and mtime is not None and time.time() - mtime > DIRECTORY_MTIME_RESOLUTION:
+            directory_cache[directory] = (mtime, all_files[directory])
     return all_files
 
 
@@ -134,6 +202,107 @@ def remove_plot_directory(str_path: str, root_path: Path) -> None:
     save_config(root_path, "config.yaml", config)
 
 
+def open_plot(
+    filename: Path,
+    farmer_public_keys: Optional[List[G1Element]],
+    pool_public_keys: Optional[List[G1Element]],
+    open_no_key_filenames: bool = False,
+    metadata_cache: Optional[PlotMetadataCache] = None,
+) -> Tuple[Optional[PlotInfo], bool]:
+    """
+    Opens a plot file and derives its keys. Returns the PlotInfo, or None if the plot should not be farmed, and
+    whether the plot has keys that are not in the given lists. Raises if the file can't be opened or parsed.
+    If the plot is in the metadata cache, the file is not read, and its prover is only opened when it is used.
+    This blocks on disk reads, so the harvester calls it from a thread pool.
+    """
+    stat_info = filename.stat()
+    metadata: Optional[PlotMetadata] = None
+    if metadata_cache is not None:
+        metadata = metadata_cache.get(filename, stat_info)
+
+    prover: Union[DiskProver, LazyDiskProver]
+    if metadata is not None:
+        prover = LazyDiskProver(filename, metadata.plot_id, metadata.size, metadata.memo)
+    else:
+        prover = DiskProver(str(filename))
+
+    expected_size = _expected_plot_size(prover.get_size()) * UI_ACTUAL_SPACE_CONSTANT_FACTOR
+
+    # TODO: consider checking if the file was just written to (which would mean that the file is still
+    # being copied). A segfault might happen in this edge case.
+
+    if prover.get_size() >= 30 and stat_info.st_size < 0.98 * expected_size:
+        log.warning(
+            f"Not farming plot {filename}. Size is {stat_info.st_size / (1024**3)} GiB, but expected"
+            f" at least: {expected_size / (1024 ** 3)} GiB. We assume the file is being copied."
+        )
+        return None, False
+
+    if metadata is None:
+        (
+            pool_public_key_or_puzzle_hash,
+            farmer_public_key,
+            local_master_sk,
+        ) = parse_plot_info(prover.get_memo())
+
+        if isinstance(pool_public_key_or_puzzle_hash, G1Element):
+            pool_public_key = pool_public_key_or_puzzle_hash
+            pool_contract_puzzle_hash = None
+        else:
+            assert isinstance(pool_public_key_or_puzzle_hash, bytes32)
+            pool_public_key = None
+            pool_contract_puzzle_hash = pool_public_key_or_puzzle_hash
+
+        local_sk = master_sk_to_local_sk(local_master_sk)
+        plot_public_key: G1Element = ProofOfSpace.generate_plot_public_key(local_sk.get_g1(), farmer_public_key)
+        metadata = PlotMetadata(
+            str(filename),
+            uint64(stat_info.st_size),
+            uint64(stat_info.st_mtime_ns),
+            bytes32(prover.get_id()),
+            uint8(prover.get_size()),
+            bytes(prover.get_memo()),
+            pool_public_key,
+            pool_contract_puzzle_hash,
+            farmer_public_key,
+            plot_public_key,
+            local_sk,
+        )
+        if metadata_cache is not None:
+            metadata_cache.set(metadata)
+
+    no_key = False
+    # Only use plots that correct keys associated with them
+    if farmer_public_keys is not None and metadata.farmer_public_key not in farmer_public_keys:
+        log.warning(f"Plot {filename} has a farmer public key that is not in the farmer's pk list.")
+        no_key = True
+        if not open_no_key_filenames:
+            return None, no_key
+
+    if (
+        pool_public_keys is not None
+        and metadata.pool_public_key is not None
+        and metadata.pool_public_key not in pool_public_keys
+    ):
+        log.warning(f"Plot {filename} has a pool public key that is not in the farmer's pool pk list.")
+        no_key = True
+        if not open_no_key_filenames:
+            return None, no_key
+
+    plot_info = PlotInfo(
+        prover,
+        metadata.pool_public_key,
+        metadata.pool_contract_puzzle_hash,
+        metadata.farmer_public_key,
+        metadata.plot_public_key,
+        metadata.local_sk,
+        stat_info.st_size,
+        stat_info.st_mtime,
+        stat_info.st_dev,
+    )
+    return plot_info, no_key
+
+
 def load_plots(
     provers: Dict[Path, PlotInfo],
     failed_to_open_filenames: Dict[Path, int],
@@ -181,87 +350,28 @@ def load_plots(
                     plot_ids.add(provers[filename].prover.get_id())
                     continue
             try:
-                prover = DiskProver(str(filename))
-
-                expected_size = _expected_plot_size(prover.get_size()) * UI_ACTUAL_SPACE_CONSTANT_FACTOR
-                stat_info = filename.stat()
-
-                # TODO: consider checking if the file was just written to (which would mean that the file is still
-                # being copied). A segfault might happen in this edge case.
-
-                if prover.get_size() >= 30 and stat_info.st_size < 0.98 * expected_size:
-                    log.warning(
-                        f"Not farming plot {filename}. Size is {stat_info.st_size / (1024**3)} GiB, but expected"
-                        f" at least: {expected_size / (1024 ** 3)} GiB. We assume the file is being copied."
-                    )
-                    continue
-
-                if prover.get_id() in plot_ids:
-                    log.warning(f"Have multiple copies of the plot {filename}, not adding it.")
-                    continue
-
-                (
-                    pool_public_key_or_puzzle_hash,
-                    farmer_public_key,
-                    local_master_sk,
-                ) = parse_plot_info(prover.get_memo())
-
-                # Only use plots that correct keys associated with them
-                if farmer_public_keys is not None and farmer_public_key not in farmer_public_keys:
-                    log.warning(f"Plot {filename} has a farmer public key that is not in the farmer's pk list.")
-                    no_key_filenames.add(filename)
-                    if not open_no_key_filenames:
-                        continue
-
-                if isinstance(pool_public_key_or_puzzle_hash, G1Element):
-                    pool_public_key = pool_public_key_or_puzzle_hash
-                    pool_contract_puzzle_hash = None
-                else:
-                    assert isinstance(pool_public_key_or_puzzle_hash, bytes32)
-                    pool_public_key = None
-                    pool_contract_puzzle_hash = pool_public_key_or_puzzle_hash
-
-                if (
-                    pool_public_keys is not None
-                    and pool_public_key is not None
-                    and pool_public_key not in pool_public_keys
-                ):
-                    log.warning(f"Plot {filename} has a pool public key that is not in the farmer's pool pk list.")
-                    no_key_filenames.add(filename)
-                    if not open_no_key_filenames:
-                        continue
-
-                stat_info = filename.stat()
-                local_sk = master_sk_to_local_sk(local_master_sk)
-                plot_public_key: G1Element = ProofOfSpace.generate_plot_public_key(local_sk.get_g1(), farmer_public_key)
-                new_provers[filename] = PlotInfo(
-                    prover,
-                    pool_public_key,
-                    pool_contract_puzzle_hash,
-                    farmer_public_key,
-                    plot_public_key,
-                    local_sk,
-                    stat_info.st_size,
-                    stat_info.st_mtime,
-                )
-                plot_ids.add(prover.get_id())
-                total_size += stat_info.st_size
-                changed = True
+                plot_info, no_key = open_plot(filename, farmer_public_keys, pool_public_keys, open_no_key_filenames)
             except Exception as e:
                 tb = traceback.format_exc()
                 log.error(f"Failed to open file {filename}. {e} {tb}")
                 failed_to_open_filenames[filename] = int(time.time())
                 continue
-            log.info(f"Found plot {filename} of size {new_provers[filename].prover.get_size()}")
+            if no_key:
+                no_key_filenames.add(filename)
+            if plot_info is None:
+                continue
+            if plot_info.prover.get_id() in plot_ids:
+                log.warning(f"Have multiple copies of the plot {filename}, not adding it.")
+                continue
+
+            new_provers[filename] = plot_info
+            plot_ids.add(plot_info.prover.get_id())
+            total_size += plot_info.file_size
+            changed = True
+            log.info(f"Found plot {filename} of size {plot_info.prover.get_size()}")
 
             if show_memo:
-                plot_memo: bytes32
-                if pool_contract_puzzle_hash is None:
-                    plot_memo = stream_plot_info_pk(pool_public_key, farmer_public_key, local_master_sk)
-                else:
-                    plot_memo = stream_plot_info_ph(pool_contract_puzzle_hash, farmer_public_key, local_master_sk)
-                plot_memo_str: str = plot_memo.hex()
-                log.info(f"Memo: {plot_memo_str}")
+                log.info(f"Memo: {plot_info.prover.get_memo().hex()}")
 
     log.info(
         f"Loaded a total of {len(new_provers)} plots of size {total_size / (1024 ** 4)} TiB, in"
@@ -4,6 +4,7 @@ from typing import Callable, List, Optional, Dict, Any
 
 from src.types.coin_record import CoinRecord
 from src.types.full_block import FullBlock
+from src.types.full_block_view import FullBlockView
 from src.types.blockchain_format.sized_bytes import bytes32
 from src.types.mempool_inclusion_status import MempoolInclusionStatus
 from src.types.spend_bundle import SpendBundle
@@ -128,6 +129,7 @@ class FullNodeRpcApi:
                 "sub_slot_iters": sub_slot_iters,
                 "space": space["space"],
                 "mempool_size": mempool_size,
+                "coin_cache": self.service.coin_store.get_cache_metrics(),
             },
         }
         self.cached_blockchain_state = dict(response["blockchain_state"])
@@ -158,7 +160,7 @@ class FullNodeRpcApi:
         block_range = []
         for a in range(start, end):
             block_range.append(uint32(a))
-        blocks: List[FullBlock] = await self.service.block_store.get_full_blocks_at(block_range)
+        blocks: List[FullBlockView] = await self.service.block_store.get_full_blocks_at(block_range)
         json_blocks = []
         for block in blocks:
             json = block.to_json_dict()
@@ -353,8 +355,7 @@ class FullNodeRpcApi:
             raise ValueError(f"Block {header_hash.hex()} not found")
         reward_additions = block.get_included_reward_coins()
 
-        # TODO: optimize
-        tx_removals, tx_additions = block.tx_removals_and_additions()
+        tx_removals, tx_additions = await self.service.block_store.get_tx_removals_and_additions(block)
         removal_records = []
         addition_records = []
         for tx_removal in tx_removals:
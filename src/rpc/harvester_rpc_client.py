@@ -28,3 +28,9 @@ class HarvesterRpcClient(RpcClient):
 
     async def remove_plot_directory(self, dirname: str) -> bool:
         return (await self.fetch("remove_plot_directory", {"dirname": dirname}))["success"]
+
+    async def get_disk_latencies(self) -> List[Dict]:
+        return (await self.fetch("get_disk_latencies", {}))["disks"]
+
+    async def get_signage_point_timings(self) -> List[Dict]:
+        return (await self.fetch("get_signage_point_timings", {}))["signage_points"]
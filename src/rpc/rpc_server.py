@@ -124,6 +124,8 @@ class RpcServer:
                     "bytes_read": con.bytes_read,
                     "bytes_written": con.bytes_written,
                     "last_message_time": con.last_message_time,
+                    "inbound_queue_size": self.rpc_api.service.server.incoming_messages.queue_size(con.peer_node_id),
+                    "dropped_incoming_messages": con.dropped_incoming_messages,
                     "peak_height": peak_height,
                     "peak_weight": peak_weight,
                     "peak_hash": peak_hash,
@@ -143,10 +145,13 @@ class RpcServer:
                     "bytes_read": con.bytes_read,
                     "bytes_written": con.bytes_written,
                     "last_message_time": con.last_message_time,
+                    "inbound_queue_size": self.rpc_api.service.server.incoming_messages.queue_size(con.peer_node_id),
+                    "dropped_incoming_messages": con.dropped_incoming_messages,
                 }
                 for con in connections
             ]
-        return {"connections": con_info}
+        # Messages from all peers that are waiting or being handled
+        return {"connections": con_info, "inbound_queue": self.rpc_api.service.server.incoming_messages.get_metrics()}
 
     async def open_connection(self, request: Dict):
         host = request["host"]
@@ -0,0 +1,116 @@
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from src.protocols.protocol_message_types import ProtocolMessageTypes
+from src.server.outbound_message import Message
+from src.types.blockchain_format.sized_bytes import bytes32
+
+# Messages from one peer that can wait to be handled. Messages that arrive while the queue is full are dropped.
+DEFAULT_PEER_QUEUE_SIZE = 100
+# Messages that are handled at the same time, from all peers
+DEFAULT_MAX_CONCURRENT_TASKS = 100
+
+
+class ApiScheduler:
+    """
+    Holds the messages received from peers until they are handled, in a bounded queue per peer. get takes the
+    messages from the peers in turn, so a peer that sends many messages does not delay the messages of the others.
+    At most max_concurrent messages are handled at the same time, and for the message types in
+    max_concurrent_per_type, at most that many of the type. A message of a type that is at its limit waits, and
+    the messages of other peers are handled first.
+    """
+
+    def __init__(
+        self,
+        peer_queue_size: int = DEFAULT_PEER_QUEUE_SIZE,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_TASKS,
+        max_concurrent_per_type: Optional[Dict[str, int]] = None,
+    ):
+        self.peer_queue_size = peer_queue_size
+        self.max_concurrent = max_concurrent
+        self.max_concurrent_per_type: Dict[int, int] = {
+            ProtocolMessageTypes[name].value: limit for name, limit in (max_concurrent_per_type or {}).items()
+        }
+        self.queues: Dict[bytes32, Deque[Tuple[Message, Any]]] = {}
+        # Peers with queued messages, in the order in which they get their turn
+        self.ready: Deque[bytes32] = deque()
+        self.running = 0
+        self.running_per_type: Dict[int, int] = {}
+        self._changed = asyncio.Event()
+
+    def put_nowait(self, item: Tuple[Message, Any]) -> None:
+        """
+        Queues a message and the connection it came from. Raises asyncio.QueueFull if the queue of the peer is full,
+        the socket reader does not wait, so responses to our own requests to the peer are still read.
+        """
+        message, connection = item
+        peer_id = connection.peer_node_id
+        queue = self.queues.setdefault(peer_id, deque())
+        if len(queue) >= self.peer_queue_size:
+            raise asyncio.QueueFull()
+        if len(queue) == 0:
+            self.ready.append(peer_id)
+        queue.append(item)
+        self._changed.set()
+
+    def _next(self) -> Optional[Tuple[Message, Any]]:
+        if self.running >= self.max_concurrent:
+            return None
+        for _ in range(len(self.ready)):
+            peer_id = self.ready.popleft()
+            queue = self.queues[peer_id]
+            message, _ = queue[0]
+            limit = self.max_concurrent_per_type.get(message.type)
+            if limit is not None and self.running_per_type.get(message.type, 0) >= limit:
+                self.ready.append(peer_id)
+                continue
+            item = queue.popleft()
+            if len(queue) > 0:
+                self.ready.append(peer_id)
+            else:
+                del self.queues[peer_id]
+            self.running += 1
+            self.running_per_type[message.type] = self.running_per_type.get(message.type, 0) + 1
+            return item
+        return None
+
+    async def get(self) -> Tuple[Message, Any]:
+        """
+        Returns the next message to handle, and its connection. task_done must be called when it was handled.
+        """
+        while True:
+            item = self._next()
+            if item is not None:
+                return item
+            self._changed.clear()
+            await self._changed.wait()
+
+    def task_done(self, message: Message) -> None:
+        self.running -= 1
+        self.running_per_type[message.type] -= 1
+        self._changed.set()
+
+    def remove_peer(self, peer_id: bytes32) -> None:
+        """
+        Drops the queued messages of a peer that disconnected.
+        """
+        if peer_id in self.queues:
+            del self.queues[peer_id]
+            self.ready = deque(ready_peer_id for ready_peer_id in self.ready if ready_peer_id != peer_id)
+
+    def queue_size(self, peer_id: bytes32) -> int:
+        return len(self.queues.get(peer_id, ()))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "queued": sum(len(queue) for queue in self.queues.values()),
+            "peers_with_queued_messages": len(self.queues),
+            "max_queue_size": max((len(queue) for queue in self.queues.values()), default=0),
+            "running": self.running,
+            "running_per_type": {
+                ProtocolMessageTypes(message_type).name: running
+                for message_type, running in self.running_per_type.items()
+                if running > 0
+            },
+        }
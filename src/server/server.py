@@ -2,6 +2,7 @@ import asyncio
 import logging
 import ssl
 import time
+from functools import partial
 from ipaddress import ip_address, IPv6Address
 from pathlib import Path
 from secrets import token_bytes
@@ -15,12 +16,14 @@ from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes, serialization
 
 from src.protocols.protocol_message_types import ProtocolMessageTypes
+from src.server.api_scheduler import DEFAULT_MAX_CONCURRENT_TASKS, DEFAULT_PEER_QUEUE_SIZE, ApiScheduler
 from src.server.introducer_peers import IntroducerPeers
 from src.server.outbound_message import NodeType, Message
 from src.server.ssl_context import private_ssl_paths, public_ssl_paths
-from src.server.ws_connection import WSChiaConnection
+from src.server.ws_connection import DEFAULT_OUTBOUND_QUEUE_SIZE, WSChiaConnection, encode_message
 from src.types.peer_info import PeerInfo
 from src.types.blockchain_format.sized_bytes import bytes32
+from src.util.api_decorators import get_api_handlers
 from src.util.errors import ProtocolError, Err
 from src.util.ints import uint16
 from src.protocols.shared_protocol import protocol_version
@@ -84,6 +87,8 @@ class ChiaServer:
 
         self._ping_interval = ping_interval
         self._network_id = network_id
+        # Maximum number of messages waiting to be sent to each peer
+        self._outbound_queue_size: int = config.get("outbound_queue_size", DEFAULT_OUTBOUND_QUEUE_SIZE)
 
         # Taks list to keep references to tasks, so they don't get GCd
         self._tasks: List[asyncio.Task] = []
@@ -95,11 +100,17 @@ class ChiaServer:
 
         # Our unique random node id that we will send to other peers, regenerated on launch
         self.api = api
+        self.api_handlers = get_api_handlers(type(api))
         self.node = node
         self.root_path = root_path
         self.config = config
         self.on_connect: Optional[Callable] = None
-        self.incoming_messages: asyncio.Queue = asyncio.Queue()
+        # Messages received from peers wait here until they are handled
+        self.incoming_messages = ApiScheduler(
+            config.get("inbound_queue_size", DEFAULT_PEER_QUEUE_SIZE),
+            config.get("max_concurrent_api_tasks", DEFAULT_MAX_CONCURRENT_TASKS),
+            config.get("max_concurrent_api_tasks_per_type", {}),
+        )
         self.shut_down_event = asyncio.Event()
 
         if self._local_type is NodeType.INTRODUCER:
@@ -212,6 +223,7 @@ class ChiaServer:
                 self.connection_closed,
                 peer_id,
                 close_event,
+                outbound_queue_size=self._outbound_queue_size,
             )
             handshake = await connection.perform_handshake(
                 self._network_id,
@@ -341,6 +353,7 @@ class ChiaServer:
                     self.connection_closed,
                     peer_id,
                     session=session,
+                    outbound_queue_size=self._outbound_queue_size,
                 )
                 handshake = await connection.perform_handshake(
                     self._network_id,
@@ -400,6 +413,7 @@ class ChiaServer:
         if on_disconnect is not None:
             on_disconnect(connection)
 
+        self.incoming_messages.remove_peer(connection.peer_node_id)
         self.cancel_tasks_from_peer(connection.peer_node_id)
 
     def cancel_tasks_from_peer(self, peer_id: bytes32):
@@ -415,8 +429,6 @@ class ChiaServer:
         self.tasks = set()
         while True:
             payload_inc, connection_inc = await self.incoming_messages.get()
-            if payload_inc is None or connection_inc is None:
-                continue
 
             async def api_call(full_message: Message, connection: WSChiaConnection, task_id):
                 start_time = time.time()
@@ -429,20 +441,15 @@ class ChiaServer:
                     )
                     message_type: str = ProtocolMessageTypes(full_message.type).name
 
-                    f = getattr(self.api, message_type, None)
-
-                    if f is None:
-                        self.log.error(f"Non existing function: {message_type}")
-                        raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [message_type])
-
-                    if not hasattr(f, "api_function"):
-                        self.log.error(f"Peer trying to call non api function {message_type}")
+                    handler = self.api_handlers.get(full_message.type)
+                    if handler is None:
+                        self.log.error(f"Non existing api function: {message_type}")
                         raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [message_type])
 
-                    if hasattr(f, "peer_required"):
-                        coroutine = f(full_message.data, connection)
+                    if handler.peer_required:
+                        coroutine = handler.function(self.api, full_message.data, connection)
                     else:
-                        coroutine = f(full_message.data)
+                        coroutine = handler.function(self.api, full_message.data)
 
                     async def wrapped_coroutine():
                         try:
@@ -478,35 +485,57 @@ class ChiaServer:
 
             task_id = token_bytes()
             api_task = asyncio.create_task(api_call(payload_inc, connection_inc, task_id))
+            # Also called if the task is cancelled before it starts
+            api_task.add_done_callback(partial(self._api_task_done, payload_inc))
             self.api_tasks[task_id] = api_task
             if connection_inc.peer_node_id not in self.tasks_from_peer:
                 self.tasks_from_peer[connection_inc.peer_node_id] = set()
             self.tasks_from_peer[connection_inc.peer_node_id].add(task_id)
 
+    def broadcast(self, messages: List[Message], connections: List[WSChiaConnection]) -> None:
+        """
+        Sends messages to many connections. Each message is serialized once, and queued on every connection without
+        waiting, connections whose outgoing queue is full don't get the messages.
+        """
+        if len(connections) == 0:
+            return
+        encoded_messages = [encode_message(message) for message in messages]
+        for connection in connections:
+            connection.queue_broadcast(encoded_messages)
+
+    def _api_task_done(self, message: Message, task: asyncio.Task) -> None:
+        self.incoming_messages.task_done(message)
+
     async def send_to_others(
         self,
         messages: List[Message],
         node_type: NodeType,
         origin_peer: WSChiaConnection,
     ):
-        for node_id, connection in self.all_connections.items():
-            if node_id == origin_peer.peer_node_id:
-                continue
-            if connection.connection_type is node_type:
-                for message in messages:
-                    await connection.send_message(message)
+        self.broadcast(
+            messages,
+            [
+                connection
+                for node_id, connection in self.all_connections.items()
+                if node_id != origin_peer.peer_node_id and connection.connection_type is node_type
+            ],
+        )
 
     async def send_to_all(self, messages: List[Message], node_type: NodeType):
-        for _, connection in self.all_connections.items():
-            if connection.connection_type is node_type:
-                for message in messages:
-                    await connection.send_message(message)
+        self.broadcast(
+            messages,
+            [connection for connection in self.all_connections.values() if connection.connection_type is node_type],
+        )
 
     async def send_to_all_except(self, messages: List[Message], node_type: NodeType, exclude: bytes32):
-        for _, connection in self.all_connections.items():
-            if connection.connection_type is node_type and connection.peer_node_id != exclude:
-                for message in messages:
-                    await connection.send_message(message)
+        self.broadcast(
+            messages,
+            [
+                connection
+                for connection in self.all_connections.values()
+                if connection.connection_type is node_type and connection.peer_node_id != exclude
+            ],
+        )
 
     async def send_to_specific(self, messages: List[Message], node_id: bytes32):
         if node_id in self.all_connections:
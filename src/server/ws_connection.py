@@ -3,7 +3,7 @@ import time
 import asyncio
 import traceback
 
-from typing import Any, Callable, Optional, List, Dict
+from typing import Any, Callable, Optional, List, Dict, Tuple
 
 from aiohttp import WSMessage, WSMsgType
 
@@ -13,6 +13,7 @@ from src.protocols.shared_protocol import Handshake
 from src.server.outbound_message import Message, NodeType, make_msg
 from src.types.peer_info import PeerInfo
 from src.types.blockchain_format.sized_bytes import bytes32
+from src.util.api_decorators import get_api_handlers
 from src.util.ints import uint16, uint8
 from src.util.errors import Err, ProtocolError
 
@@ -22,6 +23,19 @@ from src.util.network import class_for_type
 # Max size 2^(8*4) which is around 4GiB
 LENGTH_BYTES: int = 4
 
+# Messages waiting to be sent to a peer. When the queue is full, senders wait, and broadcasts skip the peer.
+DEFAULT_OUTBOUND_QUEUE_SIZE = 1000
+
+# A message in the outgoing queue: its type and its serialization. A broadcast message is serialized once, and the
+# same bytes are queued for every peer.
+EncodedMessage = Tuple[int, bytes]
+
+
+def encode_message(message: Message) -> EncodedMessage:
+    encoded = bytes(message)
+    assert len(encoded) < (2 ** (LENGTH_BYTES * 8))
+    return message.type, encoded
+
 
 class WSChiaConnection:
     """
@@ -44,6 +58,7 @@ class WSChiaConnection:
         peer_id,
         close_event=None,
         session=None,
+        outbound_queue_size: int = DEFAULT_OUTBOUND_QUEUE_SIZE,
     ):
         # Local properties
         self.ws: Any = ws
@@ -74,8 +89,12 @@ class WSChiaConnection:
         self.last_message_time: float = 0
 
         # Messaging
-        self.incoming_queue: asyncio.Queue = incoming_queue
-        self.outgoing_queue: asyncio.Queue = asyncio.Queue()
+        self.incoming_queue = incoming_queue
+        self.outgoing_queue: asyncio.Queue = asyncio.Queue(maxsize=outbound_queue_size)
+        # Broadcast messages that were not sent because the outgoing queue was full
+        self.dropped_messages = 0
+        # Messages from the peer that were not handled because its incoming queue was full
+        self.dropped_incoming_messages = 0
 
         self.inbound_task: Optional[asyncio.Task] = None
         self.outbound_task: Optional[asyncio.Task] = None
@@ -190,9 +209,9 @@ class WSChiaConnection:
     async def outbound_handler(self):
         try:
             while not self.closed:
-                msg = await self.outgoing_queue.get()
-                if msg is not None:
-                    await self._send_message(msg)
+                encoded_message: Optional[EncodedMessage] = await self.outgoing_queue.get()
+                if encoded_message is not None:
+                    await self._send_encoded_message(encoded_message)
         except asyncio.CancelledError:
             pass
         except Exception as e:
@@ -210,7 +229,7 @@ class WSChiaConnection:
                         event = self.pending_requests[message.id]
                         event.set()
                     else:
-                        await self.incoming_queue.put((message, self))
+                        self._queue_incoming_message(message)
                 else:
                     continue
         except asyncio.CancelledError:
@@ -220,23 +239,66 @@ class WSChiaConnection:
             self.log.error(f"Exception: {e}")
             self.log.error(f"Exception Stack: {error_stack}")
 
+    def _queue_incoming_message(self, message: Message) -> None:
+        """
+        Queues a message from the peer to be handled, without waiting. If the peer has too many messages waiting, the
+        message is dropped, so the reader keeps reading the responses to our requests.
+        """
+        try:
+            self.incoming_queue.put_nowait((message, self))
+        except asyncio.QueueFull:
+            self.dropped_incoming_messages += 1
+            self.log.warning(
+                f"Incoming queue from {self.peer_host} is full, dropped a message of type {message.type}. "
+                f"Dropped {self.dropped_incoming_messages} messages from this peer in total"
+            )
+
     async def send_message(self, message: Message):
         """ Send message sends a message with no tracking / callback. """
         if self.closed:
             return
-        await self.outgoing_queue.put(message)
+        await self.outgoing_queue.put(encode_message(message))
+
+    def queue_broadcast(self, encoded_messages: List[EncodedMessage]) -> bool:
+        """
+        Queues messages that are sent to many peers, without waiting. If the outgoing queue of this peer is full,
+        the remaining messages are dropped for this peer, so a slow peer does not hold up the broadcast. Returns
+        whether all messages were queued.
+        """
+        if self.closed:
+            return False
+        for i, encoded_message in enumerate(encoded_messages):
+            try:
+                self.outgoing_queue.put_nowait(encoded_message)
+            except asyncio.QueueFull:
+                self.dropped_messages += len(encoded_messages) - i
+                self.log.warning(
+                    f"Outgoing queue to {self.peer_host} is full, dropped {len(encoded_messages) - i} broadcast "
+                    f"messages. Dropped {self.dropped_messages} messages to this peer in total"
+                )
+                return False
+        return True
 
     def __getattr__(self, attr_name: str):
+        invoke = self._make_request_function(attr_name)
+        if attr_name in ProtocolMessageTypes.__members__:
+            # Created once per message type, later lookups find it in the instance dict
+            self.__dict__[attr_name] = invoke
+        return invoke
+
+    def _make_request_function(self, attr_name: str) -> Callable:
         # TODO KWARGS
         async def invoke(*args, **kwargs):
             timeout = 60
             if "timeout" in kwargs:
                 timeout = kwargs["timeout"]
-            attribute = getattr(class_for_type(self.connection_type), attr_name, None)
-            if attribute is None:
+            message_type = ProtocolMessageTypes.__members__.get(attr_name)
+            if message_type is None or message_type.value not in get_api_handlers(
+                class_for_type(self.connection_type)
+            ):
                 raise AttributeError(f"Node type {self.connection_type} does not have method {attr_name}")
 
-            msg = Message(uint8(getattr(ProtocolMessageTypes, attr_name).value), args[0], None)
+            msg = Message(uint8(message_type.value), args[0], None)
             request_start_t = time.time()
             result = await self.create_request(msg, timeout)
             self.log.debug(
@@ -244,17 +306,10 @@ class WSChiaConnection:
                 f"None? {result is None}"
             )
             if result is not None:
-                ret_attr = getattr(class_for_type(self.local_type), ProtocolMessageTypes(result.type).name, None)
-
-                req_annotations = ret_attr.__annotations__
-                req = None
-                for key in req_annotations:
-                    if key == "return" or key == "peer":
-                        continue
-                    else:
-                        req = req_annotations[key]
-                assert req is not None
-                result = req.from_bytes(result.data)
+                # The response is parsed as the argument of our API function for its message type
+                response_handler = get_api_handlers(class_for_type(self.local_type)).get(result.type)
+                assert response_handler is not None and response_handler.request_class is not None
+                result = response_handler.request_class.from_bytes(result.data)
             return result
 
         return invoke
@@ -274,7 +329,7 @@ class WSChiaConnection:
         message = Message(message_no_id.type, message_no_id.data, request_id)
 
         self.pending_requests[message.id] = event
-        await self.outgoing_queue.put(message)
+        await self.outgoing_queue.put(encode_message(message))
 
         # If the timeout passes, we set the event
         async def time_out(req_id, req_timeout):
@@ -300,21 +355,23 @@ class WSChiaConnection:
     async def reply_to_request(self, response: Message):
         if self.closed:
             return
-        await self.outgoing_queue.put(response)
+        await self.outgoing_queue.put(encode_message(response))
 
     async def send_messages(self, messages: List[Message]):
         if self.closed:
             return
         for message in messages:
-            await self.outgoing_queue.put(message)
+            await self.outgoing_queue.put(encode_message(message))
 
     async def _send_message(self, message: Message):
-        encoded: bytes = bytes(message)
-        size = len(encoded)
-        assert len(encoded) < (2 ** (LENGTH_BYTES * 8))
+        await self._send_encoded_message(encode_message(message))
+
+    async def _send_encoded_message(self, encoded_message: EncodedMessage):
+        message_type, encoded = encoded_message
         await self.ws.send_bytes(encoded)
-        self.log.info(f"-> {ProtocolMessageTypes(message.type).name} to peer {self.peer_host} {self.peer_node_id}")
-        self.bytes_written += size
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(f"-> {ProtocolMessageTypes(message_type).name} to peer {self.peer_host} {self.peer_node_id}")
+        self.bytes_written += len(encoded)
 
     async def _read_one_message(self) -> Optional[Message]:
         try:
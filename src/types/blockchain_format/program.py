@@ -1,8 +1,9 @@
+import hashlib
 import io
-from typing import List, Optional, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 from src.types.blockchain_format.sized_bytes import bytes32
-from src.util.hash import std_hash
+from src.util.byte_types import BytesReader, MemoryViewStream
 
 from clvm import run_program as default_run_program, KEYWORD_FROM_ATOM, KEYWORD_TO_ATOM, SExp
 from clvm.casts import int_from_bytes
@@ -14,6 +15,15 @@ from clvm_tools.curry import curry, uncurry
 
 from clvm_rs import deserialize_and_run_program, STRICT_MODE
 
+# TODO: move this ugly magic into `clvm` "dialects"
+NATIVE_OPCODE_NAMES_BY_OPCODE = dict(
+    ("op_%s" % OP_REWRITE.get(k, k), op) for op, k in KEYWORD_FROM_ATOM.items() if k not in "qa."
+)
+
+# Tree hashes of programs that are part of many other programs, such as puzzle modules that are curried, by the id
+# of their pair. The pair is kept, so that its id is not reused.
+_shared_tree_hashes: Dict[int, Tuple[Tuple, bytes32]] = {}
+
 
 def run_program(
     program,
@@ -38,6 +48,9 @@ class Program(SExp):
 
     @classmethod
     def parse(cls, f):
+        if isinstance(f, MemoryViewStream):
+            # Atoms must be bytes, not views into the buffer
+            f = BytesReader(f)
         return sexp_from_stream(f, cls.to)
 
     def stream(self, f):
@@ -56,27 +69,25 @@ class Program(SExp):
     def __str__(self) -> str:
         return bytes(self).hex()
 
+    # The tree hash without precalculated values, set the first time it is computed. Programs are immutable.
+    _cached_tree_hash: Optional[bytes32] = None
+
     def _tree_hash(self, precalculated: Set[bytes32]) -> bytes32:
         """
         Hash values in `precalculated` are presumed to have been hashed already.
         """
-        if self.listp():
-            left = self.to(self.first())._tree_hash(precalculated)
-            right = self.to(self.rest())._tree_hash(precalculated)
-            s = b"\2" + left + right
-        else:
-            atom = self.as_atom()
-            if atom in precalculated:
-                return bytes32(atom)
-            s = b"\1" + atom
-        return bytes32(std_hash(s))
+        return _tree_hash(self, precalculated)
 
     def get_tree_hash(self, *args: List[bytes32]) -> bytes32:
         """
         Any values in `args` that appear in the tree
         are presumed to have been hashed already.
         """
-        return self._tree_hash(set(args))
+        if len(args) > 0:
+            return _tree_hash(self, set(args))
+        if self._cached_tree_hash is None:
+            self._cached_tree_hash = _tree_hash(self, set())
+        return self._cached_tree_hash
 
     def run_with_cost(self, args) -> Tuple[int, "Program"]:
         prog_args = Program.to(args)
@@ -102,20 +113,143 @@ class Program(SExp):
     EvalError = EvalError
 
 
+def register_shared_tree(program: Program) -> None:
+    """
+    Remembers the tree hash of a program that many other programs contain, such as a puzzle module, so that hashing
+    those programs does not hash it again. Curried puzzles contain the pair of their module.
+    """
+    if program.pair is not None:
+        _shared_tree_hashes[id(program.pair)] = (program.pair, program.get_tree_hash())
+
+
 def _tree_hash(node: SExp, precalculated: Set[bytes32]) -> bytes32:
     """
     Hash values in `precalculated` are presumed to have been hashed already.
+    The tree is walked with a stack instead of recursion, and the hashes of shared trees (see register_shared_tree)
+    are reused.
     """
-    if node.listp():
-        left = _tree_hash(node.first(), precalculated)
-        right = _tree_hash(node.rest(), precalculated)
-        s = b"\2" + left + right
-    else:
-        atom = node.as_atom()
-        if atom in precalculated:
-            return bytes32(atom)
-        s = b"\1" + atom
-    return bytes32(std_hash(s))
+    sha256 = hashlib.sha256
+    shared_tree_hashes = _shared_tree_hashes if len(precalculated) == 0 else {}
+    atom_hashes: Dict[bytes, bytes] = {}
+    hashes: List[bytes] = []
+    # None means: hash the pair of the last two hashes
+    stack: List[Optional[SExp]] = [node]
+    while len(stack) > 0:
+        item = stack.pop()
+        if item is None:
+            right = hashes.pop()
+            left = hashes.pop()
+            hashes.append(sha256(b"\2" + left + right).digest())
+            continue
+        pair = item.pair
+        if pair is not None:
+            shared = shared_tree_hashes.get(id(pair))
+            if shared is not None and shared[0] is pair:
+                hashes.append(shared[1])
+                continue
+            stack.append(None)
+            stack.append(pair[1])
+            stack.append(pair[0])
+            continue
+        atom = item.atom
+        atom_hash = atom_hashes.get(atom)
+        if atom_hash is None:
+            if atom in precalculated:
+                atom_hash = atom
+            else:
+                atom_hash = sha256(b"\1" + atom).digest()
+            atom_hashes[atom] = atom_hash
+        hashes.append(atom_hash)
+    return bytes32(hashes[0])
+
+
+def _tree_hash_from_bytes(buf: bytes, precalculated: Set[bytes32]) -> bytes32:
+    """
+    The same as _tree_hash, for a serialized program, without deserializing it.
+    """
+    sha256 = hashlib.sha256
+    atom_hashes: Dict[bytes, bytes] = {}
+    hashes: List[bytes] = []
+    # True means: read an s-expression, False: hash the pair of the last two hashes
+    stack: List[bool] = [True]
+    offset = 0
+    while len(stack) > 0:
+        if not stack.pop():
+            right = hashes.pop()
+            left = hashes.pop()
+            hashes.append(sha256(b"\2" + left + right).digest())
+            continue
+        if offset >= len(buf):
+            raise ValueError("bad encoding")
+        b = buf[offset]
+        offset += 1
+        if b == 0xFF:
+            stack.extend((False, True, True))
+            continue
+        if b == 0x80:
+            atom = b""
+        elif b < 0x80:
+            atom = bytes([b])
+        else:
+            size, offset = _atom_size(buf, offset, b)
+            if offset + size > len(buf):
+                raise ValueError("bad encoding")
+            atom = buf[offset : offset + size]
+            offset += size
+        atom_hash = atom_hashes.get(atom)
+        if atom_hash is None:
+            if atom in precalculated:
+                atom_hash = atom
+            else:
+                atom_hash = sha256(b"\1" + atom).digest()
+            atom_hashes[atom] = atom_hash
+        hashes.append(atom_hash)
+    return bytes32(hashes[0])
+
+
+def _atom_size(buf, offset: int, b: int) -> Tuple[int, int]:
+    """
+    Decodes the size of an atom whose first byte is b, and whose size continues at offset. Returns the size, and the
+    offset of the atom's data.
+    """
+    bit_count = 0
+    bit_mask = 0x80
+    while b & bit_mask:
+        bit_count += 1
+        b &= 0xFF ^ bit_mask
+        bit_mask >>= 1
+    size_blob = bytes([b]) + bytes(buf[offset : offset + bit_count - 1])
+    if len(size_blob) != bit_count:
+        raise ValueError("bad encoding")
+    offset += bit_count - 1
+    size = int.from_bytes(size_blob, "big")
+    if size >= 0x400000000:
+        raise ValueError("blob too large")
+    return size, offset
+
+
+def _serialized_length(buf: memoryview, offset: int) -> int:
+    """
+    Returns the length of the serialized s-expression that starts at offset, reading only the atom headers.
+    """
+    start = offset
+    depth = 1
+    while depth > 0:
+        depth -= 1
+        if offset >= len(buf):
+            raise ValueError("bad encoding")
+        b = buf[offset]
+        offset += 1
+        if b == 0xFF:
+            depth += 2
+            continue
+        if b <= 0x80:
+            continue
+        size, offset = _atom_size(buf, offset, b)
+        offset += size
+    if offset > len(buf):
+        raise ValueError("bad encoding")
+    return offset - start
 
 
 def _serialize(node) -> bytes:
@@ -131,9 +265,15 @@ class SerializedProgram:
     """
 
     _buf: bytes = b""
+    # The tree hash without precalculated values, set the first time it is computed
+    _cached_tree_hash: Optional[bytes32] = None
 
     @classmethod
     def parse(cls, f) -> "SerializedProgram":
+        if isinstance(f, MemoryViewStream):
+            # Find the end of the program, and copy it out of the buffer once
+            length = _serialized_length(f.view, f.offset)
+            return SerializedProgram.from_bytes(f.read(length))
         tmp = sexp_buffer_from_stream(f)
         return SerializedProgram.from_bytes(tmp)
 
@@ -170,8 +310,11 @@ class SerializedProgram:
         Any values in `args` that appear in the tree
         are presumed to have been hashed already.
         """
-        tmp = sexp_from_stream(io.BytesIO(self._buf), SExp.to)
-        return _tree_hash(tmp, set(args))
+        if len(args) > 0:
+            return _tree_hash_from_bytes(self._buf, set(args))
+        if self._cached_tree_hash is None:
+            self._cached_tree_hash = _tree_hash_from_bytes(self._buf, set())
+        return self._cached_tree_hash
 
     def run_safe_with_cost(self, *args) -> Tuple[int, SExp]:
         return self._run(STRICT_MODE, *args)
@@ -195,16 +338,12 @@ class SerializedProgram:
             serialized_args += _serialize(args[0])
 
         max_cost = 0
-        # TODO: move this ugly magic into `clvm` "dialects"
-        native_opcode_names_by_opcode = dict(
-            ("op_%s" % OP_REWRITE.get(k, k), op) for op, k in KEYWORD_FROM_ATOM.items() if k not in "qa."
-        )
         cost, ret = deserialize_and_run_program(
             self._buf,
             serialized_args,
             KEYWORD_TO_ATOM["q"][0],
             KEYWORD_TO_ATOM["a"][0],
-            native_opcode_names_by_opcode,
+            NATIVE_OPCODE_NAMES_BY_OPCODE,
             max_cost,
             flags,
         )
@@ -129,14 +129,18 @@ class FullBlock(Streamable):
             # build removals list
             if npc_list is None:
                 return [], []
-            for npc in npc_list:
-                removals.append(npc.coin_name)
-
-            additions.extend(additions_for_npc(npc_list))
+            removals, additions = tx_removals_and_additions_for_npc(npc_list)
 
         return removals, additions
 
 
+def tx_removals_and_additions_for_npc(npc_list: List[NPC]) -> Tuple[List[bytes32], List[Coin]]:
+    """
+    The same as FullBlock.tx_removals_and_additions, for the NPC list of the block's generator.
+    """
+    return [npc.coin_name for npc in npc_list], additions_for_npc(npc_list)
+
+
 def additions_for_npc(npc_list: List[NPC]) -> List[Coin]:
     additions: List[Coin] = []
 
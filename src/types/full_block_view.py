@@ -0,0 +1,144 @@
+import dataclasses
+from typing import Any, Dict, List, Optional
+
+from src.types.blockchain_format.foliage import TransactionsInfo
+from src.types.blockchain_format.program import SerializedProgram
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.types.full_block import FullBlock
+from src.util.byte_types import MemoryViewStream
+from src.util.hash import std_hash
+from src.util.streamable import parse_functions_for_class
+
+# Fields of FullBlock up to and including foliage_transaction_block, which are everything the header needs
+# except for the transactions info and the filter. The last two fields are only parsed when they are accessed.
+HEADER_FIELD_NAMES: List[str] = [
+    "finished_sub_slots",
+    "reward_chain_block",
+    "challenge_chain_sp_proof",
+    "challenge_chain_ip_proof",
+    "reward_chain_sp_proof",
+    "reward_chain_ip_proof",
+    "infused_challenge_chain_ip_proof",
+    "foliage",
+    "foliage_transaction_block",
+]
+HEADER_FIELD_INDEX: Dict[str, int] = {name: i for i, name in enumerate(HEADER_FIELD_NAMES)}
+assert [field.name for field in dataclasses.fields(FullBlock)][: len(HEADER_FIELD_NAMES)] == HEADER_FIELD_NAMES
+
+
+class FullBlockView:
+    """
+    Read only view of a serialized FullBlock. The header fields are parsed the first time one of them is used,
+    while the transactions info and the transactions generator stay as slices of the serialized block until they
+    are accessed. bytes() returns the original serialization, so a view can be sent or stored without
+    re-serializing it. Use to_full_block to get a regular FullBlock.
+    """
+
+    def __init__(self, blob: bytes, header_hash: Optional[bytes32] = None):
+        self._blob = bytes(blob)
+        self._header_hash = header_hash
+        self._header_fields: Optional[List[Any]] = None
+        self._transactions_info_offset = 0
+        self._transactions_generator_offset: Optional[int] = None
+        self._transactions_info: Optional[TransactionsInfo] = None
+        self._transactions_generator: Optional[SerializedProgram] = None
+        self._transactions_generator_parsed = False
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "FullBlockView":
+        return cls(blob)
+
+    def _parse_header_fields(self) -> List[Any]:
+        if self._header_fields is None:
+            f = MemoryViewStream(self._blob)
+            parse_functions = parse_functions_for_class(FullBlock)
+            self._header_fields = [parse_function(f) for parse_function in parse_functions[: len(HEADER_FIELD_NAMES)]]
+            self._transactions_info_offset = f.tell()
+        return self._header_fields
+
+    def __getattr__(self, name: str) -> Any:
+        index = HEADER_FIELD_INDEX.get(name)
+        if index is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        return self._parse_header_fields()[index]
+
+    def _parse_transactions_info(self) -> int:
+        """
+        Returns the offset of the transactions generator, which is only known once the transactions info is parsed.
+        """
+        if self._transactions_generator_offset is None:
+            self._parse_header_fields()
+            f = MemoryViewStream(self._blob)
+            f.offset = self._transactions_info_offset
+            self._transactions_info = parse_functions_for_class(FullBlock)[len(HEADER_FIELD_NAMES)](f)
+            self._transactions_generator_offset = f.tell()
+        return self._transactions_generator_offset
+
+    @property
+    def transactions_info(self) -> Optional[TransactionsInfo]:
+        self._parse_transactions_info()
+        return self._transactions_info
+
+    @property
+    def transactions_generator(self) -> Optional[SerializedProgram]:
+        if not self._transactions_generator_parsed:
+            f = MemoryViewStream(self._blob)
+            f.offset = self._parse_transactions_info()
+            self._transactions_generator = parse_functions_for_class(FullBlock)[len(HEADER_FIELD_NAMES) + 1](f)
+            assert f.tell() == len(self._blob)
+            self._transactions_generator_parsed = True
+        return self._transactions_generator
+
+    @property
+    def header_hash(self) -> bytes32:
+        if self._header_hash is None:
+            self._header_hash = self.foliage.get_hash()
+        return self._header_hash
+
+    prev_header_hash = FullBlock.prev_header_hash
+    height = FullBlock.height
+    weight = FullBlock.weight
+    total_iters = FullBlock.total_iters
+    is_transaction_block = FullBlock.is_transaction_block
+    get_block_header = FullBlock.get_block_header
+    get_included_reward_coins = FullBlock.get_included_reward_coins
+    additions = FullBlock.additions
+    tx_removals_and_additions = FullBlock.tx_removals_and_additions
+
+    def to_full_block(self) -> FullBlock:
+        return FullBlock(
+            *self._parse_header_fields(),
+            self.transactions_info,
+            self.transactions_generator,
+        )
+
+    def bytes_without_transactions_generator(self) -> bytes:
+        """
+        Returns the serialization of the block with the transactions generator left out, without parsing the
+        generator.
+        """
+        return self._blob[: self._parse_transactions_info()] + bytes([0])
+
+    def get_hash(self) -> bytes32:
+        return bytes32(std_hash(self._blob))
+
+    def to_json_dict(self) -> Dict:
+        return self.to_full_block().to_json_dict()
+
+    def __bytes__(self) -> bytes:
+        return self._blob
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (FullBlockView, FullBlock)):
+            return bytes(self) == bytes(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._blob)
+
+    def __str__(self) -> str:
+        return str(self.to_full_block())
+
+    def __repr__(self) -> str:
+        return repr(self.to_full_block())
+
@@ -1,14 +1,29 @@
 import functools
 import logging
+from dataclasses import dataclass
 from inspect import signature
+from typing import Any, Callable, Dict, Optional, Type
+
+from src.protocols.protocol_message_types import ProtocolMessageTypes
 
 log = logging.getLogger(__name__)
 
 
 def api_request(f):
+    # The signature is inspected once, when the API class is defined, and not for every message
+    sig = signature(f)
+    param_classes = [f.__annotations__.get(name) for name in sig.parameters]
+
     @functools.wraps(f)
     def f_substitute(*args, **kwargs):
-        sig = signature(f)
+        if len(kwargs) == 0 and len(args) == len(param_classes):
+            # All arguments are positional, which is how the server calls API functions
+            inter_args = [
+                param_class.from_bytes(arg) if param_class is not None and isinstance(arg, bytes) else arg
+                for arg, param_class in zip(args, param_classes)
+            ]
+            return f(*inter_args)
+
         binding = sig.bind(*args, **kwargs)
         binding.apply_defaults()
         inter = dict(binding.arguments)
@@ -32,3 +47,37 @@ def peer_required(func):
         return func
 
     return inner()
+
+
+@dataclass(frozen=True)
+class ApiHandler:
+    # The api_request function, called with the API object, the message data, and the connection if peer_required
+    function: Callable
+    # The Streamable class of the message data
+    request_class: Optional[Type[Any]]
+    peer_required: bool
+
+
+_api_handlers: Dict[type, Dict[int, ApiHandler]] = {}
+
+
+def get_api_handlers(api_class: type) -> Dict[int, ApiHandler]:
+    """
+    Returns the API functions of api_class by message type (ProtocolMessageTypes value). The table is built once per
+    class, so messages are dispatched without looking up and inspecting the functions each time.
+    """
+    handlers = _api_handlers.get(api_class)
+    if handlers is not None:
+        return handlers
+    handlers = {}
+    for message_type in ProtocolMessageTypes:
+        function = getattr(api_class, message_type.name, None)
+        if function is None or not hasattr(function, "api_function"):
+            continue
+        request_class = None
+        for key, annotation in function.__annotations__.items():
+            if key != "return" and key != "peer":
+                request_class = annotation
+        handlers[message_type.value] = ApiHandler(function, request_class, hasattr(function, "peer_required"))
+    _api_handlers[api_class] = handlers
+    return handlers
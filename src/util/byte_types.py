@@ -11,6 +11,41 @@ def hexstr_to_bytes(input_str: str) -> bytes:
     return bytes.fromhex(input_str)
 
 
+class MemoryViewStream:
+    """
+    A read only stream over a buffer, which does not copy what it reads: read returns memoryview slices
+    of the buffer, and the position is tracked as an offset. Parsers convert the slices into their final
+    objects, so each field is copied at most once, straight out of the original buffer.
+    """
+
+    def __init__(self, blob: Any):
+        self.view = memoryview(blob)
+        self.offset = 0
+
+    def read(self, size: int = -1) -> memoryview:
+        start = self.offset
+        if size < 0:
+            self.offset = len(self.view)
+        else:
+            self.offset = min(start + size, len(self.view))
+        return self.view[start : self.offset]
+
+    def tell(self) -> int:
+        return self.offset
+
+
+class BytesReader:
+    """
+    Wraps a MemoryViewStream for parsers that need read to return bytes.
+    """
+
+    def __init__(self, f: MemoryViewStream):
+        self.f = f
+
+    def read(self, size: int = -1) -> bytes:
+        return bytes(self.f.read(size))
+
+
 def make_sized_bytes(size):
     """
     Create a streamable type that subclasses "bytes" but requires instances
@@ -19,8 +54,10 @@ def make_sized_bytes(size):
     name = "bytes%d" % size
 
     def __new__(cls, v):
-        v = bytes(v)
-        if not isinstance(v, bytes) or len(v) != size:
+        # A memoryview is copied only once, by bytes.__new__
+        if not isinstance(v, memoryview):
+            v = bytes(v)
+        if len(v) != size:
             raise ValueError("bad %s initializer %s" % (name, v))
         return bytes.__new__(cls, v)  # type: ignore
 
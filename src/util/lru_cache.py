@@ -1,21 +1,44 @@
 from collections import OrderedDict
-from typing import Any, Optional
+from typing import Any, Optional, Tuple
 
 
 class LRUCache:
     def __init__(self, capacity: int):
         self.cache: OrderedDict = OrderedDict()
         self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.cache
 
     def get(self, key: Any) -> Optional[Any]:
         if key not in self.cache:
+            self.misses += 1
             return None
         else:
+            self.hits += 1
             self.cache.move_to_end(key)
             return self.cache[key]
 
-    def put(self, key: Any, value: Any) -> None:
+    def peek(self, key: Any) -> Optional[Any]:
+        """
+        Returns the value without marking it as recently used, or counting a hit or miss.
+        """
+        return self.cache.get(key)
+
+    def put(self, key: Any, value: Any) -> Optional[Tuple[Any, Any]]:
+        """
+        Inserts the value, and returns the (key, value) pair that was evicted to make space for it, if any.
+        """
         self.cache[key] = value
         self.cache.move_to_end(key)
         if len(self.cache) > self.capacity:
-            self.cache.popitem(last=False)
+            return self.cache.popitem(last=False)
+        return None
+
+    def remove(self, key: Any) -> None:
+        self.cache.pop(key, None)
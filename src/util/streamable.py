@@ -5,9 +5,10 @@ import sys
 import dataclasses
 import io
 import pprint
+import struct
 from enum import Enum
-from typing import Any, BinaryIO, List, Type, get_type_hints, Dict, Tuple
-from src.util.byte_types import hexstr_to_bytes
+from typing import Any, BinaryIO, Callable, List, Type, get_type_hints, Dict, Tuple
+from src.util.byte_types import hexstr_to_bytes, MemoryViewStream
 from src.types.blockchain_format.program import Program, SerializedProgram
 from src.util.hash import std_hash
 
@@ -15,6 +16,7 @@ from blspy import PrivateKey, G1Element, G2Element
 
 from src.types.blockchain_format.sized_bytes import bytes32
 from src.util.ints import uint32, uint64, int64, uint128, int512
+from src.util.struct_stream import StructStream
 from src.util.type_checking import (
     is_type_List,
     is_type_Tuple,
@@ -120,6 +122,176 @@ def recurse_jsonify(d):
     return d
 
 
+# Specialised parse and stream functions, built the first time each streamable class is used
+PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS: Dict[Type, List[Callable[[BinaryIO], Any]]] = {}
+STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS: Dict[Type, List[Tuple[str, Callable[[Any, BinaryIO], None]]]] = {}
+
+
+def read_exactly(f: BinaryIO, size: int) -> bytes:
+    read_bytes = f.read(size)
+    assert read_bytes is not None and len(read_bytes) == size  # Checks for EOF
+    return read_bytes
+
+
+def parse_uint32_prefix(f: BinaryIO) -> uint32:
+    return uint32(int.from_bytes(read_exactly(f, 4), "big"))
+
+
+def parse_list(f: BinaryIO, parse_inner_type: Callable[[BinaryIO], Any]) -> List[Any]:
+    full_list: List[Any] = []
+    for list_index in range(parse_uint32_prefix(f)):
+        full_list.append(parse_inner_type(f))
+    return full_list
+
+
+def parse_optional(f: BinaryIO, parse_inner_type: Callable[[BinaryIO], Any]) -> Any:
+    is_present_bytes = read_exactly(f, 1)
+    if is_present_bytes == bytes([0]):
+        return None
+    elif is_present_bytes == bytes([1]):
+        return parse_inner_type(f)
+    else:
+        raise ValueError("Optional must be 0 or 1")
+
+
+def parse_tuple(f: BinaryIO, parse_inner_types: List[Callable[[BinaryIO], Any]]) -> Tuple[Any, ...]:
+    return tuple(parse_inner_type(f) for parse_inner_type in parse_inner_types)
+
+
+def parse_bool(f: BinaryIO) -> bool:
+    bool_byte = read_exactly(f, 1)
+    if bool_byte == bytes([0]):
+        return False
+    elif bool_byte == bytes([1]):
+        return True
+    else:
+        raise ValueError("Bool byte must be 0 or 1")
+
+
+def parse_bytes(f: BinaryIO) -> bytes:
+    return bytes(read_exactly(f, parse_uint32_prefix(f)))
+
+
+def parse_str(f: BinaryIO) -> str:
+    return str(read_exactly(f, parse_uint32_prefix(f)), "utf-8")
+
+
+def function_to_parse_one_item(f_type: Type) -> Callable[[BinaryIO], Any]:
+    """
+    Returns a function that parses one item of type f_type, doing the type dispatch of
+    Streamable.parse_one_item only once.
+    """
+    inner_type: Type
+    if is_type_List(f_type):
+        inner_type = get_args(f_type)[0]
+        parse_inner_type = function_to_parse_one_item(inner_type)
+        return lambda f: parse_list(f, parse_inner_type)
+    if is_type_SpecificOptional(f_type):
+        inner_type = get_args(f_type)[0]
+        parse_inner_type = function_to_parse_one_item(inner_type)
+        return lambda f: parse_optional(f, parse_inner_type)
+    if is_type_Tuple(f_type):
+        parse_inner_types = [function_to_parse_one_item(inner_type) for inner_type in get_args(f_type)]
+        return lambda f: parse_tuple(f, parse_inner_types)
+    if f_type is bool:
+        return parse_bool
+    if f_type == bytes:
+        return parse_bytes
+    if isinstance(f_type, type) and issubclass(f_type, StructStream):
+        struct_format = struct.Struct(f_type.PACK)
+        return lambda f: f_type(*struct_format.unpack(read_exactly(f, struct_format.size)))
+    if hasattr(f_type, "parse"):
+        return f_type.parse
+    if hasattr(f_type, "from_bytes") and size_hints[f_type.__name__]:
+        bytes_to_read = size_hints[f_type.__name__]
+        return lambda f: f_type.from_bytes(bytes(read_exactly(f, bytes_to_read)))
+    if f_type is str:
+        return parse_str
+    else:
+        raise RuntimeError(f"Type {f_type} does not have parse")
+
+
+def parse_functions_for_class(cls: Type) -> List[Callable[[BinaryIO], Any]]:
+    """
+    Returns the parse function of each field of a streamable class, in field order.
+    """
+    parse_functions = PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS.get(cls)
+    if parse_functions is None:
+        parse_functions = [function_to_parse_one_item(f_type) for f_type in get_type_hints(cls).values()]
+        PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[cls] = parse_functions
+    return parse_functions
+
+
+def stream_list(item: List[Any], f: BinaryIO, stream_inner_type: Callable[[Any, BinaryIO], None]) -> None:
+    assert is_type_List(type(item))
+    f.write(uint32(len(item)).to_bytes(4, "big"))
+    for element in item:
+        stream_inner_type(element, f)
+
+
+def stream_optional(item: Any, f: BinaryIO, stream_inner_type: Callable[[Any, BinaryIO], None]) -> None:
+    if item is None:
+        f.write(bytes([0]))
+    else:
+        f.write(bytes([1]))
+        stream_inner_type(item, f)
+
+
+def stream_tuple(item: Tuple[Any, ...], f: BinaryIO, stream_inner_types: List[Callable[[Any, BinaryIO], None]]):
+    assert len(item) == len(stream_inner_types)
+    for i in range(len(item)):
+        stream_inner_types[i](item[i], f)
+
+
+def stream_bytes(item: bytes, f: BinaryIO) -> None:
+    f.write(uint32(len(item)).to_bytes(4, "big"))
+    f.write(item)
+
+
+def stream_str(item: str, f: BinaryIO) -> None:
+    str_bytes = item.encode("utf-8")
+    f.write(uint32(len(str_bytes)).to_bytes(4, "big"))
+    f.write(str_bytes)
+
+
+def stream_bool(item: bool, f: BinaryIO) -> None:
+    f.write(int(item).to_bytes(1, "big"))
+
+
+def function_to_stream_one_item(f_type: Type) -> Callable[[Any, BinaryIO], None]:
+    """
+    Returns a function that streams one item of type f_type, doing the type dispatch of
+    Streamable.stream_one_item only once.
+    """
+    inner_type: Type
+    if is_type_List(f_type):
+        inner_type = get_args(f_type)[0]
+        stream_inner_type = function_to_stream_one_item(inner_type)
+        return lambda item, f: stream_list(item, f, stream_inner_type)
+    elif is_type_SpecificOptional(f_type):
+        inner_type = get_args(f_type)[0]
+        stream_inner_type = function_to_stream_one_item(inner_type)
+        return lambda item, f: stream_optional(item, f, stream_inner_type)
+    elif is_type_Tuple(f_type):
+        stream_inner_types = [function_to_stream_one_item(inner_type) for inner_type in get_args(f_type)]
+        return lambda item, f: stream_tuple(item, f, stream_inner_types)
+    elif f_type == bytes:
+        return stream_bytes
+    elif isinstance(f_type, type) and issubclass(f_type, StructStream):
+        struct_format = struct.Struct(f_type.PACK)
+        return lambda item, f: f.write(struct_format.pack(item))
+    elif hasattr(f_type, "stream"):
+        return lambda item, f: item.stream(f)
+    elif hasattr(f_type, "__bytes__"):
+        return lambda item, f: f.write(bytes(item))
+    elif f_type is str:
+        return stream_str
+    elif f_type is bool:
+        return stream_bool
+    else:
+        raise NotImplementedError(f"can't stream {f_type}")
+
+
 def streamable(cls: Any):
     """
     This is a decorator for class definitions. It applies the strictdataclass decorator,
@@ -195,30 +367,27 @@ class Streamable:
             list_size = uint32(int.from_bytes(list_size_bytes, "big"))
             bytes_read = f.read(list_size)
             assert bytes_read is not None and len(bytes_read) == list_size
-            return bytes_read
+            return bytes(bytes_read)
         if hasattr(f_type, "parse"):
             return f_type.parse(f)
         if hasattr(f_type, "from_bytes") and size_hints[f_type.__name__]:
             bytes_to_read = size_hints[f_type.__name__]
             bytes_read = f.read(bytes_to_read)
             assert bytes_read is not None and len(bytes_read) == bytes_to_read
-            return f_type.from_bytes(bytes_read)
+            return f_type.from_bytes(bytes(bytes_read))
         if f_type is str:
             str_size_bytes = f.read(4)
             assert str_size_bytes is not None and len(str_size_bytes) == 4  # Checks for EOF
             str_size: uint32 = uint32(int.from_bytes(str_size_bytes, "big"))
             str_read_bytes = f.read(str_size)
             assert str_read_bytes is not None and len(str_read_bytes) == str_size  # Checks for EOF
-            return bytes.decode(str_read_bytes, "utf-8")
+            return str(str_read_bytes, "utf-8")
         else:
             raise RuntimeError(f"Type {f_type} does not have parse")
 
     @classmethod
     def parse(cls: Type[cls.__name__], f: BinaryIO) -> cls.__name__:  # type: ignore
-        values = []
-        for _, f_type in get_type_hints(cls).items():
-            values.append(cls.parse_one_item(f_type, f))  # type: ignore
-        return cls(*values)
+        return cls(*[parse_function(f) for parse_function in parse_functions_for_class(cls)])
 
     def stream_one_item(self, f_type: Type, item, f: BinaryIO) -> None:
         inner_type: Type
@@ -258,16 +427,30 @@ class Streamable:
             raise NotImplementedError(f"can't stream {item}, {f_type}")
 
     def stream(self, f: BinaryIO) -> None:
-        for f_name, f_type in get_type_hints(self).items():  # type: ignore
-            self.stream_one_item(f_type, getattr(self, f_name), f)
+        stream_functions = STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS.get(type(self))
+        if stream_functions is None:
+            stream_functions = [
+                (f_name, function_to_stream_one_item(f_type))
+                for f_name, f_type in get_type_hints(self).items()  # type: ignore
+            ]
+            STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS[type(self)] = stream_functions
+        for f_name, stream_function in stream_functions:
+            stream_function(getattr(self, f_name), f)
 
     def get_hash(self) -> bytes32:
-        return bytes32(std_hash(bytes(self)))
+        # Streamable dataclasses are frozen, so the hash is computed once, and kept with the object. This also caches
+        # Coin.name(), SpendBundle.name() and the header_hash of blocks, which is the hash of their foliage.
+        cached_hash = self.__dict__.get("_cached_hash")
+        if cached_hash is None:
+            cached_hash = bytes32(std_hash(bytes(self)))
+            object.__setattr__(self, "_cached_hash", cached_hash)
+        return cached_hash
 
     @classmethod
     def from_bytes(cls: Any, blob: bytes) -> Any:
-        f = io.BytesIO(blob)
-        return cls.parse(f)
+        # Fields are sliced out of the blob without intermediate copies
+        f = MemoryViewStream(blob)
+        return cls.parse(f)  # type: ignore
 
     def __bytes__(self: Any) -> bytes:
         f = io.BytesIO()
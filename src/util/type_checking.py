@@ -1,6 +1,6 @@
 import sys
 import dataclasses
-from typing import Any, List, Type, Union, get_type_hints, Tuple, Optional
+from typing import Any, Dict, List, Type, Union, get_type_hints, Tuple, Optional
 
 
 if sys.version_info < (3, 8):
@@ -32,6 +32,10 @@ def is_type_Tuple(f_type: Type) -> bool:
     return (get_origin(f_type) is not None and get_origin(f_type) == tuple) or f_type == tuple
 
 
+# Resolved field types of each strict dataclass, so construction does not call get_type_hints every time
+TYPE_HINTS_FOR_CLASS: Dict[Type, Dict[str, Type]] = {}
+
+
 def strictdataclass(cls: Any):
     class _Local:
         """
@@ -81,7 +85,10 @@ def strictdataclass(cls: Any):
             return item
 
         def __post_init__(self):
-            fields = get_type_hints(self)
+            fields = TYPE_HINTS_FOR_CLASS.get(type(self))
+            if fields is None:
+                fields = get_type_hints(self)
+                TYPE_HINTS_FOR_CLASS[type(self)] = fields
             data = self.__dict__
             for (f_name, f_type) in fields.items():
                 if f_name not in data:
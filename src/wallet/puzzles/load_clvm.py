@@ -4,7 +4,7 @@ import pkg_resources
 
 from clvm_tools.clvmc import compile_clvm
 
-from src.types.blockchain_format.program import Program, SerializedProgram
+from src.types.blockchain_format.program import Program, SerializedProgram, register_shared_tree
 
 
 def load_serialized_clvm(clvm_filename, package_or_requirement=__name__) -> SerializedProgram:
@@ -35,4 +35,7 @@ def load_serialized_clvm(clvm_filename, package_or_requirement=__name__) -> Seri
 
 
 def load_clvm(clvm_filename, package_or_requirement=__name__) -> Program:
-    return Program.from_bytes(bytes(load_serialized_clvm(clvm_filename, package_or_requirement=__name__)))
+    program = Program.from_bytes(bytes(load_serialized_clvm(clvm_filename, package_or_requirement=__name__)))
+    # Puzzles are mostly modules that get curried, their hash is computed once for all of them
+    register_shared_tree(program)
+    return program
@@ -14,7 +14,11 @@ from src.consensus.difficulty_adjustment import (
     get_sub_slot_iters_and_difficulty,
 )
 from src.consensus.full_block_to_block_record import block_to_block_record
-from src.consensus.multiprocess_validation import PreValidationResult, pre_validate_blocks_multiprocessing
+from src.consensus.multiprocess_validation import (
+    PreValidationResult,
+    init_validation_worker,
+    pre_validate_blocks_multiprocessing,
+)
 from src.types.header_block import HeaderBlock
 from src.types.blockchain_format.sized_bytes import bytes32
 from src.consensus.block_record import BlockRecord
@@ -67,6 +71,7 @@ class WalletBlockchain(BlockchainInterface):
     block_store: WalletBlockStore
     # Used to verify blocks in parallel
     pool: ProcessPoolExecutor
+    num_workers: int
 
     coins_of_interest_received: Any
     reorg_rollback: Any
@@ -95,11 +100,13 @@ class WalletBlockchain(BlockchainInterface):
         cpu_count = multiprocessing.cpu_count()
         if cpu_count > 61:
             cpu_count = 61  # Windows Server 2016 has an issue https://bugs.python.org/issue26903
-        num_workers = max(cpu_count - 2, 1)
-        self.pool = ProcessPoolExecutor(max_workers=num_workers)
-        log.info(f"Started {num_workers} processes for block validation")
+        self.num_workers = max(cpu_count - 2, 1)
         self.constants = consensus_constants
         self.constants_json = recurse_jsonify(dataclasses.asdict(self.constants))
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.num_workers, initializer=init_validation_worker, initargs=(self.constants_json,)
+        )
+        log.info(f"Started {self.num_workers} processes for block validation")
         self.block_store = block_store
         self._shut_down = False
         self.coins_of_interest_received = coins_of_interest_received
@@ -354,7 +361,7 @@ class WalletBlockchain(BlockchainInterface):
         blocks: List[HeaderBlock],
     ) -> Optional[List[PreValidationResult]]:
         return await pre_validate_blocks_multiprocessing(
-            self.constants, self.constants_json, self, blocks, self.pool, True, True
+            self.constants, self.constants_json, self, blocks, self.pool, True, True, self.num_workers
         )
 
     def contains_block(self, header_hash: bytes32) -> bool:
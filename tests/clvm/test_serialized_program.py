@@ -1,6 +1,7 @@
 from unittest import TestCase
 
-from src.types.blockchain_format.program import SerializedProgram, Program
+from src.types.blockchain_format.program import SerializedProgram, Program, _shared_tree_hashes, register_shared_tree
+from src.types.blockchain_format.sized_bytes import bytes32
 from src.wallet.puzzles.load_clvm import load_clvm
 
 
@@ -14,6 +15,41 @@ class TestSerializedProgram(TestCase):
         s = SerializedProgram.from_bytes(bytes(SHA256TREE_MOD))
         self.assertEqual(s.get_tree_hash(), p.get_tree_hash())
 
+    def test_tree_hash_cached(self):
+        sp = SerializedProgram.from_bytes(bytes(SHA256TREE_MOD))
+        tree_hash = sp.get_tree_hash()
+        self.assertIs(sp.get_tree_hash(), tree_hash)
+        # Precalculated values are not cached
+        atom = Program.to(b"\xaa" * 32)
+        p = Program.to([atom, 1])
+        sp = SerializedProgram.from_bytes(bytes(p))
+        self.assertNotEqual(p.get_tree_hash(atom.as_atom()), p.get_tree_hash())
+        self.assertEqual(sp.get_tree_hash(atom.as_atom()), p.get_tree_hash(atom.as_atom()))
+        self.assertEqual(sp.get_tree_hash(), p.get_tree_hash())
+
+    def test_shared_tree_hash(self):
+        # A curried module reuses the hash of the module, instead of hashing it again
+        mod = Program.to([1, [2, 3]])
+        curried = mod.curry(4, 5)
+        tree_hash = curried.get_tree_hash()
+        fake_hash = bytes32(b"\x01" * 32)
+        _shared_tree_hashes[id(mod.pair)] = (mod.pair, fake_hash)
+        try:
+            self.assertNotEqual(mod.curry(4, 5).get_tree_hash(), tree_hash)
+        finally:
+            del _shared_tree_hashes[id(mod.pair)]
+        register_shared_tree(mod)
+        self.assertEqual(mod.curry(4, 5).get_tree_hash(), tree_hash)
+        self.assertEqual(SerializedProgram.from_bytes(bytes(curried)).get_tree_hash(), tree_hash)
+
+    def test_tree_hash_bad_encoding(self):
+        atom_blob = bytes(Program.to(b"\xaa" * 40))
+        pair_blob = bytes(Program.to([1, b"\xaa" * 40]))
+        # The last atom is cut short, or the pair is missing its right side
+        for truncated in (atom_blob[:-5], pair_blob[:-5], b"\xff\x01"):
+            with self.assertRaises(ValueError):
+                SerializedProgram.from_bytes(truncated).get_tree_hash()
+
     def test_program_execution(self):
         p_result = SHA256TREE_MOD.run(SHA256TREE_MOD)
         sp = SerializedProgram.from_bytes(bytes(SHA256TREE_MOD))
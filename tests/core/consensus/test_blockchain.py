@@ -10,6 +10,7 @@ import pytest
 from blspy import AugSchemeMPL, G2Element
 
 from src.consensus.blockchain import ReceiveBlockResult
+from src.consensus.multiprocess_validation import HEADER_VALIDATION_WEIGHT, MAX_BATCH_SIZE, batch_sizes_for_weights
 from src.types.blockchain_format.classgroup import ClassgroupElement
 from src.types.blockchain_format.sized_bytes import bytes32
 from src.types.end_of_slot_bundle import EndOfSubSlotBundle
@@ -1681,6 +1682,49 @@ class TestPreValidation:
         assert res[0].error is None
         assert res[1].error is not None
 
+    @pytest.mark.asyncio
+    async def test_pre_validation_in_batches(self, empty_blockchain, default_400_blocks):
+        blocks = default_400_blocks[:40]
+        batches = await empty_blockchain.pre_validate_blocks_in_batches(blocks)
+        assert batches is not None
+        for i, block in enumerate(blocks):
+            res = await batches.get(i)
+            assert res.error is None
+            result, err, _ = await empty_blockchain.receive_block(block, res)
+            assert err is None
+            assert result == ReceiveBlockResult.NEW_PEAK
+
+    @pytest.mark.asyncio
+    async def test_pre_validation_signature(self, empty_blockchain):
+        wallet_a = WalletTool()
+        coinbase_puzzlehash = wallet_a.get_new_puzzlehash()
+        blocks = bt.get_consecutive_blocks(
+            3, farmer_reward_puzzle_hash=coinbase_puzzlehash, guarantee_transaction_block=True
+        )
+        reward_coins = blocks[-1].get_included_reward_coins()
+        spend_coin = [coin for coin in reward_coins if coin.puzzle_hash == coinbase_puzzlehash][0]
+        spend_bundle = wallet_a.generate_signed_transaction(1000, wallet_a.get_new_puzzlehash(), spend_coin)
+        blocks = bt.get_consecutive_blocks(1, blocks, transaction_data=spend_bundle, guarantee_transaction_block=True)
+
+        res = await empty_blockchain.pre_validate_blocks_multiprocessing(blocks)
+        assert res is not None
+        for block, block_res in zip(blocks, res):
+            assert block_res.error is None
+            # Only blocks with transactions have a signature to verify
+            assert block_res.validated_signature == (block.transactions_generator is not None)
+            result, err, _ = await empty_blockchain.receive_block(block, block_res)
+            assert err is None
+            assert result == ReceiveBlockResult.NEW_PEAK
+        assert res[-1].validated_signature
+
+    def test_batch_sizes(self):
+        light = HEADER_VALIDATION_WEIGHT
+        assert sum(batch_sizes_for_weights([light] * 32, 30)) == 32
+        assert batch_sizes_for_weights([light] * 32, 2) == [8, 8, 8, 8]
+        # Heavy transaction blocks are spread over the workers
+        assert batch_sizes_for_weights([light, 50 * light, light, 50 * light], 2) == [2, 2]
+        assert max(batch_sizes_for_weights([light] * 1000, 1)) == MAX_BATCH_SIZE
+
     @pytest.mark.asyncio
     async def test_pre_validation(self, empty_blockchain, default_1000_blocks):
         blocks = default_1000_blocks[:100]
@@ -0,0 +1,140 @@
+from typing import Dict, List, Set, Tuple
+
+import pytest
+
+from src.consensus.fork_coin_view import ForkCoinView, ForkCoinViewCache
+from src.types.blockchain_format.coin import Coin
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.util.ints import uint32, uint64
+
+
+class FakeBlock:
+    def __init__(self, height: int, prev_header_hash: bytes32, salt: int = 0):
+        self.height = uint32(height)
+        self.prev_header_hash = prev_header_hash
+        self.header_hash = bytes32(bytes([height, salt]) * 16)
+        self.addition = Coin(self.header_hash, bytes32(b"\0" * 32), uint64(height))
+        self.reward = Coin(self.header_hash, bytes32(b"\1" * 32), uint64(height))
+        self.removal = bytes32(bytes([height, salt, 1]) + b"\0" * 29)
+
+    def get_included_reward_coins(self) -> Set[Coin]:
+        return {self.reward}
+
+
+class FakeBlockStore:
+    def __init__(self):
+        self.blocks: Dict[bytes32, FakeBlock] = {}
+        self.blocks_loaded = 0
+
+    def add_chain(self, start: FakeBlock, length: int, salt: int) -> List[FakeBlock]:
+        chain = []
+        prev = start
+        for _ in range(length):
+            prev = FakeBlock(prev.height + 1, prev.header_hash, salt)
+            self.blocks[prev.header_hash] = prev
+            chain.append(prev)
+        return chain
+
+    async def get_full_block(self, header_hash: bytes32) -> FakeBlock:
+        self.blocks_loaded += 1
+        return self.blocks[header_hash]
+
+    async def get_tx_removals_and_additions(self, block: FakeBlock) -> Tuple[List[bytes32], List[Coin]]:
+        return [block.removal], [block.addition]
+
+
+def view_removals(view: ForkCoinView) -> Set[bytes32]:
+    return set().union(*(part.removals for part in view.chain()))
+
+
+class TestForkCoinView:
+    @pytest.mark.asyncio
+    async def test_extend_fork(self):
+        block_store = FakeBlockStore()
+        genesis = FakeBlock(0, bytes32(b"\0" * 32))
+        block_store.blocks[genesis.header_hash] = genesis
+        peak_chain = block_store.add_chain(genesis, 5, 0)
+        fork = block_store.add_chain(peak_chain[1], 10, 1)
+        fork_height = peak_chain[1].height
+        cache = ForkCoinViewCache()
+
+        # The tip is the fork point
+        view = await cache.get_view(block_store, peak_chain[1].header_hash, fork_height)
+        assert view.get_addition(fork[0].addition.name()) is None
+        assert len(cache.views) == 0
+
+        view = await cache.get_view(block_store, fork[4].header_hash, fork_height)
+        assert view_removals(view) == {block.removal for block in fork[:5]}
+        assert all(view.is_removed(block.removal) for block in fork[:5])
+        assert not view.is_removed(fork[5].removal)
+        assert all(view.is_coinbase(block.reward.name()) for block in fork[:5])
+        assert not view.is_coinbase(fork[2].addition.name())
+        assert view.get_addition(fork[2].addition.name()) == (fork[2].addition, fork[2].height)
+        assert view.get_addition(fork[2].reward.name()) == (fork[2].reward, fork[2].height)
+        assert view.get_addition(peak_chain[2].addition.name()) is None
+
+        # The next block of the fork only loads its parent
+        block_store.blocks_loaded = 0
+        next_view = await cache.get_view(block_store, fork[5].header_hash, fork_height)
+        assert block_store.blocks_loaded == 1
+        assert view_removals(next_view) == {block.removal for block in fork[:6]}
+        # The cached view of the parent is not changed
+        assert view_removals(view) == {block.removal for block in fork[:5]}
+
+        block_store.blocks_loaded = 0
+        assert await cache.get_view(block_store, fork[5].header_hash, fork_height) is next_view
+        assert block_store.blocks_loaded == 0
+
+        # A different fork point does not use the cached views
+        other_view = await cache.get_view(block_store, fork[5].header_hash, -1)
+        assert len(view_removals(other_view)) == 9
+        assert other_view.is_coinbase(genesis.reward.name())
+
+    @pytest.mark.asyncio
+    async def test_long_fork(self):
+        block_store = FakeBlockStore()
+        genesis = FakeBlock(0, bytes32(b"\0" * 32))
+        block_store.blocks[genesis.header_hash] = genesis
+        fork = block_store.add_chain(genesis, 200, 1)
+        cache = ForkCoinViewCache()
+        view = None
+        for block in fork:
+            view = await cache.get_view(block_store, block.header_hash, 0)
+        assert view is not None
+        assert view_removals(view) == {block.removal for block in fork}
+        assert all(view.get_addition(block.addition.name()) == (block.addition, block.height) for block in fork)
+        # Merging keeps the chain of views short, and the views of the tips share most of their coins, where copying
+        # the parent view for each block would hold 3 * 200 * 201 / 2 coins
+        assert len(view.chain()) <= 8
+        assert cache.coin_count < 3 * len(fork) * 8
+
+        # With a limit, the views of the oldest tips are evicted, and the fork is still extended one block at a time
+        cache = ForkCoinViewCache(max_coins=3 * len(fork))
+        await cache.get_view(block_store, fork[0].header_hash, 0)
+        for block in fork[1:]:
+            block_store.blocks_loaded = 0
+            await cache.get_view(block_store, block.header_hash, 0)
+            assert block_store.blocks_loaded == 1
+            assert cache.coin_count <= 3 * len(fork)
+        assert fork[-1].header_hash in cache.views
+        assert fork[0].header_hash not in cache.views
+
+    @pytest.mark.asyncio
+    async def test_eviction(self):
+        block_store = FakeBlockStore()
+        genesis = FakeBlock(0, bytes32(b"\0" * 32))
+        block_store.blocks[genesis.header_hash] = genesis
+        # Each block adds three coins
+        cache = ForkCoinViewCache(max_coins=20)
+        forks = [block_store.add_chain(genesis, 3, salt) for salt in range(1, 4)]
+        for fork in forks:
+            await cache.get_view(block_store, fork[-1].header_hash, 0)
+        assert len(cache.views) == 2
+        assert forks[0][-1].header_hash not in cache.views
+        assert cache.coin_count == 18
+
+        # The newest view is kept even when it is too large on its own
+        long_fork = block_store.add_chain(genesis, 10, 4)
+        view = await cache.get_view(block_store, long_fork[-1].header_hash, 0)
+        assert list(cache.views.values()) == [view]
+        assert cache.coin_count == 30
@@ -0,0 +1,88 @@
+import asyncio
+from typing import List, Optional
+
+import pytest
+
+from src.full_node.block_download import BlockDownloader
+from src.protocols.full_node_protocol import RejectBlocks, RequestBlocks, RespondBlocks
+
+
+class FakePeer:
+    def __init__(self, peer_id: int, delay: float, reject: bool = False):
+        self.peer_node_id = peer_id.to_bytes(32, "big")
+        self.peer_host = f"peer_{peer_id}"
+        self.delay = delay
+        self.reject = reject
+        self.closed = False
+        self.requests: List[RequestBlocks] = []
+
+    async def request_blocks(self, request: RequestBlocks) -> Optional[object]:
+        self.requests.append(request)
+        await asyncio.sleep(self.delay)
+        if self.reject:
+            return RejectBlocks(request.start_height, request.end_height)
+        # Blocks are not inspected by the downloader
+        return RespondBlocks(request.start_height, request.end_height, [])
+
+    async def close(self):
+        self.closed = True
+
+
+def make_ranges(count: int):
+    return [(i * 32, (i + 1) * 32) for i in range(count)]
+
+
+class TestBlockDownloader:
+    @pytest.mark.asyncio
+    async def test_in_order(self):
+        peers = [FakePeer(1, 0.02), FakePeer(2, 0.001), FakePeer(3, 0.01)]
+        downloader = BlockDownloader(make_ranges(20), peers, 6, 2, 8, 10)
+        indexes = []
+        while True:
+            batch = await downloader.next_batch()
+            if batch is None:
+                break
+            indexes.append(batch[0])
+        downloader.close()
+        assert indexes == list(range(20))
+        # The fastest peer serves the most ranges
+        assert len(peers[1].requests) > len(peers[0].requests)
+
+    @pytest.mark.asyncio
+    async def test_rejecting_peer_is_dropped(self):
+        peers = [FakePeer(1, 0.001, reject=True), FakePeer(2, 0.001)]
+        downloader = BlockDownloader(make_ranges(5), peers, 4, 2, 4, 10)
+        indexes = []
+        while True:
+            batch = await downloader.next_batch()
+            if batch is None:
+                break
+            indexes.append(batch[0])
+        downloader.close()
+        assert indexes == list(range(5))
+        assert len(peers[0].requests) <= 2
+
+    @pytest.mark.asyncio
+    async def test_retry_and_no_peers(self):
+        peers = [FakePeer(1, 0.001), FakePeer(2, 0.001)]
+        downloader = BlockDownloader(make_ranges(3), peers, 2, 1, 3, 10)
+        index, _, peer = await downloader.next_batch()
+        assert index == 0
+        downloader.retry(index, peer)
+        index, _, other_peer = await downloader.next_batch()
+        assert index == 0 and other_peer is not peer
+        downloader.retry(index, other_peer)
+        # Both peers failed, so the range can't be downloaded
+        assert await downloader.next_batch() is None
+        downloader.close()
+
+    @pytest.mark.asyncio
+    async def test_slow_peer_is_hedged(self):
+        peers = [FakePeer(1, 5), FakePeer(2, 0.001)]
+        downloader = BlockDownloader(make_ranges(1), peers, 1, 1, 1, 0.05)
+        # The slow peer looks faster, so it gets the range first
+        downloader.throughput[peers[1].peer_node_id] = 1
+        downloader.throughput[peers[0].peer_node_id] = 100
+        index, _, peer = await asyncio.wait_for(downloader.next_batch(), 2)
+        assert peer is peers[1]
+        downloader.close()
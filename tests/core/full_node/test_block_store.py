@@ -1,4 +1,5 @@
 import asyncio
+import dataclasses
 import random
 from pathlib import Path
 import sqlite3
@@ -8,6 +9,10 @@ import pytest
 from src.full_node.block_store import BlockStore
 from src.consensus.blockchain import Blockchain
 from src.full_node.coin_store import CoinStore
+from src.full_node.height_index import RECORD_FORMAT, HeightIndex
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.util.ints import uint32
+from src.util.wallet_tools import WalletTool
 from tests.setup_nodes import test_constants, bt
 
 
@@ -59,6 +64,23 @@ class TestBlockStore:
             assert len(await store.get_full_blocks_at([0])) == 1
             assert len(await store.get_full_blocks_at([100])) == 0
 
+            # Lazy views serialize to the stored bytes and match the full blocks
+            views = await store.get_blocks_by_hash([block.header_hash for block in blocks])
+            header_blocks = await store.get_header_blocks_in_range(0, len(blocks) - 1)
+            for block, view in zip(blocks, views):
+                assert bytes(view) == bytes(block)
+                assert view.header_hash == block.header_hash
+                assert view.transactions_generator == block.transactions_generator
+                assert view.to_full_block() == block
+                assert header_blocks[block.header_hash] == block.get_block_header()
+
+            # Leaving out the generator does not parse it
+            views = await store.get_blocks_by_hash([block.header_hash for block in blocks])
+            for block, view in zip(blocks, views):
+                without_generator = dataclasses.replace(block, transactions_generator=None)
+                assert view.bytes_without_transactions_generator() == bytes(without_generator)
+                assert not view._transactions_generator_parsed
+
             # Get blocks
             block_record_records = await store.get_block_records()
             assert len(block_record_records[0]) == len(blocks)
@@ -117,3 +139,145 @@ class TestBlockStore:
         await connection_2.close()
         db_filename.unlink()
         db_filename_2.unlink()
+
+    @pytest.mark.asyncio
+    async def test_height_index(self):
+        blocks = bt.get_consecutive_blocks(10)
+        db_filename = Path("blockchain_test.db")
+        index_filename = Path("blockchain_test.db-height-index")
+        summaries_filename = Path("blockchain_test.db-height-index-summaries")
+        for filename in [db_filename, index_filename, summaries_filename]:
+            if filename.exists():
+                filename.unlink()
+
+        connection = await aiosqlite.connect(db_filename)
+        try:
+            coin_store = await CoinStore.create(connection)
+            store = await BlockStore.create(connection, index_filename)
+            bc = await Blockchain.create(coin_store, store, test_constants)
+            for block in blocks:
+                await bc.receive_block(block)
+            assert index_filename.stat().st_size > 0
+            store_no_index = await BlockStore.create(connection)
+            expected = await store_no_index.get_peak_height_dicts()
+
+            # Loaded from the index, without scanning block_records
+            store_2 = await BlockStore.create(connection, index_filename)
+            assert store_2.height_index.load(blocks[-1].header_hash, blocks[-1].height) == expected
+            assert await store_2.get_peak_height_dicts() == expected
+
+            # An index that is behind the database is repaired
+            with open(index_filename, "r+b") as f:
+                f.truncate(5 * RECORD_FORMAT.size)
+            store_3 = await BlockStore.create(connection, index_filename)
+            assert store_3.height_index.load(blocks[-1].header_hash, blocks[-1].height) is None
+            assert await store_3.get_peak_height_dicts() == expected
+            assert store_3.height_index.load(blocks[-1].header_hash, blocks[-1].height) == expected
+
+            # A summary offset past the end of the summaries file, as after a crash between the two writes
+            with open(index_filename, "r+b") as f:
+                f.seek(3 * RECORD_FORMAT.size)
+                header_hash, prev_hash, weight, _ = RECORD_FORMAT.unpack(f.read(RECORD_FORMAT.size))
+                f.seek(3 * RECORD_FORMAT.size)
+                f.write(RECORD_FORMAT.pack(header_hash, prev_hash, weight, summaries_filename.stat().st_size + 5))
+            store_4 = await BlockStore.create(connection, index_filename)
+            assert store_4.height_index.load(blocks[-1].header_hash, blocks[-1].height) is None
+            assert await store_4.get_peak_height_dicts() == expected
+            assert store_4.height_index.load(blocks[-1].header_hash, blocks[-1].height) == expected
+            bc.shut_down()
+        finally:
+            await connection.close()
+            for filename in [db_filename, index_filename, summaries_filename]:
+                if filename.exists():
+                    filename.unlink()
+
+    def test_height_index_corrupt_summaries(self, tmp_path):
+        index = HeightIndex(tmp_path / "height-index")
+        header_hash = bytes32([1] * 32)
+        (tmp_path / "height-index").write_bytes(RECORD_FORMAT.pack(header_hash, bytes(32), bytes(16), 5))
+        (tmp_path / "height-index-summaries").write_bytes(b"\x00")
+        assert index.load(header_hash, uint32(0)) is None
+        # The whole index is rewritten by the repair
+        assert index.fork_height({uint32(0): header_hash}) == -1
+
+        # A summary that is longer than the file
+        (tmp_path / "height-index-summaries").write_bytes(bytes([0, 0, 1, 0, 7]))
+        index = HeightIndex(tmp_path / "height-index")
+        assert index.load(header_hash, uint32(0)) is None
+        assert index.corrupt
+
+    @pytest.mark.asyncio
+    async def test_batch_commit(self):
+        blocks = bt.get_consecutive_blocks(10)
+        db_filename = Path("blockchain_test.db")
+        if db_filename.exists():
+            db_filename.unlink()
+
+        connection = await aiosqlite.connect(db_filename)
+        reader = await aiosqlite.connect(db_filename)
+        try:
+            coin_store = await CoinStore.create(connection)
+            store = await BlockStore.create(connection)
+            reader_store = await BlockStore.create(reader)
+            bc = await Blockchain.create(coin_store, store, test_constants)
+
+            await store.begin_batch()
+            for block in blocks:
+                await bc.receive_block(block)
+            # Nothing is visible to other connections until the batch is committed
+            assert await reader_store.get_full_block(blocks[0].header_hash) is None
+            await store.commit_batch()
+            for block in blocks:
+                assert await reader_store.get_full_block(block.header_hash) == block
+            assert (await reader_store.get_block_records())[1] == blocks[-1].header_hash
+            bc.shut_down()
+        finally:
+            await connection.close()
+            await reader.close()
+            db_filename.unlink()
+
+    @pytest.mark.asyncio
+    async def test_tx_removals_and_additions(self):
+        wallet_a = WalletTool()
+        reward_ph = wallet_a.get_new_puzzlehash()
+        blocks = bt.get_consecutive_blocks(
+            10,
+            farmer_reward_puzzle_hash=reward_ph,
+            pool_reward_puzzle_hash=reward_ph,
+            guarantee_transaction_block=True,
+        )
+        coin = [coin for coin in blocks[-1].get_included_reward_coins() if coin.puzzle_hash == reward_ph][0]
+        spend_bundle = wallet_a.generate_signed_transaction(1000, wallet_a.get_new_puzzlehash(), coin)
+        blocks = bt.get_consecutive_blocks(1, blocks, guarantee_transaction_block=True, transaction_data=spend_bundle)
+        db_filename = Path("blockchain_test.db")
+        if db_filename.exists():
+            db_filename.unlink()
+
+        connection = await aiosqlite.connect(db_filename)
+        try:
+            coin_store = await CoinStore.create(connection)
+            store = await BlockStore.create(connection)
+            bc = await Blockchain.create(coin_store, store, test_constants)
+            for block in blocks:
+                await bc.receive_block(block)
+            assert len(blocks[-1].tx_removals_and_additions()[0]) == 1
+
+            # Recorded when the blocks were validated, and read back without running the generators
+            store_2 = await BlockStore.create(connection)
+            header_blocks = await store_2.get_header_blocks_in_range(0, len(blocks) - 1)
+            for block in blocks:
+                expected = block.tx_removals_and_additions()
+                assert await store_2.get_tx_removals_and_additions(block) == expected
+                assert header_blocks[block.header_hash] == block.get_block_header()
+
+            # Leaving out the generator does not parse it
+            views = await store.get_blocks_by_hash([block.header_hash for block in blocks])
+            for block, view in zip(blocks, views):
+                without_generator = dataclasses.replace(block, transactions_generator=None)
+                assert view.bytes_without_transactions_generator() == bytes(without_generator)
+                assert not view._transactions_generator_parsed
+                assert await bc.get_header_block(block.header_hash) == block.get_block_header()
+            bc.shut_down()
+        finally:
+            await connection.close()
+            db_filename.unlink()
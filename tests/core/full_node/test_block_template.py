@@ -0,0 +1,75 @@
+from blspy import G2Element
+
+from src.consensus.cost_calculator import CostResult
+from src.full_node.mempool import Mempool
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.types.mempool_item import MempoolItem
+from src.types.spend_bundle import SpendBundle
+from src.util.ints import uint64
+
+
+def make_item(index: int, fee: int, cost: int) -> MempoolItem:
+    return MempoolItem(
+        SpendBundle([], G2Element.infinity()),
+        uint64(fee),
+        CostResult(None, [], uint64(cost)),
+        bytes32(index.to_bytes(32, "big")),
+        [],
+        [],
+    )
+
+
+def template_names(mempool: Mempool):
+    assert mempool.get_block_template() is not None
+    return set(mempool.template.items.keys())
+
+
+def rebuilt_names(mempool: Mempool):
+    mempool.template.rebuild(mempool.sorted_spends)
+    return set(mempool.template.items.keys())
+
+
+class TestBlockTemplate:
+    def test_empty(self):
+        mempool = Mempool.create(100, 100, 1000)
+        assert mempool.get_block_template() is None
+
+    def test_highest_fee_per_cost_first(self):
+        mempool = Mempool.create(100, 100, 1000)
+        low = make_item(1, 10, 60)
+        high = make_item(2, 100, 60)
+        mempool.add_to_pool(low, [], {})
+        assert template_names(mempool) == {low.name}
+        # Does not fit next to the low paying item, so the template is rebuilt with the better one
+        mempool.add_to_pool(high, [], {})
+        assert mempool.template.dirty
+        assert template_names(mempool) == {high.name}
+        assert mempool.template.cost_sum == 60
+
+    def test_incremental_matches_rebuild(self):
+        mempool = Mempool.create(100, 100, 1000)
+        items = [make_item(i, fee, cost) for i, (fee, cost) in enumerate([(5, 30), (50, 20), (1, 40), (9, 30), (3, 5)])]
+        for item in items:
+            mempool.add_to_pool(item, [], {})
+            assert template_names(mempool) == rebuilt_names(mempool)
+            assert mempool.template.cost_sum <= 100
+        mempool.remove_spend(items[1])
+        assert template_names(mempool) == rebuilt_names(mempool)
+        assert items[1].name not in mempool.template.items
+
+    def test_fee_limit(self):
+        mempool = Mempool.create(100, 100, 15)
+        mempool.add_to_pool(make_item(1, 10, 10), [], {})
+        mempool.add_to_pool(make_item(2, 10, 10), [], {})
+        assert len(template_names(mempool)) == 1
+        assert mempool.template.fee_sum == 10
+
+    def test_bundle_is_cached(self):
+        mempool = Mempool.create(100, 100, 1000)
+        mempool.add_to_pool(make_item(1, 10, 10), [], {})
+        bundle_1, _, _ = mempool.get_block_template()
+        bundle_2, _, _ = mempool.get_block_template()
+        assert bundle_1 is bundle_2
+        mempool.add_to_pool(make_item(2, 10, 10), [], {})
+        bundle_3, _, _ = mempool.get_block_template()
+        assert bundle_3 is not bundle_1
@@ -1,11 +1,15 @@
 import asyncio
+from typing import List, Tuple
 
 import pytest
 import logging
 from clvm.casts import int_to_bytes
 
 from src.consensus.blockchain import ReceiveBlockResult
+from src.full_node.mempool_manager import MempoolManager
 from src.protocols import full_node_protocol
+from src.types.blockchain_format.coin import Coin
+from src.types.blockchain_format.sized_bytes import bytes32
 from src.types.condition_opcodes import ConditionOpcode
 from src.types.condition_var_pair import ConditionVarPair
 from src.types.spend_bundle import SpendBundle
@@ -24,6 +28,36 @@ WALLET_A_PUZZLE_HASHES = [WALLET_A.get_new_puzzlehash() for _ in range(5)]
 log = logging.getLogger(__name__)
 
 
+def reward_coin(block, puzzle_hash) -> Coin:
+    for coin in block.get_included_reward_coins():
+        if coin.puzzle_hash == puzzle_hash:
+            return coin
+    raise ValueError("No reward coin for the puzzle hash")
+
+
+def record_mempool_calls(mempool_manager: MempoolManager) -> Tuple[List[bool], List[bytes32]]:
+    """
+    Records the extends_previous_peak argument of each new_peak call, and the name of each spend bundle that is
+    validated by add_spendbundle.
+    """
+    new_peak_calls: List[bool] = []
+    validated_names: List[bytes32] = []
+    new_peak = mempool_manager.new_peak
+    add_spendbundle = mempool_manager.add_spendbundle
+
+    async def recording_new_peak(peak, extends_previous_peak=False):
+        new_peak_calls.append(extends_previous_peak)
+        await new_peak(peak, extends_previous_peak)
+
+    async def recording_add_spendbundle(new_spend, cost_result, spend_name, validate_signature=True):
+        validated_names.append(spend_name)
+        return await add_spendbundle(new_spend, cost_result, spend_name, validate_signature)
+
+    mempool_manager.new_peak = recording_new_peak
+    mempool_manager.add_spendbundle = recording_add_spendbundle
+    return new_peak_calls, validated_names
+
+
 @pytest.fixture(scope="session")
 def event_loop():
     loop = asyncio.get_event_loop()
@@ -86,6 +120,8 @@ class TestBlockchainTransactions:
         await full_node_1.respond_block(full_node_protocol.RespondBlock(next_block))
 
         assert next_block.header_hash == full_node_1.blockchain.get_peak().header_hash
+        # The included spend is removed from the mempool
+        assert full_node_1.mempool_manager.get_spendbundle(spend_bundle.name()) is None
 
         added_coins = next_spendbundle.additions()
 
@@ -97,6 +133,139 @@ class TestBlockchainTransactions:
             assert not unspent.spent
             assert not unspent.coinbase
 
+    @pytest.mark.asyncio
+    async def test_mempool_new_block_spends_item_coin(self, two_nodes):
+        coinbase_puzzlehash = WALLET_A_PUZZLE_HASHES[0]
+        blocks = bt.get_consecutive_blocks(
+            10, farmer_reward_puzzle_hash=coinbase_puzzlehash, guarantee_transaction_block=True
+        )
+        full_node_api_1, full_node_api_2, server_1, server_2 = two_nodes
+        peer = await connect_and_get_peer(server_1, server_2)
+        full_node_1 = full_node_api_1.full_node
+        mempool_manager = full_node_1.mempool_manager
+
+        for block in blocks:
+            await full_node_1.respond_block(full_node_protocol.RespondBlock(block))
+
+        spend_coin = reward_coin(blocks[2], coinbase_puzzlehash)
+        spend_bundle = WALLET_A.generate_signed_transaction(1000, BURN_PUZZLE_HASH, spend_coin)
+        other_spend_bundle = WALLET_A.generate_signed_transaction(
+            1000, BURN_PUZZLE_HASH, reward_coin(blocks[3], coinbase_puzzlehash)
+        )
+        for bundle in (spend_bundle, other_spend_bundle):
+            await full_node_api_1.respond_transaction(full_node_protocol.RespondTransaction(bundle), peer)
+            assert mempool_manager.get_spendbundle(bundle.name()) is bundle
+        other_item = mempool_manager.get_mempool_item(other_spend_bundle.name())
+
+        # A different spend bundle spends the coin of the mempool item in the new block
+        block_spend_bundle = WALLET_A.generate_signed_transaction(1001, WALLET_A_PUZZLE_HASHES[1], spend_coin)
+        new_peak_calls, validated_names = record_mempool_calls(mempool_manager)
+        new_blocks = bt.get_consecutive_blocks(
+            1,
+            blocks,
+            farmer_reward_puzzle_hash=coinbase_puzzlehash,
+            transaction_data=block_spend_bundle,
+            guarantee_transaction_block=True,
+        )
+        await full_node_1.respond_block(full_node_protocol.RespondBlock(new_blocks[-1]))
+        assert full_node_1.blockchain.get_peak().header_hash == new_blocks[-1].header_hash
+
+        assert new_peak_calls == [True]
+        assert mempool_manager.get_spendbundle(spend_bundle.name()) is None
+        assert spend_coin.name() not in mempool_manager.mempool.removals
+        # The other item is kept as it was, without validating it again
+        assert mempool_manager.get_mempool_item(other_spend_bundle.name()) is other_item
+        assert validated_names == []
+
+    @pytest.mark.asyncio
+    async def test_mempool_reorg_validates_all_items(self, two_nodes):
+        coinbase_puzzlehash = WALLET_A_PUZZLE_HASHES[0]
+        blocks = bt.get_consecutive_blocks(
+            10, farmer_reward_puzzle_hash=coinbase_puzzlehash, guarantee_transaction_block=True
+        )
+        full_node_api_1, full_node_api_2, server_1, server_2 = two_nodes
+        peer = await connect_and_get_peer(server_1, server_2)
+        full_node_1 = full_node_api_1.full_node
+        mempool_manager = full_node_1.mempool_manager
+
+        for block in blocks:
+            await full_node_1.respond_block(full_node_protocol.RespondBlock(block))
+
+        spend_coin = reward_coin(blocks[2], coinbase_puzzlehash)
+        spend_bundle = WALLET_A.generate_signed_transaction(1000, BURN_PUZZLE_HASH, spend_coin)
+        other_spend_bundle = WALLET_A.generate_signed_transaction(
+            1000, BURN_PUZZLE_HASH, reward_coin(blocks[3], coinbase_puzzlehash)
+        )
+        for bundle in (spend_bundle, other_spend_bundle):
+            await full_node_api_1.respond_transaction(full_node_protocol.RespondTransaction(bundle), peer)
+            assert mempool_manager.get_spendbundle(bundle.name()) is bundle
+        other_item = mempool_manager.get_mempool_item(other_spend_bundle.name())
+
+        # A heavier fork from height 5, which spends the coin of the first item
+        block_spend_bundle = WALLET_A.generate_signed_transaction(1001, WALLET_A_PUZZLE_HASHES[1], spend_coin)
+        new_peak_calls, validated_names = record_mempool_calls(mempool_manager)
+        fork_blocks = bt.get_consecutive_blocks(
+            7,
+            blocks[:6],
+            farmer_reward_puzzle_hash=coinbase_puzzlehash,
+            transaction_data=block_spend_bundle,
+            guarantee_transaction_block=True,
+            seed=b"mempool reorg",
+        )
+        for block in fork_blocks[6:]:
+            await full_node_1.respond_block(full_node_protocol.RespondBlock(block))
+        assert full_node_1.blockchain.get_peak().header_hash == fork_blocks[-1].header_hash
+
+        # Every item was validated again on the reorg
+        assert new_peak_calls[0] is False
+        assert set(validated_names) == {spend_bundle.name(), other_spend_bundle.name()}
+        assert mempool_manager.get_spendbundle(spend_bundle.name()) is None
+        new_other_item = mempool_manager.get_mempool_item(other_spend_bundle.name())
+        assert new_other_item is not None and new_other_item is not other_item
+
+    @pytest.mark.asyncio
+    async def test_mempool_time_locked_retried_at_height(self, two_nodes):
+        coinbase_puzzlehash = WALLET_A_PUZZLE_HASHES[0]
+        blocks = bt.get_consecutive_blocks(
+            10, farmer_reward_puzzle_hash=coinbase_puzzlehash, guarantee_transaction_block=True
+        )
+        full_node_api_1, full_node_api_2, server_1, server_2 = two_nodes
+        peer = await connect_and_get_peer(server_1, server_2)
+        full_node_1 = full_node_api_1.full_node
+        mempool_manager = full_node_1.mempool_manager
+
+        for block in blocks:
+            await full_node_1.respond_block(full_node_protocol.RespondBlock(block))
+
+        # Can be spent once the previous transaction block is at height 12
+        cvp = ConditionVarPair(ConditionOpcode.ASSERT_HEIGHT_NOW_EXCEEDS, [int_to_bytes(12)])
+        spend_bundle = WALLET_A.generate_signed_transaction(
+            1000, BURN_PUZZLE_HASH, reward_coin(blocks[2], coinbase_puzzlehash), {cvp.opcode: [cvp]}
+        )
+        await full_node_api_1.respond_transaction(full_node_protocol.RespondTransaction(spend_bundle), peer)
+        assert mempool_manager.get_spendbundle(spend_bundle.name()) is None
+        assert mempool_manager.potential_tx_heights[spend_bundle.name()] == 12
+
+        new_peak_calls, validated_names = record_mempool_calls(mempool_manager)
+        for height in (10, 11):
+            blocks = bt.get_consecutive_blocks(
+                1, blocks, farmer_reward_puzzle_hash=coinbase_puzzlehash, guarantee_transaction_block=True
+            )
+            await full_node_1.respond_block(full_node_protocol.RespondBlock(blocks[-1]))
+            assert full_node_1.blockchain.get_peak().height == height
+            # Not validated again before its height
+            assert validated_names == []
+            assert mempool_manager.potential_tx_heights[spend_bundle.name()] == 12
+
+        blocks = bt.get_consecutive_blocks(
+            1, blocks, farmer_reward_puzzle_hash=coinbase_puzzlehash, guarantee_transaction_block=True
+        )
+        await full_node_1.respond_block(full_node_protocol.RespondBlock(blocks[-1]))
+        assert new_peak_calls == [True, True, True]
+        assert validated_names == [spend_bundle.name()]
+        assert mempool_manager.get_spendbundle(spend_bundle.name()) == spend_bundle
+        assert spend_bundle.name() not in mempool_manager.potential_tx_heights
+
     @pytest.mark.asyncio
     async def test_validate_blockchain_with_double_spend(self, two_nodes):
         num_blocks = 5
@@ -13,7 +13,7 @@ from src.full_node.block_store import BlockStore
 from src.types.blockchain_format.coin import Coin
 from src.types.coin_record import CoinRecord
 from src.types.full_block import FullBlock
-from src.util.ints import uint64
+from src.util.ints import uint32, uint64
 from tests.setup_nodes import test_constants, bt
 from src.util.wallet_tools import WalletTool
 
@@ -192,6 +192,102 @@ class TestCoinStore:
         await connection.close()
         Path("fndb_test.db").unlink()
 
+    @pytest.mark.asyncio
+    async def test_cache_eviction(self):
+        blocks = bt.get_consecutive_blocks(20)
+
+        db_path = Path("fndb_test.db")
+        if db_path.exists():
+            db_path.unlink()
+        connection = await aiosqlite.connect(db_path)
+        coin_store = await CoinStore.create(connection, cache_size=uint32(5))
+
+        for block in blocks:
+            if block.is_transaction_block():
+                await coin_store.new_block(block)
+                assert len(coin_store.coin_record_cache) <= 5
+
+        # The height index only references cached coins
+        indexed = set()
+        for names in coin_store.cache_heights.values():
+            indexed.update(names)
+        assert len(indexed) == len(coin_store.coin_record_cache)
+        for name in indexed:
+            assert name in coin_store.coin_record_cache
+
+        tx_blocks = [b for b in blocks if b.is_transaction_block() and b.height > 0]
+        last_coin = tx_blocks[-1].get_included_reward_coins()
+        first_coin = tx_blocks[0].get_included_reward_coins()
+        for coin in last_coin:
+            assert (await coin_store.get_coin_record(coin.name())) is not None
+        assert coin_store.coin_record_cache.hits == len(last_coin)
+        for coin in first_coin:
+            assert (await coin_store.get_coin_record(coin.name())) is not None
+        assert coin_store.coin_record_cache.misses == len(first_coin)
+        metrics = coin_store.get_cache_metrics()
+        assert metrics["hits"] == len(last_coin) and metrics["misses"] == len(first_coin)
+        assert metrics["size"] == len(coin_store.coin_record_cache) and metrics["capacity"] == 5
+        assert metrics["hit_rate"] == len(last_coin) / (len(last_coin) + len(first_coin))
+
+        await coin_store.rollback_to_block(-1)
+        assert len(coin_store.coin_record_cache) == 0
+        assert len(coin_store.cache_heights) == 0
+
+        await connection.close()
+        Path("fndb_test.db").unlink()
+
+    @pytest.mark.asyncio
+    async def test_key_format(self, tmp_path):
+        for binary_keys in (False, True):
+            connection = await aiosqlite.connect(tmp_path / f"coin_store_{binary_keys}.db")
+            await CoinStore.create(connection, binary_keys=binary_keys)
+            # Reopening with the same key format works, sqlite reports the column types in upper case
+            await CoinStore.create(connection, binary_keys=binary_keys)
+            with pytest.raises(ValueError):
+                await CoinStore.create(connection, binary_keys=not binary_keys)
+            await connection.close()
+
+    @pytest.mark.asyncio
+    async def test_binary_keys(self):
+        blocks = bt.get_consecutive_blocks(20)
+
+        db_path = Path("fndb_test.db")
+        if db_path.exists():
+            db_path.unlink()
+        connection = await aiosqlite.connect(db_path)
+        coin_store = await CoinStore.create(connection, binary_keys=True)
+
+        for block in blocks:
+            if block.is_transaction_block():
+                await coin_store.new_block(block)
+                coins = block.get_included_reward_coins()
+                await coin_store._set_spent_batch([coin.name() for coin in coins], block.height)
+
+        # Reads go to the database, not to the cache
+        coin_store = await CoinStore.create(connection, binary_keys=True)
+        reorg_index = 8
+        await coin_store.rollback_to_block(reorg_index)
+        for block in blocks:
+            if block.is_transaction_block():
+                for coin in block.get_included_reward_coins():
+                    record: Optional[CoinRecord] = await coin_store.get_coin_record(coin.name())
+                    if block.height <= reorg_index:
+                        assert record is not None
+                        assert record.coin == coin
+                        assert record.spent
+                        assert record.spent_block_index == block.height
+                        by_ph = await coin_store.get_coin_records_by_puzzle_hash(True, coin.puzzle_hash)
+                        assert record in by_ph
+                    else:
+                        assert record is None
+
+        # The key format of an existing table can not be changed
+        with pytest.raises(ValueError):
+            await CoinStore.create(connection, binary_keys=False)
+
+        await connection.close()
+        Path("fndb_test.db").unlink()
+
     @pytest.mark.asyncio
     async def test_basic_reorg(self):
         initial_block_count = 30
@@ -769,6 +769,7 @@ class TestFullNodeProtocol:
         assert len(fetched_blocks) == 6
         for b in fetched_blocks:
             assert b.transactions_generator is None
+        assert fetched_blocks[-1] == dataclasses.replace(blocks_t[-1], transactions_generator=None)
 
         # Ask with transactions
         res = await full_node_1.request_blocks(fnp.RequestBlocks(uint32(peak_height - 5), uint32(peak_height), True))
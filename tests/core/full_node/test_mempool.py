@@ -11,8 +11,10 @@ from src.types.condition_var_pair import ConditionVarPair
 from src.types.condition_opcodes import ConditionOpcode
 from src.types.spend_bundle import SpendBundle
 from src.types.announcement import Announcement
+from src.types.mempool_inclusion_status import MempoolInclusionStatus
 from src.util.condition_tools import conditions_for_solution
 from src.util.clvm import int_to_bytes
+from src.util.errors import Err
 from src.util.ints import uint64
 from tests.core.full_node.test_full_node import connect_and_get_peer, node_height_at_least
 from tests.setup_nodes import bt, setup_simulators_and_wallets
@@ -744,6 +746,44 @@ class TestMempool:
         sb = full_node_1.full_node.mempool_manager.get_spendbundle(spend_bundle_combined.name())
         assert sb is None
 
+    @pytest.mark.asyncio
+    async def test_bad_signature_from_worker(self, two_nodes):
+        reward_ph = WALLET_A.get_new_puzzlehash()
+        full_node_1, full_node_2, server_1, server_2 = two_nodes
+        blocks = await full_node_1.get_all_full_blocks()
+        start_height = blocks[-1].height
+        blocks = bt.get_consecutive_blocks(
+            3,
+            block_list_input=blocks,
+            guarantee_transaction_block=True,
+            farmer_reward_puzzle_hash=reward_ph,
+            pool_reward_puzzle_hash=reward_ph,
+        )
+
+        for block in blocks:
+            await full_node_1.full_node.respond_block(full_node_protocol.RespondBlock(block))
+
+        await time_out_assert(60, node_height_at_least, True, full_node_1, start_height + 3)
+
+        coins = list(blocks[-1].get_included_reward_coins())
+        spend_bundle = generate_test_spend_bundle(coins[0])
+        # Signed by the right key, but for the spend of another coin
+        other_spend_bundle = generate_test_spend_bundle(coins[1])
+        bad_spend_bundle = SpendBundle(spend_bundle.coin_solutions, other_spend_bundle.aggregated_signature)
+        mempool_manager = full_node_1.full_node.mempool_manager
+
+        cost_result, signature_verified = await mempool_manager.pre_validate_spendbundle(spend_bundle)
+        assert signature_verified
+
+        cost_result, signature_verified = await mempool_manager.pre_validate_spendbundle(bad_spend_bundle)
+        assert not signature_verified
+        cost, status, error = await mempool_manager.add_spendbundle(
+            bad_spend_bundle, cost_result, bad_spend_bundle.name(), validate_signature=not signature_verified
+        )
+        assert status == MempoolInclusionStatus.FAILED
+        assert error == Err.BAD_AGGREGATE_SIGNATURE
+        assert mempool_manager.get_spendbundle(bad_spend_bundle.name()) is None
+
     @pytest.mark.asyncio
     async def test_agg_sig_condition(self, two_nodes):
         reward_ph = WALLET_A.get_new_puzzlehash()
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from concurrent.futures.thread import ThreadPoolExecutor
+from typing import List
+
+import pytest
+
+from src.consensus.default_constants import DEFAULT_CONSTANTS
+from src.full_node import mempool_manager
+from src.full_node.mempool_manager import MempoolManager
+from tests.time_out_assert import time_out_assert
+
+
+class BlockingValidator:
+    """
+    Replaces the batch validation of the workers. Each batch is held until the test releases it.
+    """
+
+    def __init__(self):
+        self.batches: List[List[bytes]] = []
+        self.releases: List[threading.Event] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, spend_bundles_bytes: List[bytes]):
+        release = threading.Event()
+        with self.lock:
+            self.batches.append(spend_bundles_bytes)
+            self.releases.append(release)
+        release.wait(5)
+        return [(spend_bundle_bytes, True, None) for spend_bundle_bytes in spend_bundles_bytes]
+
+    def batch_count(self) -> int:
+        with self.lock:
+            return len(self.batches)
+
+
+def queue_validation(manager: MempoolManager, spend_bundle_bytes: bytes) -> asyncio.Future:
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    manager.validation_queue.append((spend_bundle_bytes, future))
+    manager._dispatch_validation()
+    return future
+
+
+class TestValidationWorkers:
+    @pytest.mark.asyncio
+    async def test_queued_bundles_spread_over_workers(self, monkeypatch):
+        validator = BlockingValidator()
+        monkeypatch.setattr(mempool_manager, "batch_validate_transactions_multiprocess", validator)
+        manager = MempoolManager(None, DEFAULT_CONSTANTS, num_validation_workers=2, validation_batch_size=20)
+        manager.pool.shutdown()
+        manager.pool = ThreadPoolExecutor(max_workers=2)
+        try:
+            futures = [queue_validation(manager, bytes([i])) for i in range(8)]
+            # The first two go to the idle workers, the others wait for a worker
+            await time_out_assert(5, validator.batch_count, 2)
+            assert validator.batches == [[bytes([0])], [bytes([1])]]
+            assert len(manager.validation_queue) == 6
+
+            # The first worker to free up takes half of the queue, the rest stays for the other worker
+            validator.releases[0].set()
+            await time_out_assert(5, validator.batch_count, 3)
+            assert validator.batches[2] == [bytes([i]) for i in range(2, 5)]
+            assert len(manager.validation_queue) == 3
+
+            validator.releases[1].set()
+            await time_out_assert(5, validator.batch_count, 4)
+            assert validator.batches[3] == [bytes([5]), bytes([6])]
+            assert len(manager.validation_queue) == 1
+
+            for release in validator.releases:
+                release.set()
+            await time_out_assert(5, validator.batch_count, 5)
+            validator.releases[4].set()
+            results = await asyncio.wait_for(asyncio.gather(*futures), 5)
+            assert results == [(bytes([i]), True) for i in range(8)]
+            assert sum(len(batch) for batch in validator.batches) == 8
+            assert manager.busy_validation_workers == 0
+        finally:
+            for release in validator.releases:
+                release.set()
+            manager.shut_down()
+
+    @pytest.mark.asyncio
+    async def test_failing_bundle_fails_own_future(self, monkeypatch):
+        release_first = threading.Event()
+
+        def validate_transaction(constants, spend_bundle_bytes: bytes):
+            if spend_bundle_bytes == b"first":
+                release_first.wait(5)
+            if spend_bundle_bytes == b"bad":
+                raise ValueError("bad spend bundle")
+            return spend_bundle_bytes, False
+
+        monkeypatch.setattr(mempool_manager, "validate_transaction_multiprocess", validate_transaction)
+        monkeypatch.setattr(mempool_manager, "_worker_constants", DEFAULT_CONSTANTS)
+        manager = MempoolManager(None, DEFAULT_CONSTANTS, num_validation_workers=1, validation_batch_size=20)
+        manager.pool.shutdown()
+        manager.pool = ThreadPoolExecutor(max_workers=1)
+        try:
+            # Keeps the only worker busy, so the next bundles are validated in one batch
+            first = queue_validation(manager, b"first")
+            futures = [queue_validation(manager, spend_bundle_bytes) for spend_bundle_bytes in (b"good", b"bad", b"ok")]
+            assert len(manager.validation_queue) == 3
+
+            release_first.set()
+            assert await asyncio.wait_for(first, 5) == (b"first", False)
+            assert await asyncio.wait_for(futures[0], 5) == (b"good", False)
+            with pytest.raises(Exception, match="bad spend bundle"):
+                await asyncio.wait_for(futures[1], 5)
+            assert await asyncio.wait_for(futures[2], 5) == (b"ok", False)
+        finally:
+            release_first.set()
+            manager.shut_down()
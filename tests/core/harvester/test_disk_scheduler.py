@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+from concurrent.futures.thread import ThreadPoolExecutor
+
+import pytest
+
+from src.harvester.disk_scheduler import DiskLookupScheduler
+
+
+class TestDiskLookupScheduler:
+    @pytest.mark.asyncio
+    async def test_concurrency_per_disk(self):
+        executor = ThreadPoolExecutor(max_workers=8)
+        scheduler = DiskLookupScheduler(executor, 2)
+        running = {0: 0, 1: 0}
+        max_running = {0: 0, 1: 0}
+        lock = threading.Lock()
+
+        def lookup(device: int) -> int:
+            with lock:
+                running[device] += 1
+                max_running[device] = max(max_running[device], running[device])
+            time.sleep(0.01)
+            with lock:
+                running[device] -= 1
+            return device
+
+        futures = [scheduler.get_qualities(i % 2, lookup, i % 2) for i in range(12)]
+        assert await asyncio.gather(*futures) == [i % 2 for i in range(12)]
+        assert max_running == {0: 2, 1: 2}
+        latencies = scheduler.get_latencies()
+        assert latencies[0]["qualities"]["count"] == 6 and latencies[1]["qualities"]["count"] == 6
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_best_proofs_first(self):
+        executor = ThreadPoolExecutor(max_workers=4)
+        scheduler = DiskLookupScheduler(executor, 1)
+        order = []
+        blocker = threading.Event()
+
+        def lookup(name: str) -> None:
+            if name == "first":
+                blocker.wait()
+            order.append(name)
+
+        futures = [scheduler.get_qualities(0, lookup, "first"), scheduler.get_qualities(0, lookup, "qualities")]
+        cancelled = scheduler.get_qualities(0, lookup, "cancelled")
+        for required_iters in [30, 10, 20]:
+            futures.append(scheduler.get_full_proof(0, required_iters, lookup, f"proof {required_iters}"))
+        cancelled.cancel()
+        blocker.set()
+        await asyncio.gather(*futures)
+        assert order == ["first", "proof 10", "proof 20", "proof 30", "qualities"]
+        executor.shutdown()
@@ -0,0 +1,111 @@
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+from blspy import AugSchemeMPL
+
+from src.consensus.default_constants import DEFAULT_CONSTANTS
+from src.harvester.harvester import Harvester
+from src.harvester.harvester_api import HarvesterAPI
+from src.plotting.plot_tools import PlotInfo
+from src.protocols.farmer_protocol import FarmingInfo
+from src.protocols.harvester_protocol import NewProofOfSpace, NewSignagePointHarvester
+from src.protocols.protocol_message_types import ProtocolMessageTypes
+from src.util.hash import std_hash
+from src.util.ints import uint8, uint64
+
+TIME_BUDGET = 0.5
+
+
+class FakeProver:
+    def __init__(self, name: str, release: threading.Event = None):
+        self.name = name
+        # Qualities are only returned once this is set, if given
+        self.release = release
+        self.lookups = 0
+
+    def get_id(self) -> bytes:
+        return std_hash(self.name.encode())
+
+    def get_size(self) -> int:
+        return 32
+
+    def get_qualities_for_challenge(self, challenge: bytes) -> List[bytes]:
+        self.lookups += 1
+        if self.release is not None:
+            self.release.wait(5)
+        return [std_hash(challenge + self.get_id())]
+
+    def get_full_proof(self, challenge: bytes, index: int) -> bytes:
+        return bytes(32 * 8)
+
+
+class FakePeer:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, message):
+        self.messages.append((time.time(), message))
+
+
+def make_plot_info(prover: FakeProver, device: int) -> PlotInfo:
+    local_sk = AugSchemeMPL.key_gen(std_hash(prover.name.encode()))
+    return PlotInfo(
+        prover, None, std_hash(b"pool contract"), local_sk.get_g1(), local_sk.get_g1(), local_sk, 1, 0, device
+    )
+
+
+class TestHarvesterAPI:
+    @pytest.mark.asyncio
+    async def test_signage_point_time_budget(self, tmp_path):
+        constants = DEFAULT_CONSTANTS.replace(NUMBER_ZERO_BITS_PLOT_FILTER=0)
+        config = {"num_threads": 4, "lookups_per_disk": 1, "signage_point_time_budget": TIME_BUDGET}
+        harvester = Harvester(tmp_path, config, constants)
+        key = AugSchemeMPL.key_gen(bytes([1] * 32)).get_g1()
+        harvester.farmer_public_keys = [key]
+        harvester.pool_public_keys = [key]
+
+        release = threading.Event()
+        fast_prover = FakeProver("fast")
+        # The slow lookup does not finish in time, and the lookup queued behind it on the same disk never starts
+        slow_prover = FakeProver("slow", release)
+        queued_prover = FakeProver("queued")
+        harvester.provers = {
+            Path("fast.plot"): make_plot_info(fast_prover, 0),
+            Path("slow.plot"): make_plot_info(slow_prover, 1),
+            Path("queued.plot"): make_plot_info(queued_prover, 1),
+        }
+        harvester.plot_index.set_plots(harvester.provers)
+        peer = FakePeer()
+        new_challenge = NewSignagePointHarvester(
+            std_hash(b"challenge"), uint64(1), uint64(2 ** 60), uint8(1), std_hash(b"signage point")
+        )
+        try:
+            start = time.time()
+            await HarvesterAPI(harvester).new_signage_point_harvester(new_challenge, peer)
+
+            message_types = [ProtocolMessageTypes(message.type) for _, message in peer.messages]
+            assert message_types == [ProtocolMessageTypes.new_proof_of_space, ProtocolMessageTypes.farming_info]
+            # The proof of the fast plot is sent as soon as it is found, before the deadline
+            proof_time, proof_message = peer.messages[0]
+            assert proof_time < start + TIME_BUDGET
+            assert NewProofOfSpace.from_bytes(proof_message.data).plot_identifier.endswith("fast.plot")
+            # Farming info is still sent after the deadline
+            farming_info = FarmingInfo.from_bytes(peer.messages[1][1].data)
+            assert farming_info.passed == 3 and farming_info.proofs == 1 and farming_info.total_plots == 3
+
+            timing = harvester.get_signage_point_timings()[-1]
+            assert timing["cancelled_lookups"] == 2
+            assert timing["proofs"] == 1
+            assert slow_prover.lookups == 1
+            assert queued_prover.lookups == 0
+
+            # The queued lookup is dropped, it does not run when the disk frees up
+            release.set()
+            await harvester.lookup_scheduler.get_qualities(1, lambda: None)
+            assert queued_prover.lookups == 0
+        finally:
+            release.set()
+            harvester._close()
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from src.consensus.default_constants import DEFAULT_CONSTANTS
+from src.harvester.plot_index import PlotIndex
+from src.types.blockchain_format.proof_of_space import ProofOfSpace
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.util.hash import std_hash
+
+
+class FakeProver:
+    def __init__(self, plot_id: bytes32):
+        self.plot_id = plot_id
+
+    def get_id(self) -> bytes32:
+        return self.plot_id
+
+
+class FakePlotInfo:
+    def __init__(self, plot_id: bytes32):
+        self.prover = FakeProver(plot_id)
+
+
+class TestPlotIndex:
+    def test_passing_plots(self):
+        constants = DEFAULT_CONSTANTS.replace(NUMBER_ZERO_BITS_PLOT_FILTER=3)
+        provers = {Path(f"plot_{i}.plot"): FakePlotInfo(std_hash(i.to_bytes(4, "big"))) for i in range(500)}
+        index = PlotIndex()
+        index.set_plots(provers)
+        assert len(index) == 500
+
+        for sp in range(5):
+            challenge_hash = std_hash(b"challenge")
+            sp_hash = std_hash(sp.to_bytes(4, "big"))
+            expected = []
+            for path, plot_info in provers.items():
+                plot_id = plot_info.prover.get_id()
+                if ProofOfSpace.passes_plot_filter(constants, plot_id, challenge_hash, sp_hash):
+                    pos_challenge = ProofOfSpace.calculate_pos_challenge(plot_id, challenge_hash, sp_hash)
+                    expected.append((path, plot_info, pos_challenge))
+            assert len(expected) > 0
+            assert index.passing_plots(constants.NUMBER_ZERO_BITS_PLOT_FILTER, challenge_hash, sp_hash) == expected
+
+    def test_missing_paths(self, tmp_path):
+        present = tmp_path / "present.plot"
+        present.touch()
+        missing = tmp_path / "missing.plot"
+        index = PlotIndex()
+        index.set_plots({present: FakePlotInfo(std_hash(b"1")), missing: FakePlotInfo(std_hash(b"2"))})
+        assert index.missing_paths() == [missing]
+        index.set_plots({present: FakePlotInfo(std_hash(b"1"))})
+        assert index.missing_paths() == []
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from blspy import AugSchemeMPL
+
+from src.consensus.default_constants import DEFAULT_CONSTANTS
+from src.harvester.harvester import Harvester
+from src.plotting.plot_metadata_cache import PlotMetadata, PlotMetadataCache
+from src.plotting.plot_tools import get_plot_filenames
+from src.util.hash import std_hash
+from src.util.ints import uint8, uint64
+
+
+class TestPlotLoading:
+    def test_directory_cache(self, tmp_path):
+        directory = tmp_path / "plots"
+        directory.mkdir()
+        (directory / "a.plot").touch()
+        (directory / "b.txt").touch()
+        config = {"plot_directories": [str(directory)]}
+        cache = {}
+
+        # Recently changed directories are not cached
+        assert get_plot_filenames(config, cache) == {directory.resolve(): [directory / "a.plot"]}
+        assert cache == {}
+
+        old_time = time.time() - 60
+        os.utime(directory, (old_time, old_time))
+        assert get_plot_filenames(config, cache) == {directory.resolve(): [directory / "a.plot"]}
+        assert directory.resolve() in cache
+
+        # A cached directory is not listed again while its mtime is unchanged
+        cache[directory.resolve()] = (cache[directory.resolve()][0], [])
+        assert get_plot_filenames(config, cache) == {directory.resolve(): []}
+
+        (directory / "c.plot").touch()
+        filenames = get_plot_filenames(config, cache)[directory.resolve()]
+        assert sorted(filenames) == [directory / "a.plot", directory / "c.plot"]
+
+    def test_metadata_cache(self, tmp_path):
+        plot = tmp_path / "a.plot"
+        plot.write_bytes(b"plot")
+        stat_info = plot.stat()
+        local_sk = AugSchemeMPL.key_gen(bytes([1] * 32))
+        metadata = PlotMetadata(
+            str(plot),
+            uint64(stat_info.st_size),
+            uint64(stat_info.st_mtime_ns),
+            std_hash(b"plot id"),
+            uint8(32),
+            bytes([2] * 128),
+            None,
+            std_hash(b"pool contract"),
+            local_sk.get_g1(),
+            local_sk.get_g1(),
+            local_sk,
+        )
+        cache = PlotMetadataCache(tmp_path / "cache" / "plot_metadata.dat")
+        cache.set(metadata)
+        cache.save()
+        # Only the owner can read the private keys
+        assert (tmp_path / "cache" / "plot_metadata.dat").stat().st_mode & 0o077 == 0
+
+        cache_2 = PlotMetadataCache(tmp_path / "cache" / "plot_metadata.dat")
+        cache_2.load()
+        assert cache_2.get(plot, stat_info) == metadata
+
+        # A changed file is opened again
+        plot.write_bytes(b"other plot")
+        assert cache_2.get(plot, plot.stat()) is None
+
+        cache_2.remove_missing(set())
+        assert cache_2.entries == {} and cache_2.changed
+
+    @pytest.mark.asyncio
+    async def test_refresh_during_removal(self, tmp_path):
+        harvester = Harvester(tmp_path, {"num_threads": 2}, DEFAULT_CONSTANTS)
+        await harvester._start()
+        refreshes = []
+
+        async def load_plots():
+            refreshes.append(time.time())
+
+        harvester._load_plots = load_plots
+        checking = threading.Event()
+        release = threading.Event()
+
+        def missing_paths():
+            checking.set()
+            release.wait(5)
+            return []
+
+        harvester.plot_index.missing_paths = missing_paths
+        try:
+            removal = asyncio.create_task(harvester.remove_missing_plots())
+            while not checking.is_set():
+                await asyncio.sleep(0.01)
+            # A refresh is not dropped while missing plots are checked
+            await harvester.refresh_plots()
+            assert len(refreshes) == 1
+            release.set()
+            await removal
+
+            # A refresh that arrives while another one runs is requested again for after it
+            async with harvester._refresh_lock:
+                await harvester.refresh_plots()
+            assert len(refreshes) == 1
+            assert harvester._refresh_requested.is_set()
+        finally:
+            release.set()
+            harvester._close()
+            await harvester._await_closed()
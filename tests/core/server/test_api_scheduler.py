@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from src.protocols.full_node_protocol import RequestBlock, RequestBlocks
+from src.protocols.protocol_message_types import ProtocolMessageTypes
+from src.server.api_scheduler import ApiScheduler
+from src.server.outbound_message import make_msg
+from src.types.blockchain_format.sized_bytes import bytes32
+from src.util.ints import uint32
+
+
+class FakeConnection:
+    def __init__(self, peer_number: int):
+        self.peer_node_id = bytes32(bytes([peer_number]) * 32)
+
+
+def request_block(height: int):
+    return make_msg(ProtocolMessageTypes.request_block, RequestBlock(uint32(height), False))
+
+
+def request_blocks(height: int):
+    return make_msg(ProtocolMessageTypes.request_blocks, RequestBlocks(uint32(height), uint32(height), False))
+
+
+class TestApiScheduler:
+    @pytest.mark.asyncio
+    async def test_round_robin(self):
+        scheduler = ApiScheduler(peer_queue_size=10, max_concurrent=100)
+        busy_peer, other_peer = FakeConnection(1), FakeConnection(2)
+        for height in range(5):
+            scheduler.put_nowait((request_block(height), busy_peer))
+        scheduler.put_nowait((request_block(100), other_peer))
+
+        # The other peer does not wait for all the messages of the busy peer
+        order = [(await scheduler.get())[1] for _ in range(6)]
+        assert order[:2] == [busy_peer, other_peer]
+        assert order[2:] == [busy_peer] * 4
+        assert scheduler.get_metrics()["running"] == 6
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limits(self):
+        scheduler = ApiScheduler(peer_queue_size=10, max_concurrent=3, max_concurrent_per_type={"request_blocks": 1})
+        peer_1, peer_2 = FakeConnection(1), FakeConnection(2)
+        scheduler.put_nowait((request_blocks(1), peer_1))
+        scheduler.put_nowait((request_blocks(2), peer_1))
+        scheduler.put_nowait((request_block(3), peer_2))
+        scheduler.put_nowait((request_block(4), peer_2))
+
+        first_message, _ = await scheduler.get()
+        assert first_message.type == ProtocolMessageTypes.request_blocks.value
+        # The second request_blocks waits, the messages of the other peer are handled
+        assert (await scheduler.get())[0].type == ProtocolMessageTypes.request_block.value
+        assert (await scheduler.get())[0].type == ProtocolMessageTypes.request_block.value
+
+        # At the global limit
+        get_task = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0.01)
+        assert not get_task.done()
+        assert scheduler.get_metrics()["running_per_type"] == {"request_blocks": 1, "request_block": 2}
+
+        # Below the global limit, but still at the limit for request_blocks
+        scheduler.task_done(request_block(3))
+        await asyncio.sleep(0.01)
+        assert not get_task.done()
+
+        scheduler.task_done(first_message)
+        message, connection = await asyncio.wait_for(get_task, 1)
+        assert message.type == ProtocolMessageTypes.request_blocks.value
+        assert connection == peer_1
+
+    @pytest.mark.asyncio
+    async def test_full_peer_queue(self):
+        scheduler = ApiScheduler(peer_queue_size=2, max_concurrent=100)
+        peer, other_peer = FakeConnection(1), FakeConnection(2)
+        scheduler.put_nowait((request_block(1), peer))
+        scheduler.put_nowait((request_block(2), peer))
+        with pytest.raises(asyncio.QueueFull):
+            scheduler.put_nowait((request_block(3), peer))
+        assert scheduler.queue_size(peer.peer_node_id) == 2
+        # Other peers have their own queues
+        scheduler.put_nowait((request_block(4), other_peer))
+
+        await scheduler.get()
+        scheduler.put_nowait((request_block(3), peer))
+        assert scheduler.queue_size(peer.peer_node_id) == 2
+
+    @pytest.mark.asyncio
+    async def test_remove_peer(self):
+        scheduler = ApiScheduler(peer_queue_size=1, max_concurrent=100)
+        peer_1, peer_2 = FakeConnection(1), FakeConnection(2)
+        scheduler.put_nowait((request_block(1), peer_1))
+        scheduler.put_nowait((request_block(2), peer_2))
+
+        # The queued messages of the peer are dropped
+        scheduler.remove_peer(peer_1.peer_node_id)
+        assert scheduler.queue_size(peer_1.peer_node_id) == 0
+        assert (await scheduler.get())[1] == peer_2
+        assert scheduler.get_metrics()["queued"] == 0
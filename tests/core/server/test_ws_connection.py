@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from typing import List
+
+import pytest
+from aiohttp import WSMessage, WSMsgType
+
+from src.protocols.protocol_message_types import ProtocolMessageTypes
+from src.protocols.full_node_protocol import RequestBlock
+from src.server.api_scheduler import ApiScheduler
+from src.server.outbound_message import Message, NodeType, make_msg
+from src.server.ws_connection import WSChiaConnection, encode_message
+from src.util.ints import uint8, uint16, uint32
+
+log = logging.getLogger(__name__)
+
+
+class FakeTransport:
+    def get_extra_info(self, name: str):
+        return ("127.0.0.1", 8444)
+
+
+class FakeWriter:
+    transport = FakeTransport()
+
+
+class FakeWebSocket:
+    _writer = FakeWriter()
+    _closed = False
+
+    def __init__(self):
+        self.sent: List[bytes] = []
+        self.received: asyncio.Queue = asyncio.Queue()
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(data)
+
+    async def receive(self, timeout: float) -> WSMessage:
+        return WSMessage(WSMsgType.BINARY, await self.received.get(), None)
+
+
+def make_connection(ws: FakeWebSocket, outbound_queue_size: int, incoming_queue=None) -> WSChiaConnection:
+    return WSChiaConnection(
+        NodeType.FULL_NODE,
+        ws,
+        8444,
+        log,
+        True,
+        False,
+        "127.0.0.1",
+        incoming_queue if incoming_queue is not None else asyncio.Queue(),
+        lambda connection: None,
+        bytes(32),
+        outbound_queue_size=outbound_queue_size,
+    )
+
+
+class TestWSChiaConnection:
+    @pytest.mark.asyncio
+    async def test_broadcast_is_encoded_once(self):
+        connections = [make_connection(FakeWebSocket(), 10) for _ in range(3)]
+        message = make_msg(ProtocolMessageTypes.request_block, RequestBlock(uint32(1), False))
+        encoded_messages = [encode_message(message)]
+        for connection in connections:
+            assert connection.queue_broadcast(encoded_messages)
+        queued = [connection.outgoing_queue.get_nowait()[1] for connection in connections]
+        assert all(encoded is queued[0] for encoded in queued)
+        assert queued[0] == bytes(message)
+
+    @pytest.mark.asyncio
+    async def test_full_queue_drops_broadcasts(self):
+        ws = FakeWebSocket()
+        connection = make_connection(ws, 2)
+        encoded_messages = [
+            encode_message(make_msg(ProtocolMessageTypes.request_block, RequestBlock(uint32(i), False)))
+            for i in range(3)
+        ]
+        assert not connection.queue_broadcast(encoded_messages)
+        assert connection.dropped_messages == 1
+        assert connection.outgoing_queue.qsize() == 2
+
+        # The queued messages are sent in order once the outbound handler runs
+        connection.outbound_task = asyncio.create_task(connection.outbound_handler())
+        await asyncio.sleep(0.01)
+        assert ws.sent == [encoded for _, encoded in encoded_messages[:2]]
+        connection.outbound_task.cancel()
+
+    @pytest.mark.asyncio
+    async def test_full_incoming_queue_reads_responses(self):
+        ws = FakeWebSocket()
+        scheduler = ApiScheduler(peer_queue_size=1, max_concurrent=100)
+        connection = make_connection(ws, 10, scheduler)
+        for height in range(2):
+            request = make_msg(ProtocolMessageTypes.request_block, RequestBlock(uint32(height), False))
+            ws.received.put_nowait(bytes(request))
+        # The response to a request that we sent to the peer, while the queue of the peer is full
+        event = asyncio.Event()
+        connection.pending_requests[uint16(7)] = event
+        response = Message(uint8(ProtocolMessageTypes.respond_block.value), bytes([1, 2, 3]), uint16(7))
+        ws.received.put_nowait(bytes(response))
+
+        connection.inbound_task = asyncio.create_task(connection.inbound_handler())
+        await asyncio.wait_for(event.wait(), 1)
+        assert connection.request_results[uint16(7)] == response
+        # The second request did not fit in the queue
+        assert scheduler.queue_size(connection.peer_node_id) == 1
+        assert connection.dropped_incoming_messages == 1
+        connection.inbound_task.cancel()
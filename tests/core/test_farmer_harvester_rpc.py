@@ -92,6 +92,8 @@ class TestRpc:
                 return len((await client_2.get_plots())["plots"]) > 0
 
             await time_out_assert(5, have_plots, True)
+            assert sum(disk["plots"] for disk in await client_2.get_disk_latencies()) > 0
+            assert isinstance(await client_2.get_signage_point_timings(), list)
 
             res = await client_2.get_plots()
             num_plots = len(res["plots"])
@@ -59,6 +59,7 @@ class TestRpc:
             assert not state["sync"]["sync_mode"]
             assert state["difficulty"] > 0
             assert state["sub_slot_iters"] > 0
+            assert state["coin_cache"]["size"] == 0 and state["coin_cache"]["hit_rate"] == 0.0
 
             blocks = bt.get_consecutive_blocks(num_blocks)
             blocks = bt.get_consecutive_blocks(num_blocks, block_list_input=blocks, guarantee_transaction_block=True)
@@ -173,6 +174,10 @@ class TestRpc:
 
             await time_out_assert(10, num_connections, 1)
             connections = await client.get_connections()
+            assert connections[0]["inbound_queue_size"] == 0
+            assert connections[0]["dropped_incoming_messages"] == 0
+            inbound_queue = (await client.fetch("get_connections", {}))["inbound_queue"]
+            assert inbound_queue["queued"] == 0
 
             await client.close_connection(connections[0]["node_id"])
             await time_out_assert(10, num_connections, 0)
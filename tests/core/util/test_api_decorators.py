@@ -0,0 +1,50 @@
+import pytest
+
+from src.protocols.full_node_protocol import RequestBlock, RespondBlock
+from src.protocols.protocol_message_types import ProtocolMessageTypes
+from src.util.api_decorators import api_request, get_api_handlers, peer_required
+from src.util.ints import uint32
+
+
+class FakeApi:
+    @api_request
+    async def request_block(self, request: RequestBlock):
+        return request
+
+    @peer_required
+    @api_request
+    async def respond_block(self, respond_block: RespondBlock, peer):
+        return respond_block, peer
+
+    async def request_blocks(self, request):
+        return request
+
+
+class TestApiDecorators:
+    def test_api_handlers(self):
+        handlers = get_api_handlers(FakeApi)
+        assert handlers is get_api_handlers(FakeApi)
+        # request_blocks is not an api function
+        assert set(handlers.keys()) == {
+            ProtocolMessageTypes.request_block.value,
+            ProtocolMessageTypes.respond_block.value,
+        }
+        request_block = handlers[ProtocolMessageTypes.request_block.value]
+        assert request_block.function is FakeApi.request_block
+        assert request_block.request_class is RequestBlock
+        assert not request_block.peer_required
+        respond_block = handlers[ProtocolMessageTypes.respond_block.value]
+        assert respond_block.request_class is RespondBlock
+        assert respond_block.peer_required
+
+    @pytest.mark.asyncio
+    async def test_api_request(self):
+        api = FakeApi()
+        request = RequestBlock(uint32(5), True)
+        handler = get_api_handlers(FakeApi)[ProtocolMessageTypes.request_block.value]
+        # Parsed from bytes, positional or by keyword, or passed as the Streamable
+        assert await handler.function(api, bytes(request)) == request
+        assert await api.request_block(bytes(request)) == request
+        assert await api.request_block(request=bytes(request)) == request
+        assert await api.request_block(request) == request
+
@@ -1,14 +1,22 @@
+import dataclasses
 import unittest
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pytest import raises
 
 from src.types.weight_proof import SubEpochChallengeSegment
-from src.util.ints import uint32, uint8
+from src.util.hash import std_hash
+from src.util.ints import uint32, uint64, uint8
 from src.types.blockchain_format.coin import Coin
+from src.types.blockchain_format.program import Program, SerializedProgram
 from src.types.blockchain_format.sized_bytes import bytes32
 from src.types.full_block import FullBlock
-from src.util.streamable import Streamable, streamable
+from src.util.streamable import (
+    Streamable,
+    streamable,
+    PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS,
+    STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS,
+)
 from src.protocols.wallet_protocol import RespondRemovals
 from tests.setup_nodes import test_constants, bt
 
@@ -160,6 +168,79 @@ class TestStreamable(unittest.TestCase):
         TestClassBool.from_bytes(bytes([0]))
         TestClassBool.from_bytes(bytes([1]))
 
+    def test_compiled_functions(self):
+        @dataclass(frozen=True)
+        @streamable
+        class TestClassInner(Streamable):
+            a: bytes32
+            b: Optional[Coin]
+
+        @dataclass(frozen=True)
+        @streamable
+        class TestClassCompiled(Streamable):
+            a: List[Tuple[uint8, TestClassInner]]
+            b: str
+            c: bool
+            d: bytes
+
+        coin = Coin(bytes32([1] * 32), bytes32([2] * 32), uint64(1000))
+        a = TestClassCompiled(
+            [(uint8(1), TestClassInner(bytes32([3] * 32), coin)), (uint8(2), TestClassInner(bytes32([4] * 32), None))],
+            "abc",
+            True,
+            b"\x00\x01",
+        )
+        b: bytes = bytes(a)
+        assert TestClassCompiled in STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS
+        assert TestClassCompiled.from_bytes(b) == a
+        assert TestClassCompiled in PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS
+        # Cached functions give the same results
+        assert bytes(TestClassCompiled.from_bytes(b)) == b
+
+    def test_memoryview_parse(self):
+        @dataclass(frozen=True)
+        @streamable
+        class TestClassPrograms(Streamable):
+            a: bytes32
+            b: Optional[SerializedProgram]
+            c: Program
+            d: bytes
+            e: uint64
+
+        program = Program.to([1, [2, b"abc" * 100], b""])
+        a = TestClassPrograms(
+            bytes32([5] * 32), SerializedProgram.from_bytes(bytes(program)), program, b"data", uint64(10)
+        )
+        blob = bytes(a)
+        parsed = TestClassPrograms.from_bytes(bytearray(blob))
+        assert parsed == a
+        assert bytes(parsed) == blob
+        # Nothing in the parsed object refers to the buffer
+        assert type(parsed.a) is bytes32
+        assert type(parsed.d) is bytes
+        assert type(bytes(parsed.b)) is bytes
+
+        with raises(ValueError):
+            TestClassPrograms.from_bytes(blob[:40])
+
+    def test_cached_hash(self):
+        coin = Coin(bytes32([1] * 32), bytes32([2] * 32), uint64(3))
+        name = coin.name()
+        assert coin.get_hash() is name
+        assert name == std_hash(bytes(coin))
+        # The cache is not a field, it does not change equality, serialization or json
+        assert coin == Coin(bytes32([1] * 32), bytes32([2] * 32), uint64(3))
+        assert Coin.from_bytes(bytes(coin)) == coin
+        assert coin.to_json_dict() == Coin(bytes32([1] * 32), bytes32([2] * 32), uint64(3)).to_json_dict()
+        # Replaced objects get their own hash
+        other = dataclasses.replace(coin, amount=uint64(4))
+        assert other.name() != name
+        assert other.name() == std_hash(bytes(other))
+
+        block = bt.get_consecutive_blocks(1)[0]
+        assert block.header_hash is block.header_hash
+        assert block.get_block_header().header_hash == block.header_hash
+
 
 if __name__ == "__main__":
     unittest.main()